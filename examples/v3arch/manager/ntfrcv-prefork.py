@@ -0,0 +1,45 @@
+# Notification Receiver running in a number of worker processes
+from pysnmp.entity import engine, config, prefork
+from pysnmp.carrier.asynsock.dgram import udp
+from pysnmp.entity.rfc3413 import ntfrcv
+
+def cbFun(snmpEngine,
+          stateReference,
+          contextEngineId, contextName,
+          varBinds,
+          cbCtx):
+    transportDomain, transportAddress = snmpEngine.msgAndPduDsp.getTransportInfo(stateReference)
+    print 'Notification from %s, SNMP Engine \"%s\", Context \"%s\"' % (
+        transportAddress, contextEngineId, contextName
+        )
+    for name, val in varBinds:
+        print '%s = %s' % (name.prettyPrint(), val.prettyPrint())
+
+# Called in each worker process to build its own SNMP engine
+def engineFactory():
+    snmpEngine = engine.SnmpEngine()
+
+    # All workers bind the same endpoint, kernel balances between them
+    config.addSocketTransport(
+        snmpEngine,
+        udp.domainName,
+        udp.UdpSocketTransport().openServerMode(
+            ('127.0.0.1', 162), reusePort=1
+            )
+        )
+
+    # v1/2 setup
+    config.addV1System(snmpEngine, 'test-agent', 'public')
+
+    # Apps registration
+    ntfrcv.NotificationReceiver(snmpEngine, cbFun)
+
+    return snmpEngine
+
+server = prefork.PreforkServer(engineFactory, workers=4)
+server.startServer()
+try:
+    server.runServer()
+except KeyboardInterrupt:
+    print 'Total statistics: %s' % server.getStatistics()
+    server.stopServer()
@@ -0,0 +1,33 @@
+# GET Command Generator over asyncio event loop
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+from pysnmp.entity.rfc3413.oneliner import cmdgen
+
+loop = asyncio.get_event_loop()
+
+cmdGen = cmdgen.AsyncioCommandGenerator(loop=loop)
+
+# Many requests may be in flight at once, each returns a Future
+futures = []
+for varName in ((1,3,6,1,2,1,1,1,0), (1,3,6,1,2,1,1,3,0)):
+    futures.append(
+        cmdGen.getCmd(
+            cmdgen.CommunityData('test-agent', 'public'),
+            cmdgen.AsyncioUdpTransportTarget(('localhost', 161)),
+            varName
+            )
+        )
+
+for errorIndication, errorStatus, errorIndex, varBinds in \
+        loop.run_until_complete(asyncio.gather(*futures)):
+    if errorIndication:
+        print errorIndication
+    elif errorStatus:
+        print '%s at %s\n' % (
+            errorStatus.prettyPrint(), varBinds[int(errorIndex)-1]
+            )
+    else:
+        for name, val in varBinds:
+            print '%s = %s' % (name.prettyPrint(), val.prettyPrint())
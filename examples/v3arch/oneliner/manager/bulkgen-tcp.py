@@ -0,0 +1,28 @@
+# GETBULK Command Generator over TCP
+from pysnmp.entity.rfc3413.oneliner import cmdgen
+
+errorIndication, errorStatus, errorIndex, \
+                 varBindTable = cmdgen.CommandGenerator().bulkCmd(
+    # SNMP v2
+#    cmdgen.CommunityData('test-agent', 'public'),
+    # SNMP v3
+    cmdgen.UsmUserData('test-user', 'authkey1', 'privkey1'),
+    # Connection is kept open, lost messages are not retried
+    cmdgen.TcpTransportTarget(('localhost', 161)),
+    # Large responses (also mind snmpEngineMaxMessageSize of agent)
+    0, 250,
+    (1,3,6,1,2,1,2)
+    )
+
+if errorIndication:
+    print errorIndication
+else:
+    if errorStatus:
+        print '%s at %s\n' % (
+            errorStatus.prettyPrint(),
+            varBindTable[-1][int(errorIndex)-1]
+            )
+    else:
+        for varBindTableRow in varBindTable:
+            for name, val in varBindTableRow:
+                print '%s = %s' % (name.prettyPrint(), val.prettyPrint())
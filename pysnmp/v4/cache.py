@@ -0,0 +1,88 @@
+# Bounded mapping evicting least recently used entries
+try:
+    import threading
+except ImportError:
+    threading = None
+from pysnmp.compat import NullLock
+
+# Entry layout: doubly-linked list node
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+class LruCache:
+    def __init__(self, maxSize):
+        self.__maxSize = maxSize
+        self.__entries = {}
+        # Circular list, least recently used entry follows root
+        self.__root = []
+        self.__root[:] = [ self.__root, self.__root, None, None ]
+        if threading is None:
+            self.__lock = NullLock()
+        else:
+            self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(%d)' % (self.__class__.__name__, self.__maxSize)
+
+    def __len__(self): return len(self.__entries)
+
+    def has_key(self, key): return self.__entries.has_key(key)
+
+    def __unlink(self, entry):
+        entry[_PREV][_NEXT] = entry[_NEXT]
+        entry[_NEXT][_PREV] = entry[_PREV]
+
+    def __link(self, entry):
+        last = self.__root[_PREV]
+        entry[_PREV] = last
+        entry[_NEXT] = self.__root
+        last[_NEXT] = self.__root[_PREV] = entry
+
+    def __shrink(self):
+        while len(self.__entries) > self.__maxSize:
+            entry = self.__root[_NEXT]
+            self.__unlink(entry)
+            del self.__entries[entry[_KEY]]
+
+    def get(self, key, default=None):
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return default
+            self.__unlink(entry)
+            self.__link(entry)
+            return entry[_VALUE]
+        finally:
+            self.__lock.release()
+
+    def put(self, key, value):
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is None:
+                entry = self.__entries[key] = [ None, None, key, value ]
+            else:
+                entry[_VALUE] = value
+                self.__unlink(entry)
+            self.__link(entry)
+            self.__shrink()
+        finally:
+            self.__lock.release()
+
+    def clear(self):
+        self.__lock.acquire()
+        try:
+            self.__entries.clear()
+            self.__root[:] = [ self.__root, self.__root, None, None ]
+        finally:
+            self.__lock.release()
+
+    def getMaxSize(self): return self.__maxSize
+
+    def setMaxSize(self, maxSize):
+        self.__lock.acquire()
+        try:
+            self.__maxSize = maxSize
+            self.__shrink()
+        finally:
+            self.__lock.release()
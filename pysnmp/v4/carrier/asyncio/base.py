@@ -0,0 +1,49 @@
+"""Defines standard API to asyncio-based transport"""
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio  # Python 2 backport
+from pysnmp.carrier import error
+
+class AbstractAsyncioTransport:
+    """Transport driven by asyncio event loop of AsyncioDispatcher. I/O
+       endpoint is brought up once transport is registered with
+       dispatcher (and so learns its event loop).
+    """
+    _cbFun = _flowCtlCbFun = None
+    _loop = None
+
+    def registerLoop(self, loop):
+        self._loop = loop
+
+    def unregisterLoop(self):
+        self._loop = None
+
+    # Public API
+    
+    def openClientMode(self, iface=None):
+        raise error.CarrierError('Method not implemented')
+
+    def openServerMode(self, iface=None):
+        raise error.CarrierError('Method not implemented')
+        
+    def sendMessage(self, outgoingMessage, transportAddress):
+        raise error.CarrierError('Method not implemented')
+
+    def registerCbFun(self, cbFun):
+        self._cbFun = cbFun
+
+    def unregisterCbFun(self):
+        self._cbFun = None
+
+    def registerFlowCtlCbFun(self, cbFun):
+        self._flowCtlCbFun = cbFun
+
+    def unregisterFlowCtlCbFun(self):
+        self._flowCtlCbFun = None
+
+    def isCongested(self): return 0
+        
+    def closeTransport(self):
+        self.unregisterCbFun()
+        self.unregisterFlowCtlCbFun()
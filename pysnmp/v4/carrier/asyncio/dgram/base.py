@@ -0,0 +1,126 @@
+"""Implements asyncio-based generic DGRAM transport"""
+from pysnmp.carrier.asyncio.base import AbstractAsyncioTransport, asyncio
+from pysnmp.carrier import error
+from pysnmp import debug
+
+class DgramAsyncioTransport(AbstractAsyncioTransport, asyncio.DatagramProtocol):
+    sockFamily = None
+    retryCount = 3; retryInterval = 1
+    # Messages submitted before the endpoint is up are queued, those
+    # over this limit are dropped
+    sendQueueLimit = 16384
+    def __init__(self):
+        self.__iface = None
+        self.__transport = None
+        self.__openError = None
+        self.__outQueue = []
+        self.__congested = 0
+        self.__stats = {
+            'inMessages': 0L,
+            'outMessages': 0L,
+            'outDrops': 0L,
+            'congestionEvents': 0L
+            }
+
+    def openClientMode(self, iface=None):
+        self.__iface = iface
+        return self
+
+    def openServerMode(self, iface):
+        self.__iface = iface
+        return self
+
+    def registerLoop(self, loop):
+        AbstractAsyncioTransport.registerLoop(self, loop)
+        # Endpoint comes up asynchronously, see connection_made()
+        future = asyncio.ensure_future(
+            loop.create_datagram_endpoint(
+                lambda self=self: self,
+                local_addr=self.__iface,
+                family=self.sockFamily
+                ),
+            loop=loop
+            )
+        future.add_done_callback(self.__endpointOpened)
+
+    def __endpointOpened(self, future):
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            self.__openError = exc
+            self.__outQueue = []
+            debug.logger & debug.flagIO and debug.logger('registerLoop: endpoint at %s failed: %s' % (self.__iface, exc))
+
+    def unregisterLoop(self):
+        if self.__transport is not None:
+            self.__transport.close()
+            self.__transport = None
+        AbstractAsyncioTransport.unregisterLoop(self)
+
+    def getStatistics(self):
+        return self.__stats.copy()
+
+    def isCongested(self): return self.__congested
+
+    def sendMessage(self, outgoingMessage, transportAddress):
+        if self.__openError is not None:
+            raise error.CarrierError(
+                'endpoint at %s failed: %s' % (self.__iface, self.__openError)
+                )
+        if self.__transport is None:
+            if self.sendQueueLimit and \
+                   len(self.__outQueue) >= self.sendQueueLimit:
+                self.__stats['outDrops'] = self.__stats['outDrops'] + 1
+                debug.logger & debug.flagIO and debug.logger('sendMessage: queue full, dropping outgoing message for %s' % (transportAddress,))
+                return
+            self.__outQueue.append((outgoingMessage, transportAddress))
+            return
+        debug.logger & debug.flagIO and debug.logger('sendMessage: outgoingMessage %s bytes to %s' % (len(outgoingMessage), transportAddress))
+        self.__transport.sendto(outgoingMessage, transportAddress)
+        self.__stats['outMessages'] = self.__stats['outMessages'] + 1
+
+    def closeTransport(self):
+        AbstractAsyncioTransport.closeTransport(self)
+        if self.__transport is not None:
+            self.__transport.close()
+            self.__transport = None
+        self.__outQueue = []
+
+    # asyncio DatagramProtocol API
+
+    def connection_made(self, transport):
+        if self._loop is None:  # unregistered while coming up
+            transport.close()
+            return
+        self.__transport = transport
+        outQueue, self.__outQueue = self.__outQueue, []
+        for outgoingMessage, transportAddress in outQueue:
+            self.sendMessage(outgoingMessage, transportAddress)
+
+    def connection_lost(self, exc):
+        self.__transport = None
+
+    def datagram_received(self, incomingMessage, transportAddress):
+        debug.logger & debug.flagIO and debug.logger('datagram_received: transportAddress %s incomingMessage %s bytes' % (transportAddress, len(incomingMessage)))
+        self.__stats['inMessages'] = self.__stats['inMessages'] + 1
+        if self._cbFun is None:
+            raise error.CarrierError('Unable to call cbFun')
+        self._cbFun(self, transportAddress, incomingMessage)
+
+    def error_received(self, exc):
+        # ICMP errors and such -- ignored just like in asyncore transport
+        debug.logger & debug.flagIO and debug.logger('error_received: %s' % (exc,))
+
+    # asyncio flow control is mapped onto transport dispatcher's one
+
+    def pause_writing(self):
+        self.__congested = 1
+        self.__stats['congestionEvents'] = self.__stats['congestionEvents'] + 1
+        if self._flowCtlCbFun is not None:
+            self._flowCtlCbFun(self, 1)
+
+    def resume_writing(self):
+        self.__congested = 0
+        if self._flowCtlCbFun is not None:
+            self._flowCtlCbFun(self, 0)
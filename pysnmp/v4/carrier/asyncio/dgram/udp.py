@@ -0,0 +1,10 @@
+"""Implements asyncio-based UDP transport domain"""
+from socket import AF_INET
+from pysnmp.carrier.asyncio.dgram.base import DgramAsyncioTransport
+
+domainName = snmpUDPDomain = (1, 3, 6, 1, 6, 1, 1)
+
+class UdpAsyncioTransport(DgramAsyncioTransport):
+    sockFamily = AF_INET
+
+UdpTransport = UdpAsyncioTransport
@@ -0,0 +1,89 @@
+"""Implements I/O over asyncio event loop"""
+from time import time
+from pysnmp.carrier.asyncio.base import asyncio
+from pysnmp.carrier.base import AbstractTransportDispatcher
+from pysnmp.carrier import error
+
+class AsyncioDispatcher(AbstractTransportDispatcher):
+    """Implements I/O over asyncio event loop. Unlike other dispatchers
+       it does not run a loop of its own but plugs into application's
+       asyncio loop. Timers are run as loop's delayed calls.
+    """
+    # Event loop may only be called from its own thread
+    threadSafe = 0
+    def __init__(self, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.loop = loop
+        self.timeout = 1.0
+        self.__timerHandle = None
+        self.__jobsDone = None
+        AbstractTransportDispatcher.__init__(self)
+
+    def createFuture(self):
+        """Return a new Future bound to dispatcher's event loop"""
+        if hasattr(self.loop, 'create_future'):
+            return self.loop.create_future()
+        else:
+            return asyncio.Future(loop=self.loop)
+        
+    def registerTransport(self, tDomain, t):
+        AbstractTransportDispatcher.registerTransport(self, tDomain, t)
+        t.registerLoop(self.loop)
+
+    def unregisterTransport(self, tDomain):
+        self.getTransport(tDomain).unregisterLoop()
+        AbstractTransportDispatcher.unregisterTransport(self, tDomain)
+
+    # Periodic timer callbacks are driven by a self-rearming delayed call
+
+    def registerTimerCbFun(self, timerCbFun):
+        AbstractTransportDispatcher.registerTimerCbFun(self, timerCbFun)
+        if self.__timerHandle is None:
+            self.__timerHandle = self.loop.call_later(
+                self.timeout, self.__handleTimerTick
+                )
+
+    def __handleTimerTick(self):
+        self.__timerHandle = self.loop.call_later(
+            self.timeout, self.__handleTimerTick
+            )
+        self.handleTimerTick(time())
+
+    # One-shot timers map onto loop's own
+
+    def callLater(self, delay, cbFun, *cbArgs):
+        return apply(self.loop.call_later, (delay, cbFun) + cbArgs)
+
+    def cancelCall(self, timerHandle):
+        timerHandle.cancel()
+
+    def jobFinished(self, jobId):
+        AbstractTransportDispatcher.jobFinished(self, jobId)
+        if self.__jobsDone is not None and not self.jobsArePending():
+            jobsDone, self.__jobsDone = self.__jobsDone, None
+            if not jobsDone.done():
+                jobsDone.set_result(None)
+
+    def jobsAreFinished(self):
+        """Return Future resolved once no jobs are pending"""
+        if not self.jobsArePending():
+            jobsDone = self.createFuture()
+            jobsDone.set_result(None)
+            return jobsDone
+        if self.__jobsDone is None:
+            self.__jobsDone = self.createFuture()
+        return self.__jobsDone
+        
+    def runDispatcher(self, timeout=0.0):
+        if self.loop.is_running():
+            raise error.CarrierError(
+                'Event loop is already running, wait on jobsAreFinished()'
+                )
+        self.loop.run_until_complete(self.jobsAreFinished())
+
+    def closeDispatcher(self):
+        AbstractTransportDispatcher.closeDispatcher(self)
+        if self.__timerHandle is not None:
+            self.__timerHandle.cancel()
+            self.__timerHandle = None
@@ -10,6 +10,7 @@ from pysnmp.carrier import error
 class AbstractSocketTransport(asyncore.dispatcher):
     sockFamily = sockType = None
     retryCount = 0; retryInterval = 0
+    _cbFun = _flowCtlCbFun = _captureFun = None
     def __init__(self, sock=None, sockMap=None):
         if sock is None:
             try:
@@ -67,8 +68,27 @@ class AbstractSocketTransport(asyncore.dispatcher):
     def unregisterCbFun(self):
         self._cbFun = None
 
+    def registerFlowCtlCbFun(self, cbFun):
+        self._flowCtlCbFun = cbFun
+
+    def unregisterFlowCtlCbFun(self):
+        self._flowCtlCbFun = None
+
+    def isCongested(self): return 0
+
+    # Capture callback is invoked as captureFun(direction, address,
+    # message) on every datagram, direction is 0 for incoming ones
+    
+    def registerCaptureFun(self, captureFun):
+        self._captureFun = captureFun
+
+    def unregisterCaptureFun(self):
+        self._captureFun = None
+        
     def closeTransport(self):
         self.unregisterCbFun()
+        self.unregisterFlowCtlCbFun()
+        self.unregisterCaptureFun()
         self.close()
         
     # asyncore API
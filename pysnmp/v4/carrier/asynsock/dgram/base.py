@@ -1,7 +1,8 @@
 """Implements asyncore-based generic DGRAM transport"""
-import socket, errno
+import socket, errno, sys
 from pysnmp.carrier.asynsock.base import AbstractSocketTransport
 from pysnmp.carrier import error
+from pysnmp.compat import deque
 from pysnmp import debug
 
 sockErrors = { # Ignore these socket errors
@@ -19,11 +20,73 @@ except AttributeError:
     # Windows sockets do not have EBADFD
     pass
 
+# Older Pythons do not export SO_REUSEPORT though kernel may support it
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', None)
+if SO_REUSEPORT is None and sys.platform[:5] == 'linux':
+    SO_REUSEPORT = 15
+
+# Receive into a preallocated buffer where supported
+try:
+    bytearray
+    hasRecvInto = hasattr(socket.socket, 'recvfrom_into')
+except NameError:
+    hasRecvInto = 0
+
 class DgramSocketTransport(AbstractSocketTransport):
     sockType = socket.SOCK_DGRAM
     retryCount = 3; retryInterval = 1
+    # Batched I/O: max number of datagrams to receive/send on a single
+    # readiness event. The default of 1 means no batching, 0 stands
+    # for no limit (e.g. drain socket till EAGAIN).
+    maxReadBatch = maxWriteBatch = 1
+    # Outgoing messages queue size limit (0 is unlimited), messages
+    # submitted over this limit are dropped
+    sendQueueLimit = 16384
+    # Flow control: transport reports congestion to dispatcher once its
+    # send queue grows up to high watermark and relief once the queue
+    # drains down to low watermark (0 disables flow control)
+    sendQueueHighWatermark = 4096
+    sendQueueLowWatermark = 1024
+    # Largest datagram to receive, longer ones are truncated
+    recvBufferSize = 65535
+    # Received datagrams are passed on as buffer objects over receive
+    # buffer, which gets reused for the next datagram unless taken over
+    # by holdIncomingMessage(). Up to this many released buffers are
+    # kept for reuse.
+    maxSpareRecvBuffers = 16
+    # Socket receive buffer autotuning (see setSocketBuffers()): after
+    # this many full read batches in a row SO_RCVBUF is doubled. A batch
+    # is full once it reaches maxReadBatch (64 datagrams if unlimited).
+    # With no read batching (maxReadBatch of 1) every read would count
+    # as full, so autotuning is off then.
+    fullReadBatchesToGrow = 8
     def __init__(self, sock=None, sockMap=None):
-        self.__outQueue = []
+        self.__outQueue = deque()
+        # Datagrams are read into a reusable buffer rather than into a
+        # new max-sized string each time
+        self.__recvBuffer = None
+        if hasRecvInto:
+            # list.append() and list.pop() are atomic, so buffers may be
+            # released from worker threads without locking
+            self.__spareRecvBuffers = []
+        else:
+            self.__spareRecvBuffers = None
+        self.__congested = 0
+        self.__maxSocketRecvBuffer = 0
+        self.__fullReadBatches = 0
+        self.__stats = {
+            'inMessages': 0L,
+            'outMessages': 0L,
+            'outDrops': 0L,
+            'congestionEvents': 0L,
+            'readEvents': 0L,
+            'writeEvents': 0L,
+            'maxReadBatch': 0,
+            'maxWriteBatch': 0,
+            'socketRecvBufferGrowths': 0L,
+            'readBatchSizes': {},   # batch size -> number of events
+            'writeBatchSizes': {}
+            }
         AbstractSocketTransport.__init__(self, sock, sockMap)
         
     def openClientMode(self, iface=None):
@@ -34,7 +97,18 @@ class DgramSocketTransport(AbstractSocketTransport):
                 raise error.CarrierError('bind() failed: %s' % (why,))
         return self
     
-    def openServerMode(self, iface):
+    def openServerMode(self, iface, reusePort=0):
+        # With reusePort, several processes may bind the same address
+        # and have kernel spread incoming datagrams among them
+        if reusePort:
+            if SO_REUSEPORT is None:
+                raise error.CarrierError('SO_REUSEPORT not supported')
+            try:
+                self.socket.setsockopt(
+                    socket.SOL_SOCKET, SO_REUSEPORT, 1
+                    )
+            except socket.error, why:
+                raise error.CarrierError('setsockopt() failed: %s' % (why,))
         try:
             self.socket.bind(iface)
         except socket.error, why:
@@ -42,41 +116,228 @@ class DgramSocketTransport(AbstractSocketTransport):
         self._iface = iface
         return self
 
+    def setSocketBuffers(self, recvSize=None, sendSize=None,
+                         maxRecvSize=None):
+        """Set SO_RCVBUF/SO_SNDBUF sizes (None keeps current ones). With
+           maxRecvSize receive buffer grows up to this size while reads
+           keep up with incoming traffic poorly (batched reads only, see
+           maxReadBatch).
+        """
+        try:
+            if recvSize is not None:
+                self.socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_RCVBUF, recvSize
+                    )
+            if sendSize is not None:
+                self.socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_SNDBUF, sendSize
+                    )
+        except socket.error, why:
+            raise error.CarrierError('setsockopt() failed: %s' % (why,))
+        if maxRecvSize is not None:
+            self.__maxSocketRecvBuffer = maxRecvSize
+            self.__fullReadBatches = 0
+        return self
+
+    def getSocketBuffers(self):
+        """Return actual (SO_RCVBUF, SO_SNDBUF) sizes"""
+        try:
+            return (
+                self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+                self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+                )
+        except socket.error, why:
+            raise error.CarrierError('getsockopt() failed: %s' % (why,))
+
+    def getKernelDrops(self):
+        """Return number of datagrams dropped by kernel on this socket
+           or None where not known
+        """
+        return None
+
+    def __growSocketRecvBuffer(self):
+        recvSize, sendSize = self.getSocketBuffers()
+        newSize = min(recvSize * 2, self.__maxSocketRecvBuffer)
+        if newSize > recvSize:
+            self.setSocketBuffers(newSize)
+            actualSize = self.getSocketBuffers()[0]
+            if actualSize > newSize:
+                # Linux doubles requested size to account bookkeeping
+                self.setSocketBuffers(newSize / 2)
+                actualSize = self.getSocketBuffers()[0]
+            if actualSize > recvSize:
+                self.__stats['socketRecvBufferGrowths'] = self.__stats['socketRecvBufferGrowths'] + 1
+                debug.logger & debug.flagIO and debug.logger('__growSocketRecvBuffer: SO_RCVBUF grown from %s to %s' % (recvSize, actualSize))
+                return
+        # Hit either our or system limit
+        self.__maxSocketRecvBuffer = 0
+        debug.logger & debug.flagIO and debug.logger('__growSocketRecvBuffer: SO_RCVBUF limit of %s reached' % recvSize)
+
     def sendMessage(self, outgoingMessage, transportAddress):
+        if self._captureFun is not None:
+            self._captureFun(1, transportAddress, outgoingMessage)
+        queueLen = len(self.__outQueue)
+        # Try sending right away if nothing is queued ahead, this also
+        # saves worker threads from waking up I/O loop to send
+        if not queueLen:
+            try:
+                self.socket.sendto(outgoingMessage, transportAddress)
+            except socket.error, why:
+                if why[0] != errno.EAGAIN and why[0] != errno.EWOULDBLOCK:
+                    if sockErrors.has_key(why[0]):
+                        debug.logger & debug.flagIO and debug.logger('sendMessage: ignoring socket error %s' % (why,))
+                        return
+                    raise error.CarrierError('sendto() failed: %s' % (why,))
+            else:
+                debug.logger & debug.flagIO and debug.logger('sendMessage: transportAddress %s outgoingMessage %s' % (transportAddress, repr(outgoingMessage)))
+                self.__stats['outMessages'] = self.__stats['outMessages'] + 1
+                return
+        if self.sendQueueLimit and queueLen >= self.sendQueueLimit:
+            self.__stats['outDrops'] = self.__stats['outDrops'] + 1
+            debug.logger & debug.flagIO and debug.logger('sendMessage: send queue full (%d), message to %s dropped' % (queueLen, transportAddress))
+            return
         self.__outQueue.append(
             (outgoingMessage, transportAddress)
             )
+        if not self.__congested and self.sendQueueHighWatermark and \
+               queueLen + 1 >= self.sendQueueHighWatermark:
+            self.__congested = 1
+            self.__stats['congestionEvents'] = self.__stats['congestionEvents'] + 1
+            debug.logger & debug.flagIO and debug.logger('sendMessage: send queue congested (%d)' % (queueLen + 1))
+            if self._flowCtlCbFun is not None:
+                self._flowCtlCbFun(self, 1)
+
+    def isCongested(self): return self.__congested
+
+    def getStatistics(self):
+        """Return a snapshot of transport I/O counters"""
+        stats = self.__stats.copy()
+        stats['readBatchSizes'] = stats['readBatchSizes'].copy()
+        stats['writeBatchSizes'] = stats['writeBatchSizes'].copy()
+        try:
+            stats['socketRecvBuffer'], stats['socketSendBuffer'] = \
+                                       self.getSocketBuffers()
+        except error.CarrierError:
+            pass  # closed socket
+        kernelDrops = self.getKernelDrops()
+        if kernelDrops is not None:
+            stats['kernelDrops'] = kernelDrops
+        return stats
+    
+    def __countBatch(self, direction, count):
+        stats = self.__stats
+        if direction == 'read':
+            stats['readEvents'] = stats['readEvents'] + 1
+            stats['inMessages'] = stats['inMessages'] + count
+            sizes = stats['readBatchSizes']
+            if count > stats['maxReadBatch']:
+                stats['maxReadBatch'] = count
+        else:
+            stats['writeEvents'] = stats['writeEvents'] + 1
+            stats['outMessages'] = stats['outMessages'] + count
+            sizes = stats['writeBatchSizes']
+            if count > stats['maxWriteBatch']:
+                stats['maxWriteBatch'] = count
+        sizes[count] = sizes.get(count, 0) + 1
 
     # asyncore API
     def handle_connect(self): pass
     def writable(self): return self.__outQueue
     def handle_write(self):
-        outgoingMessage, transportAddress = self.__outQueue.pop()
-        debug.logger & debug.flagIO and debug.logger('handle_write: transportAddress %s outgoingMessage %s' % (transportAddress, repr(outgoingMessage)))
-        try:
-            self.socket.sendto(outgoingMessage, transportAddress)
-        except socket.error, why:
-            if sockErrors.has_key(why[0]):
-                debug.logger & debug.flagIO and debug.logger('handle_write: ignoring socket error %s' % (why,))
-            else:
-                raise socket.error, why
+        count = 0
+        while self.__outQueue:
+            outgoingMessage, transportAddress = self.__outQueue.popleft()
+            debug.logger & debug.flagIO and debug.logger('handle_write: transportAddress %s outgoingMessage %s' % (transportAddress, repr(outgoingMessage)))
+            try:
+                self.socket.sendto(outgoingMessage, transportAddress)
+            except socket.error, why:
+                if why[0] == errno.EAGAIN or why[0] == errno.EWOULDBLOCK:
+                    # Send buffer is full -- retry on next write event
+                    self.__outQueue.appendleft(
+                        (outgoingMessage, transportAddress)
+                        )
+                    debug.logger & debug.flagIO and debug.logger('handle_write: send buffer full, %d message(s) queued' % len(self.__outQueue))
+                    break
+                elif sockErrors.has_key(why[0]):
+                    debug.logger & debug.flagIO and debug.logger('handle_write: ignoring socket error %s' % (why,))
+                else:
+                    raise socket.error, why
+            count = count + 1
+            if count == self.maxWriteBatch:
+                break
+        if count:
+            self.__countBatch('write', count)
+        if self.__congested and \
+               len(self.__outQueue) <= self.sendQueueLowWatermark:
+            self.__congested = 0
+            debug.logger & debug.flagIO and debug.logger('handle_write: send queue relieved (%d)' % len(self.__outQueue))
+            if self._flowCtlCbFun is not None:
+                self._flowCtlCbFun(self, 0)
             
+    def holdIncomingMessage(self):
+        """Take receive buffer holding message being passed to receive
+           callback out of reuse. Return a function putting it back
+           or None if messages are not received into reusable buffers.
+        """
+        recvBuffer = self.__recvBuffer
+        if recvBuffer is None:
+            return
+        self.__recvBuffer = None
+        return lambda self=self, recvBuffer=recvBuffer: \
+               self.__releaseRecvBuffer(recvBuffer)
+
+    def __releaseRecvBuffer(self, recvBuffer):
+        if len(self.__spareRecvBuffers) < self.maxSpareRecvBuffers:
+            self.__spareRecvBuffers.append(recvBuffer)
+
     def readable(self): return 1
     def handle_read(self):
-        try:
-            incomingMessage, transportAddress = self.socket.recvfrom(65535)
-            debug.logger & debug.flagIO and debug.logger('handle_read: transportAddress %s incomingMessage %s' % (transportAddress, repr(incomingMessage)))
+        count = 0
+        while 1:
+            try:
+                if self.__spareRecvBuffers is None:
+                    incomingMessage, transportAddress = self.socket.recvfrom(
+                        self.recvBufferSize
+                        )
+                else:
+                    recvBuffer = self.__recvBuffer
+                    if recvBuffer is None:
+                        try:
+                            recvBuffer = self.__spareRecvBuffers.pop()
+                        except IndexError:
+                            recvBuffer = bytearray(self.recvBufferSize)
+                        self.__recvBuffer = recvBuffer
+                    size, transportAddress = self.socket.recvfrom_into(
+                        recvBuffer
+                        )
+                    # Message is only valid till receive callback returns
+                    incomingMessage = buffer(recvBuffer, 0, size)
+            except socket.error, why:
+                if sockErrors.has_key(why[0]):
+                    debug.logger & debug.flagIO and debug.logger('handle_read: known socket error %s' % (why,))
+                    sockErrors[why[0]] and self.handle_close()
+                    break
+                else:
+                    raise socket.error, why
+            debug.logger & debug.flagIO and debug.logger('handle_read: transportAddress %s incomingMessage %s' % (transportAddress, repr(str(incomingMessage))))
             if not incomingMessage:
                 self.handle_close()
-                return
-            else:
-                self._cbFun(self, transportAddress, incomingMessage)
-                return
-        except socket.error, why:
-            if sockErrors.has_key(why[0]):
-                debug.logger & debug.flagIO and debug.logger('handle_read: known socket error %s' % (why,))
-                sockErrors[why[0]] and self.handle_close()
-                return
-            else:
-                raise socket.error, why
+                break
+            count = count + 1
+            if self._captureFun is not None:
+                self._captureFun(0, transportAddress, str(incomingMessage))
+            self._cbFun(self, transportAddress, incomingMessage)
+            # Transport might have been closed by the callback
+            if count == self.maxReadBatch or self._cbFun is None:
+                break
+        if count:
+            self.__countBatch('read', count)
+            if self.__maxSocketRecvBuffer and self.maxReadBatch != 1:
+                if count >= (self.maxReadBatch or 64):
+                    self.__fullReadBatches = self.__fullReadBatches + 1
+                    if self.__fullReadBatches >= self.fullReadBatchesToGrow:
+                        self.__fullReadBatches = 0
+                        self.__growSocketRecvBuffer()
+                else:
+                    self.__fullReadBatches = 0
     def handle_close(self): pass # no datagram connection
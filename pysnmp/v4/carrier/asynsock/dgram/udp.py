@@ -1,4 +1,5 @@
 """Implements asyncore-based UDP transport domain"""
+import os, socket
 from socket import AF_INET
 from pysnmp.carrier.asynsock.dgram.base import DgramSocketTransport
 
@@ -6,5 +7,24 @@ domainName = snmpUDPDomain = (1, 3, 6, 1, 6, 1, 1)
 
 class UdpSocketTransport(DgramSocketTransport):
     sockFamily = AF_INET
+    # Linux lists UDP sockets along with their drop counters here
+    procNetFile = '/proc/net/udp'
+
+    def getKernelDrops(self):
+        try:
+            inode = str(os.fstat(self.socket.fileno()).st_ino)
+            f = open(self.procNetFile)
+        except (OSError, IOError, socket.error):
+            return
+        try:
+            f.readline()  # header
+            for line in f:
+                # sl local_address rem_address st tx_queue:rx_queue
+                # tr:tm->when retrnsmt uid timeout inode ref pointer drops
+                fields = line.split()
+                if len(fields) > 12 and fields[9] == inode:
+                    return long(fields[12])
+        finally:
+            f.close()
 
 UdpTransport = UdpSocketTransport
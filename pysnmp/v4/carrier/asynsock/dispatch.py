@@ -2,10 +2,13 @@ try:
     from sys import version_info
 except ImportError:
     version_info = ( 0, 0 )   # a really early version
+import errno
 from time import time
 from select import select
 from asyncore import socket_map
 from pysnmp.carrier.base import AbstractTransportDispatcher
+from pysnmp.carrier import error
+import select as _select
 
 # Old asyncore doesn't allow socket_map param at poll
 if version_info < (2, 0):
@@ -50,6 +53,8 @@ class AsynsockDispatcher(AbstractTransportDispatcher):
         AbstractTransportDispatcher.unregisterTransport(self, tDomain)
 
     def transportsAreWorking(self):
+        if self.messagesAreDeferred():
+            return 1
         for transport in self.__sockMap.values():
             if transport.writable():
                 return 1
@@ -57,5 +62,167 @@ class AsynsockDispatcher(AbstractTransportDispatcher):
     
     def runDispatcher(self, timeout=0.0):
         while self.jobsArePending() or self.transportsAreWorking():
-            poll(self.timeout, self.__sockMap)
+            poll(self.getTimerTimeout(time(), self.timeout), self.__sockMap)
+            self.handleTimerTick(time())
+
+# epoll() is Linux-specific, poll() is not available on some platforms
+if hasattr(_select, 'epoll'):
+    _pollerFactory = _select.epoll
+    _readMask = _select.EPOLLIN | _select.EPOLLPRI
+    _writeMask = _select.EPOLLOUT
+    _errMask = _select.EPOLLERR | _select.EPOLLHUP
+    def _pollTimeout(timeout):
+        return timeout      # epoll() timeout is in seconds
+elif hasattr(_select, 'poll'):
+    _pollerFactory = _select.poll
+    _readMask = _select.POLLIN | _select.POLLPRI
+    _writeMask = _select.POLLOUT
+    _errMask = _select.POLLERR | _select.POLLHUP | _select.POLLNVAL
+    def _pollTimeout(timeout):
+        # poll() timeout is in milliseconds, round it up so as not
+        # to spin till a sub-millisecond deadline
+        return int(timeout * 1000 + 0.999)
+else:
+    _pollerFactory = None
+
+class _PollSocketMap(dict):
+    """Socket map registering channels with poller as they are added or
+       removed, so that transports owning several sockets (e.g. stream
+       connections) get them polled
+    """
+    def __init__(self, channelAdded, channelRemoved):
+        dict.__init__(self)
+        self.__channelAdded = channelAdded
+        self.__channelRemoved = channelRemoved
+
+    def __setitem__(self, fd, channel):
+        if self.has_key(fd):
+            self.__channelRemoved(fd)
+        dict.__setitem__(self, fd, channel)
+        self.__channelAdded(fd, channel)
+
+    def __delitem__(self, fd):
+        dict.__delitem__(self, fd)
+        self.__channelRemoved(fd)
+
+class AsynsockPollDispatcher(AsynsockDispatcher):
+    """Implements I/O over asynchronous sockets by means of epoll()/poll().
+       Transports are registered with the poller once, write interest is
+       only armed while transport has something to send.
+    """
+    def __init__(self):
+        if _pollerFactory is None:
+            raise error.CarrierError('Neither epoll() nor poll() supported')
+        self.__poller = _pollerFactory()
+        # Older poll() objects re-register fd instead of modify()'ing it
+        self.__modify = getattr(
+            self.__poller, 'modify', self.__poller.register
+            )
+        self.__armedFds = {}   # fds with write interest armed
+        AsynsockDispatcher.__init__(self)
+        self.__fdMap = _PollSocketMap(
+            self.__registerChannel, self.__unregisterChannel
+            )
+        self.setSocketMap(self.__fdMap)
+
+    # Workers may send (and get stream connections opened) so armed
+    # fds are only managed under dispatcher lock
+
+    def __registerChannel(self, fd, channel):
+        self._lock.acquire()
+        try:
+            self.__poller.register(fd, _readMask)
+            if channel.writable():
+                self.__armWrite(fd)
+        finally:
+            self._lock.release()
+
+    def __unregisterChannel(self, fd):
+        self._lock.acquire()
+        try:
+            if self.__armedFds.has_key(fd):
+                del self.__armedFds[fd]
+            try:
+                self.__poller.unregister(fd)
+            except (IOError, OSError, ValueError, KeyError):
+                pass  # fd might have been closed already
+        finally:
+            self._lock.release()
+
+    def _transmitMessage(
+        self, outgoingMessage, transportDomain, transportAddress
+        ):
+        AsynsockDispatcher._transmitMessage(
+            self, outgoingMessage, transportDomain, transportAddress
+            )
+        transport = self.getTransport(transportDomain)
+        if transport is None:
+            return
+        # Multi-socket transports tell which of their channels got
+        # something to send
+        if hasattr(transport, 'getPendingChannels'):
+            channels = transport.getPendingChannels()
+        else:
+            channels = ( transport, )
+        self._lock.acquire()
+        try:
+            for channel in channels:
+                fd = channel._fileno
+                if self.__fdMap.get(fd) is channel and \
+                       not self.__armedFds.has_key(fd) and \
+                       channel.writable():
+                    self.__armWrite(fd)
+        finally:
+            self._lock.release()
+
+    def __armWrite(self, fd):
+        self.__modify(fd, _readMask | _writeMask)
+        self.__armedFds[fd] = 1
+
+    def __disarmWrite(self, fd):
+        self.__modify(fd, _readMask)
+        del self.__armedFds[fd]
+
+    def transportsAreWorking(self):
+        if self.__armedFds or self.messagesAreDeferred():
+            return 1
+        else:
+            return 0
+
+    def __poll(self, timeout):
+        try:
+            events = self.__poller.poll(_pollTimeout(timeout))
+        except (IOError, OSError, _select.error), why:
+            if why[0] == errno.EINTR:
+                return
+            raise
+        for fd, flags in events:
+            transport = self.__fdMap.get(fd)
+            if transport is None:
+                continue
+            try:
+                if flags & _readMask:
+                    transport.handle_read_event()
+                # Channel might have been closed by the previous handler
+                if flags & _writeMask and self.__fdMap.get(fd) is transport:
+                    transport.handle_write_event()
+                if flags & _errMask and self.__fdMap.get(fd) is transport:
+                    transport.handle_expt_event()
+            except:
+                transport.handle_error()
+            self._lock.acquire()
+            try:
+                if self.__fdMap.get(fd) is transport:
+                    writable = transport.writable()
+                    if self.__armedFds.has_key(fd):
+                        if not writable:
+                            self.__disarmWrite(fd)
+                    elif writable:
+                        self.__armWrite(fd)
+            finally:
+                self._lock.release()
+            
+    def runDispatcher(self, timeout=0.0):
+        while self.jobsArePending() or self.transportsAreWorking():
+            self.__poll(self.getTimerTimeout(time(), self.timeout))
             self.handleTimerTick(time())
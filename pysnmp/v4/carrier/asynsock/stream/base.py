@@ -0,0 +1,396 @@
+"""Implements asyncore-based generic STREAM transport (RFC 3430).
+   SNMP messages are framed by their own BER length.
+"""
+import socket, errno, sys, string
+import asyncore
+from time import time
+from pysnmp.carrier.asynsock.base import AbstractSocketTransport
+from pysnmp.carrier import error
+from pysnmp.compat import deque
+from pysnmp import debug
+
+# Socket errors not worth reporting, they just close connection
+retryErrors = { errno.EAGAIN: 1, errno.EWOULDBLOCK: 1, errno.EINTR: 1 }
+
+def getMessageSize(data):
+    """Return whole size of BER-encoded message judging from its header,
+       None if the header is not complete yet
+    """
+    if len(data) < 2:
+        return
+    if data[0] != '\x30':
+        raise error.CarrierError('Not a SEQUENCE tag %s' % repr(data[0]))
+    firstOctet = ord(data[1])
+    if firstOctet < 0x80:
+        return 2 + firstOctet
+    lengthSize = firstOctet & 0x7f
+    if lengthSize == 0 or lengthSize > 4:
+        raise error.CarrierError(
+            'Unsupported BER length of %s octets' % lengthSize
+            )
+    if len(data) < 2 + lengthSize:
+        return
+    size = 0L
+    for c in data[2:2+lengthSize]:
+        size = size << 8 | ord(c)
+    return 2 + lengthSize + size
+
+class StreamConnection(asyncore.dispatcher):
+    """A single connection of stream transport"""
+    def __init__(self, transport, sock, transportAddress, sockMap,
+                 accepted=0):
+        self.transport = transport
+        self.transportAddress = transportAddress
+        self.accepted = accepted
+        self.closed = 0
+        self.lastActivity = time()
+        self.outBytes = 0
+        self.__outQueue = deque()
+        self.__inChunks = []
+        self.__inBytes = 0
+        self.__messageSize = None
+        asyncore.dispatcher.__init__(self, sock, sockMap)
+
+    def isBusy(self):
+        if self.outBytes or not self.connected:
+            return 1
+        else:
+            return 0
+
+    def queueMessage(self, outgoingMessage):
+        self.__outQueue.append(outgoingMessage)
+        self.outBytes = self.outBytes + len(outgoingMessage)
+
+    def getQueuedMessages(self): return len(self.__outQueue)
+
+    # asyncore API
+    def handle_connect(self):
+        self.lastActivity = time()
+        debug.logger & debug.flagIO and debug.logger('handle_connect: connected to %s' % (self.transportAddress,))
+
+    def writable(self):
+        if not self.connected or self.__outQueue:
+            return 1
+        else:
+            return 0
+
+    def handle_write(self):
+        while self.__outQueue:
+            data = self.__outQueue.popleft()
+            try:
+                sent = self.socket.send(data)
+            except socket.error, why:
+                self.__outQueue.appendleft(data)
+                if not retryErrors.has_key(why[0]):
+                    self.transport.closeConnection(self, why)
+                return
+            self.outBytes = self.outBytes - sent
+            self.lastActivity = time()
+            if sent < len(data):
+                self.__outQueue.appendleft(data[sent:])
+                break
+
+    def readable(self): return 1
+    def handle_read(self):
+        try:
+            data = self.socket.recv(self.transport.recvBufferSize)
+        except socket.error, why:
+            if not retryErrors.has_key(why[0]):
+                self.transport.closeConnection(self, why)
+            return
+        if not data:
+            self.transport.closeConnection(self)
+            return
+        self.lastActivity = time()
+        self.__inChunks.append(data)
+        self.__inBytes = self.__inBytes + len(data)
+        while self.__inBytes:
+            if self.__messageSize is None:
+                if len(self.__inChunks) > 1:
+                    self.__inChunks = [ string.join(self.__inChunks, '') ]
+                try:
+                    self.__messageSize = getMessageSize(self.__inChunks[0])
+                except error.CarrierError, why:
+                    self.transport.closeConnection(self, why)
+                    return
+                if self.__messageSize is None:
+                    break
+                if self.__messageSize > self.transport.maxMessageSize:
+                    self.transport.closeConnection(
+                        self, 'message of %s octets exceeds maxMessageSize' % self.__messageSize
+                        )
+                    return
+            # Large messages are collected in chunks and joined just once
+            if self.__inBytes < self.__messageSize:
+                break
+            data = string.join(self.__inChunks, '')
+            incomingMessage = data[:self.__messageSize]
+            data = data[self.__messageSize:]
+            if data:
+                self.__inChunks = [ data ]
+            else:
+                self.__inChunks = []
+            self.__inBytes = len(data)
+            self.__messageSize = None
+            self.transport.messageReceived(self, incomingMessage)
+            # Connection might have been closed by the callback
+            if self.closed:
+                return
+
+    def handle_close(self):
+        self.transport.closeConnection(self)
+
+    def handle_expt(self): pass
+
+    def handle_error(self):
+        why = sys.exc_info()[1]
+        if isinstance(why, socket.error):
+            self.transport.closeConnection(self, why)
+        else:
+            raise
+
+class StreamSocketTransport(AbstractSocketTransport):
+    """Keeps up to connectionsPerTarget persistent connections to each
+       peer in client mode, accepts up to maxConnections of them in
+       server mode. Messages to peer are sent over its least loaded
+       connection.
+    """
+    sockType = socket.SOCK_STREAM
+    # Client mode: max connections to a single peer, additional ones
+    # are opened while existing ones have unsent data
+    connectionsPerTarget = 1
+    # Server mode: max accepted connections (0 is unlimited)
+    maxConnections = 4096
+    listenBacklog = 128
+    # Connections idle for this long are closed (0 disables)
+    idleTimeout = 300
+    # Per-connection send queue limit in octets, messages submitted
+    # over this limit are dropped
+    sendQueueLimit = 4 * 1024 * 1024
+    # Largest message to receive, peers sending longer ones are
+    # disconnected
+    maxMessageSize = 16 * 1024 * 1024
+    recvBufferSize = 65536
+    def __init__(self, sock=None, sockMap=None):
+        self.__sockMap = None
+        self.__iface = None
+        self.__connections = {}  # address -> [ connection, ... ]
+        self.__connectionsCount = 0
+        self.__pendingChannels = {}  # id(connection) -> connection
+        self.__closedPeers = {}  # address -> time accepted conn closed
+        self.__nextPurge = time() + self.idleTimeout
+        self.__stats = {
+            'inMessages': 0L,
+            'outMessages': 0L,
+            'outDrops': 0L,
+            'connectionsOpened': 0L,
+            'connectionsAccepted': 0L,
+            'connectionsRefused': 0L,
+            'connectionsClosed': 0L,
+            'connectionErrors': 0L
+            }
+        AbstractSocketTransport.__init__(self, sock, sockMap)
+
+    def registerSocket(self, sockMap=None):
+        # Listening socket is only polled in server mode, connections
+        # come and go on their own
+        if self.accepting:
+            self.add_channel(sockMap)
+        self.__sockMap = sockMap
+        for connections in self.__connections.values():
+            for connection in connections:
+                connection.add_channel(sockMap)
+
+    def unregisterSocket(self, sockMap=None):
+        for connections in self.__connections.values():
+            for connection in connections[:]:
+                self.closeConnection(connection)
+        if self.accepting:
+            self.del_channel(sockMap)
+        self.__sockMap = None
+
+    def getPendingChannels(self):
+        """Return connections got messages queued since last call"""
+        channels = self.__pendingChannels.values()
+        self.__pendingChannels.clear()
+        return channels
+
+    def getStatistics(self):
+        """Return a snapshot of transport I/O counters"""
+        stats = self.__stats.copy()
+        stats['connections'] = self.__connectionsCount
+        return stats
+
+    # Connections management
+
+    def __addConnection(self, sock, transportAddress, accepted=0):
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (socket.error, AttributeError):
+            pass  # not a TCP socket
+        if self.__sockMap is None:
+            sockMap = {}  # added to dispatcher's map on registration
+        else:
+            sockMap = self.__sockMap
+        connection = StreamConnection(
+            self, sock, transportAddress, sockMap, accepted
+            )
+        if self.__connections.has_key(transportAddress):
+            self.__connections[transportAddress].append(connection)
+        else:
+            self.__connections[transportAddress] = [ connection ]
+        self.__connectionsCount = self.__connectionsCount + 1
+        return connection
+
+    def __openConnection(self, transportAddress):
+        try:
+            sock = socket.socket(self.sockFamily, self.sockType)
+            if self.__iface is not None:
+                sock.bind(self.__iface)
+        except socket.error, why:
+            raise error.CarrierError('socket() failed: %s' % (why,))
+        connection = self.__addConnection(sock, transportAddress)
+        self.__stats['connectionsOpened'] = self.__stats['connectionsOpened'] + 1
+        debug.logger & debug.flagIO and debug.logger('__openConnection: connecting to %s' % (transportAddress,))
+        try:
+            connection.connect(transportAddress)
+        except socket.error, why:
+            self.closeConnection(connection, why)
+            return
+        return connection
+
+    def closeConnection(self, connection, why=None):
+        if connection.closed:
+            return
+        connection.closed = 1
+        if why is not None:
+            self.__stats['connectionErrors'] = self.__stats['connectionErrors'] + 1
+        dropped = connection.getQueuedMessages()
+        if dropped:
+            self.__stats['outDrops'] = self.__stats['outDrops'] + dropped
+        debug.logger & debug.flagIO and debug.logger('closeConnection: connection to %s closed (%s), %s message(s) dropped' % (connection.transportAddress, why, dropped))
+        transportAddress = connection.transportAddress
+        connections = self.__connections.get(transportAddress)
+        if connections and connection in connections:
+            connections.remove(connection)
+            if not connections:
+                del self.__connections[transportAddress]
+            self.__connectionsCount = self.__connectionsCount - 1
+        if self.__pendingChannels.has_key(id(connection)):
+            del self.__pendingChannels[id(connection)]
+        if connection.accepted:
+            # Not to connect back to peer's ephemeral port
+            self.__closedPeers[transportAddress] = time()
+        if self.__sockMap is not None:
+            connection.del_channel(self.__sockMap)
+        connection.close()
+        self.__stats['connectionsClosed'] = self.__stats['connectionsClosed'] + 1
+
+    def __purgeConnections(self, timeNow):
+        for connections in self.__connections.values():
+            for connection in connections[:]:
+                if not connection.isBusy() and \
+                       timeNow - connection.lastActivity > self.idleTimeout:
+                    self.closeConnection(connection, 'idle timeout')
+        for transportAddress, closedAt in self.__closedPeers.items():
+            if timeNow - closedAt > self.idleTimeout:
+                del self.__closedPeers[transportAddress]
+        self.__nextPurge = timeNow + self.idleTimeout
+
+    def messageReceived(self, connection, incomingMessage):
+        debug.logger & debug.flagIO and debug.logger('messageReceived: transportAddress %s incomingMessage %s' % (connection.transportAddress, repr(incomingMessage)))
+        self.__stats['inMessages'] = self.__stats['inMessages'] + 1
+        if self._captureFun is not None:
+            self._captureFun(0, connection.transportAddress, incomingMessage)
+        if self._cbFun is None:
+            raise error.CarrierError('Unable to call cbFun')
+        self._cbFun(self, connection.transportAddress, incomingMessage)
+
+    # Public API
+
+    def openClientMode(self, iface=None):
+        self.__iface = iface
+        return self
+
+    def openServerMode(self, iface):
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(iface)
+            self.listen(self.listenBacklog)
+        except socket.error, why:
+            raise error.CarrierError('bind() failed: %s' % (why,))
+        return self
+
+    def sendMessage(self, outgoingMessage, transportAddress):
+        transportAddress = tuple(transportAddress)  # may be SnmpUDPAddress
+        if self._captureFun is not None:
+            self._captureFun(1, transportAddress, outgoingMessage)
+        timeNow = time()
+        if self.idleTimeout and timeNow > self.__nextPurge:
+            self.__purgeConnections(timeNow)
+        connection = None
+        connections = self.__connections.get(transportAddress)
+        if connections:
+            for c in connections:
+                if connection is None or c.outBytes < connection.outBytes:
+                    connection = c
+            if connection.isBusy() and not connection.accepted and \
+                   len(connections) < self.connectionsPerTarget:
+                connection = self.__openConnection(transportAddress)
+        elif self.__closedPeers.has_key(transportAddress):
+            self.__stats['outDrops'] = self.__stats['outDrops'] + 1
+            debug.logger & debug.flagIO and debug.logger('sendMessage: connection from %s gone, message dropped' % (transportAddress,))
+            return
+        else:
+            connection = self.__openConnection(transportAddress)
+        if connection is None:
+            self.__stats['outDrops'] = self.__stats['outDrops'] + 1
+            return
+        if connection.outBytes + len(outgoingMessage) > self.sendQueueLimit:
+            self.__stats['outDrops'] = self.__stats['outDrops'] + 1
+            debug.logger & debug.flagIO and debug.logger('sendMessage: send queue full (%d octets), message to %s dropped' % (connection.outBytes, transportAddress))
+            return
+        debug.logger & debug.flagIO and debug.logger('sendMessage: transportAddress %s outgoingMessage %s' % (transportAddress, repr(outgoingMessage)))
+        connection.queueMessage(outgoingMessage)
+        self.__stats['outMessages'] = self.__stats['outMessages'] + 1
+        # Try sending right away unless more data is queued ahead
+        if connection.connected and \
+               connection.outBytes == len(outgoingMessage):
+            connection.handle_write()
+            if connection.closed or not connection.outBytes:
+                return
+        self.__pendingChannels[id(connection)] = connection
+
+    def closeTransport(self):
+        for connections in self.__connections.values():
+            for connection in connections[:]:
+                self.closeConnection(connection)
+        AbstractSocketTransport.closeTransport(self)
+
+    # asyncore API
+    def readable(self): return self.accepting
+    def writable(self): return 0
+    def handle_accept(self):
+        while 1:
+            try:
+                pair = self.accept()
+            except socket.error, why:
+                debug.logger & debug.flagIO and debug.logger('handle_accept: accept() failed: %s' % (why,))
+                break
+            if pair is None:
+                break
+            sock, transportAddress = pair
+            if self.maxConnections and \
+                   self.__connectionsCount >= self.maxConnections:
+                self.__stats['connectionsRefused'] = self.__stats['connectionsRefused'] + 1
+                debug.logger & debug.flagIO and debug.logger('handle_accept: too many connections, %s refused' % (transportAddress,))
+                sock.close()
+                continue
+            self.__addConnection(sock, transportAddress, 1)
+            self.__stats['connectionsAccepted'] = self.__stats['connectionsAccepted'] + 1
+            if self.__closedPeers.has_key(transportAddress):
+                del self.__closedPeers[transportAddress]
+            debug.logger & debug.flagIO and debug.logger('handle_accept: connection from %s' % (transportAddress,))
+        timeNow = time()
+        if self.idleTimeout and timeNow > self.__nextPurge:
+            self.__purgeConnections(timeNow)
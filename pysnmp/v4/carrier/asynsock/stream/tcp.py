@@ -0,0 +1,11 @@
+"""Implements asyncore-based TCP transport domain"""
+from socket import AF_INET
+from pysnmp.carrier.asynsock.stream.base import StreamSocketTransport
+
+# transportDomainTcpIpv4 of TRANSPORT-ADDRESS-MIB (RFC 3419)
+domainName = snmpTCPDomain = (1, 3, 6, 1, 2, 1, 100, 1, 5)
+
+class TcpSocketTransport(StreamSocketTransport):
+    sockFamily = AF_INET
+
+TcpTransport = TcpSocketTransport
@@ -1,13 +1,73 @@
 """Abstract I/O dispatcher. Defines standard dispatcher API"""
+import heapq
+from time import time
+try:
+    import threading
+except ImportError:
+    threading = None
 from pysnmp.carrier import error
+from pysnmp.compat import deque, NullLock
+
+class TokenBucket:
+    """Token bucket rate limiter: rate tokens per second, at most burst
+       of them accumulated"""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        if burst is None:
+            burst = max(self.rate, 1.0)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.lastTime = time()
+
+    def refill(self, timeNow):
+        if timeNow > self.lastTime:
+            self.tokens = min(
+                self.burst, self.tokens + (timeNow-self.lastTime)*self.rate
+                )
+        self.lastTime = timeNow
+
+    def getDelay(self, timeNow):
+        """Return time to wait for a token, zero if one is available"""
+        self.refill(timeNow)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens = self.tokens - 1.0
 
 class AbstractTransportDispatcher:
+    # Whether executor's worker threads may call into dispatcher (that
+    # is, schedule timers and send messages)
+    threadSafe = 1
     def __init__(self):
         self.__transports = {}
         self.__jobs = {}
         self.__recvCbFun = None
+        self.__recvTransport = None  # one passing message to recvCbFun
         self.__timerCbFuns = []
+        self.__flowCtlCbFuns = []
+        self.__congestedTransports = {}
         self.__timeToGo = 0
+        self.__timerQueue = []  # heap of [ deadline, seq, cbFun, cbArgs ]
+        self.__timerSeq = 0L
+        self.__timersCancelled = 0
+        # Outgoing messages pacing
+        self.__globalBucket = None
+        self.__destinationRate = None
+        self.__destinationBuckets = {}
+        self.__bucketsPurgeSize = 1024
+        self.__deferredMessages = {}  # (domain, address) -> deque
+        self.__deferredDestinations = deque()  # round-robin order
+        self.__deferredCount = 0
+        self.__pacingTimer = None
+        # Timers, pacing state and whatever subclasses keep for sending
+        # may be touched by engine's worker threads, not just I/O loop.
+        # No callbacks get called and nothing gets sent under this lock.
+        if threading is None:
+            self._lock = NullLock()
+        else:
+            self._lock = threading.RLock()
 
     def _cbFun(self, incomingTransport, transportAddress, incomingMessage):
         for name, transport in self.__transports.items():
@@ -22,9 +82,29 @@ class AbstractTransportDispatcher:
             raise error.CarrierError(
                 'Receive callback not registered -- loosing incoming event'
                 )
-        self.__recvCbFun(
-            self, transportDomain, transportAddress, incomingMessage
-            )
+        self.__recvTransport = incomingTransport
+        try:
+            self.__recvCbFun(
+                self, transportDomain, transportAddress, incomingMessage
+                )
+        finally:
+            self.__recvTransport = None
+
+    def _flowCtlCbFun(self, transport, congested):
+        for name, t in self.__transports.items():
+            if t is transport:
+                transportDomain = name
+                break
+        else:
+            raise error.CarrierError(
+                'Unregistered transport %s' % (transport,)
+                )
+        if congested:
+            self.__congestedTransports[transportDomain] = 1
+        elif self.__congestedTransports.has_key(transportDomain):
+            del self.__congestedTransports[transportDomain]
+        for flowCtlCbFun in self.__flowCtlCbFuns:
+            flowCtlCbFun(self, transportDomain, congested)
 
     # Dispatcher API
     
@@ -38,6 +118,16 @@ class AbstractTransportDispatcher:
     def unregisterRecvCbFun(self):
         self.__recvCbFun = None
 
+    def holdIncomingMessage(self):
+        """Keep message being passed to receive callback valid past
+           callback return. Return a function to call once done with
+           the message or None if message is not held in a reusable
+           buffer (so it remains valid anyway).
+        """
+        holdFun = getattr(self.__recvTransport, 'holdIncomingMessage', None)
+        if holdFun is not None:
+            return holdFun()
+
     def registerTimerCbFun(self, timerCbFun):
         self.__timerCbFuns.append(timerCbFun)
 
@@ -47,13 +137,88 @@ class AbstractTransportDispatcher:
         else:
             self.__timerCbFuns.remove(timerCbFun)
 
+    # One-shot timers. Unlike periodic timer callbacks (which fire about
+    # once a second), these are run at their own deadline as soon as
+    # the dispatcher loop gets to them.
+
+    def callLater(self, delay, cbFun, *cbArgs):
+        """Schedule cbFun(*cbArgs) in delay seconds, return timer handle"""
+        self._lock.acquire()
+        try:
+            self.__timerSeq = self.__timerSeq + 1
+            timerEntry = [ time() + delay, self.__timerSeq, cbFun, cbArgs ]
+            heapq.heappush(self.__timerQueue, timerEntry)
+        finally:
+            self._lock.release()
+        return timerEntry
+
+    def cancelCall(self, timerEntry):
+        """Cancel a not yet fired timer scheduled by callLater()"""
+        self._lock.acquire()
+        try:
+            if timerEntry[2] is None:
+                return  # fired or cancelled already
+            timerEntry[2] = timerEntry[3] = None
+            self.__timersCancelled = self.__timersCancelled + 1
+            # Cancelled entries are left in the heap till they reach its
+            # top, unless they come to dominate the queue
+            if self.__timersCancelled > 64 and \
+                   self.__timersCancelled * 2 > len(self.__timerQueue):
+                self.__timerQueue = filter(
+                    lambda x: x[2] is not None, self.__timerQueue
+                    )
+                heapq.heapify(self.__timerQueue)
+                self.__timersCancelled = 0
+        finally:
+            self._lock.release()
+
+    def getTimerTimeout(self, timeNow, timeout):
+        """Return time till the next timer event, at most timeout"""
+        if self.__timerCbFuns and self.__timeToGo - timeNow < timeout:
+            timeout = max(self.__timeToGo - timeNow, 0.0)
+        self._lock.acquire()
+        try:
+            if self.__timerQueue and \
+                   self.__timerQueue[0][0] - timeNow < timeout:
+                timeout = max(self.__timerQueue[0][0] - timeNow, 0.0)
+        finally:
+            self._lock.release()
+        return timeout
+        
+    # Flow control callbacks are invoked as flowCtlCbFun(dispatcher,
+    # transportDomain, congested) whenever transport's send queue
+    # crosses its high (congested is true) or low watermark. Apps may
+    # hold off submitting new requests till congestion is relieved.
+    
+    def registerFlowCtlCbFun(self, flowCtlCbFun):
+        self.__flowCtlCbFuns.append(flowCtlCbFun)
+
+    def unregisterFlowCtlCbFun(self, flowCtlCbFun=None):
+        if flowCtlCbFun is None:
+            self.__flowCtlCbFuns = []
+        else:
+            self.__flowCtlCbFuns.remove(flowCtlCbFun)
+
+    def transportsAreCongested(self, transportDomain=None):
+        if transportDomain is None:
+            congested = self.__congestedTransports
+        else:
+            congested = self.__congestedTransports.has_key(transportDomain)
+        if congested:
+            return 1
+        else:
+            return 0
+            
     def registerTransport(self, tDomain, transport):
         if self.__transports.has_key(tDomain):
             raise error.CarrierError(
                 'Transport %s already registered' % (tDomain,)
                 )
         transport.registerCbFun(self._cbFun)
+        transport.registerFlowCtlCbFun(self._flowCtlCbFun)
         self.__transports[tDomain] = transport
+        if transport.isCongested():
+            self.__congestedTransports[tDomain] = 1
 
     def unregisterTransport(self, tDomain):
         if not self.__transports.has_key(tDomain):
@@ -61,12 +226,173 @@ class AbstractTransportDispatcher:
                 'Transport %s not registered' % (tDomain,)
                 )
         self.__transports[tDomain].unregisterCbFun()
+        self.__transports[tDomain].unregisterFlowCtlCbFun()
         del self.__transports[tDomain]
+        if self.__congestedTransports.has_key(tDomain):
+            del self.__congestedTransports[tDomain]
 
     def getTransport(self, transportDomain):
         return self.__transports.get(transportDomain)
 
+    # Rate limiting. Messages over either global or per-destination
+    # rate are queued and sent later from timer callback, in order
+    # for each destination and in turns among destinations.
+
+    def setRateLimit(self, rate=None, burst=None):
+        """Limit total outgoing rate to rate messages/sec, None disables"""
+        self._lock.acquire()
+        if rate is None:
+            self.__globalBucket = None
+        else:
+            self.__globalBucket = TokenBucket(rate, burst)
+        self._lock.release()
+
+    def setDestinationRateLimit(self, rate=None, burst=None):
+        """Limit outgoing rate to each destination address"""
+        self._lock.acquire()
+        if rate is None:
+            self.__destinationRate = None
+        else:
+            self.__destinationRate = rate, burst
+        self.__destinationBuckets.clear()
+        self._lock.release()
+
+    def messagesAreDeferred(self):
+        if self.__deferredCount:
+            return 1
+        else:
+            return 0
+
     def sendMessage(
+        self, outgoingMessage, transportDomain, transportAddress
+        ):
+        """Send message or queue it if over rate limit. Return None for
+           message sent right away, otherwise a list whose only item
+           gets set to the time of actual transmission.
+        """
+        if self.__globalBucket is None and self.__destinationRate is None:
+            self._transmitMessage(
+                outgoingMessage, transportDomain, transportAddress
+                )
+            return
+        k = transportDomain, transportAddress
+        self._lock.acquire()
+        try:
+            if self.__deferredMessages.has_key(k):
+                # messages ahead of this one are still waiting
+                q = self.__deferredMessages[k]
+            else:
+                delay = self.__getPacingDelay(k, time())
+                if not delay:
+                    q = None
+                else:
+                    q = self.__deferredMessages[k] = deque()
+                    self.__deferredDestinations.append(k)
+                    self.__schedulePacing(delay)
+            if q is not None:
+                transmittedAt = [ None ]
+                q.append(
+                    (outgoingMessage, transportDomain, transportAddress,
+                     transmittedAt)
+                    )
+                self.__deferredCount = self.__deferredCount + 1
+                return transmittedAt
+        finally:
+            self._lock.release()
+        self._transmitMessage(
+            outgoingMessage, transportDomain, transportAddress
+            )
+
+    def __getPacingDelay(self, k, timeNow):
+        # Returns zero with tokens taken from both buckets or time to
+        # wait till both have a token
+        delay = 0.0
+        destinationBucket = None
+        if self.__destinationRate is not None:
+            destinationBucket = self.__destinationBuckets.get(k)
+            if destinationBucket is None:
+                if len(self.__destinationBuckets) >= self.__bucketsPurgeSize:
+                    self.__purgeBuckets(timeNow)
+                destinationBucket = apply(TokenBucket, self.__destinationRate)
+                self.__destinationBuckets[k] = destinationBucket
+            delay = destinationBucket.getDelay(timeNow)
+        if self.__globalBucket is not None:
+            delay = max(delay, self.__globalBucket.getDelay(timeNow))
+        if not delay:
+            if destinationBucket is not None:
+                destinationBucket.consume()
+            if self.__globalBucket is not None:
+                self.__globalBucket.consume()
+        return delay
+
+    def __purgeBuckets(self, timeNow):
+        # Drop buckets of destinations idle long enough to refill
+        for k, bucket in self.__destinationBuckets.items():
+            bucket.refill(timeNow)
+            if bucket.tokens >= bucket.burst and \
+                   not self.__deferredMessages.has_key(k):
+                del self.__destinationBuckets[k]
+        self.__bucketsPurgeSize = max(
+            1024, len(self.__destinationBuckets) * 2
+            )
+
+    def __schedulePacing(self, delay):
+        if self.__pacingTimer is None:
+            self.__pacingTimer = self.callLater(delay, self.__sendDeferred)
+
+    def __sendDeferred(self):
+        # Destinations take turns, one message each, till all of them
+        # are either drained or held back by rate limit. Messages are
+        # taken off their queues under lock, but sent with it released.
+        # Drained queues are kept till then so that messages submitted
+        # meanwhile do not get ahead of them.
+        outgoingMessages = []
+        drainedDestinations = []
+        self._lock.acquire()
+        try:
+            self.__pacingTimer = None
+            timeNow = time()
+            nextDelay = None
+            destinations = self.__deferredDestinations
+            heldBack = 0  # destinations in a row held back
+            while heldBack < len(destinations):
+                k = destinations.popleft()
+                q = self.__deferredMessages[k]
+                delay = self.__getPacingDelay(k, timeNow)
+                if delay:
+                    if nextDelay is None or delay < nextDelay:
+                        nextDelay = delay
+                    heldBack = heldBack + 1
+                else:
+                    outgoingMessages.append(q.popleft())
+                    self.__deferredCount = self.__deferredCount - 1
+                    heldBack = 0
+                if q:
+                    destinations.append(k)
+                else:
+                    drainedDestinations.append(k)
+            if nextDelay is not None:
+                self.__schedulePacing(nextDelay)
+        finally:
+            self._lock.release()
+        for outgoingMessage, transportDomain, transportAddress, \
+                transmittedAt in outgoingMessages:
+            transmittedAt[0] = time()
+            self._transmitMessage(
+                outgoingMessage, transportDomain, transportAddress
+                )
+        self._lock.acquire()
+        try:
+            for k in drainedDestinations:
+                if self.__deferredMessages[k]:
+                    self.__deferredDestinations.append(k)
+                    self.__schedulePacing(0.0)
+                else:
+                    del self.__deferredMessages[k]
+        finally:
+            self._lock.release()
+
+    def _transmitMessage(
         self, outgoingMessage, transportDomain, transportAddress
         ):
         transport = self.__transports.get(transportDomain)
@@ -77,6 +403,22 @@ class AbstractTransportDispatcher:
         transport.sendMessage(outgoingMessage, transportAddress)
 
     def handleTimerTick(self, timeNow):
+        # Heap may be rebuilt by cancelCall() invoked from a callback
+        while 1:
+            self._lock.acquire()
+            try:
+                if not self.__timerQueue or \
+                       self.__timerQueue[0][0] > timeNow:
+                    break
+                timerEntry = heapq.heappop(self.__timerQueue)
+                cbFun, cbArgs = timerEntry[2], timerEntry[3]
+                if cbFun is None:
+                    self.__timersCancelled = self.__timersCancelled - 1
+                    continue
+                timerEntry[2] = timerEntry[3] = None
+            finally:
+                self._lock.release()
+            apply(cbFun, cbArgs)
         if self.__timerCbFuns and self.__timeToGo < timeNow:
             for timerCbFun in self.__timerCbFuns:
                 timerCbFun(timeNow)
@@ -105,3 +447,16 @@ class AbstractTransportDispatcher:
             self.unregisterTransport(tDomain)
         self.unregisterRecvCbFun()
         self.unregisterTimerCbFun()
+        self.unregisterFlowCtlCbFun()
+        self._lock.acquire()
+        self.__timerQueue = []
+        self.__timersCancelled = 0
+        # Dropped messages are done with as well
+        for q in self.__deferredMessages.values():
+            for deferredMessage in q:
+                deferredMessage[3][0] = time()
+        self.__deferredMessages.clear()
+        self.__deferredDestinations.clear()
+        self.__deferredCount = 0
+        self.__pacingTimer = None
+        self._lock.release()
@@ -0,0 +1,84 @@
+"""Implements transport replaying captured datagrams"""
+from pysnmp.carrier.capture.log import CaptureReader
+from pysnmp.carrier import error
+
+class ReplayTransport:
+    """Feeds incoming datagrams from capture file to SNMP engine, counts
+       and optionally captures engine's outgoing messages. Implements
+       the same API as socket-based transports.
+    """
+    _cbFun = _flowCtlCbFun = _captureFun = None
+    def __init__(self, fileName):
+        self.__reader = CaptureReader(fileName)
+        self.__nextRecord = None
+        self.__eof = 0
+        self.__stats = {
+            'inMessages': 0L,
+            'outMessages': 0L
+            }
+
+    def getStatistics(self):
+        return self.__stats.copy()
+
+    # Replay API
+
+    def getNextTimestamp(self):
+        """Return timestamp of the next incoming record, None at EOF"""
+        while self.__nextRecord is None and not self.__eof:
+            record = self.__reader.readRecord()
+            if record is None:
+                self.__eof = 1
+            elif record[1] == 0:  # outgoing ones are not replayed
+                self.__nextRecord = record
+        if self.__nextRecord is not None:
+            return self.__nextRecord[0]
+
+    def replayNext(self):
+        if self.getNextTimestamp() is None:
+            raise error.CarrierError('Capture file exhausted')
+        timestamp, direction, transportAddress, incomingMessage = \
+                   self.__nextRecord
+        self.__nextRecord = None
+        self.__stats['inMessages'] = self.__stats['inMessages'] + 1
+        if self._cbFun is None:
+            raise error.CarrierError('Unable to call cbFun')
+        self._cbFun(self, transportAddress, incomingMessage)
+
+    # Public API
+
+    def openClientMode(self, iface=None):
+        return self
+
+    def openServerMode(self, iface=None):
+        return self
+
+    def sendMessage(self, outgoingMessage, transportAddress):
+        self.__stats['outMessages'] = self.__stats['outMessages'] + 1
+        if self._captureFun is not None:
+            self._captureFun(1, transportAddress, outgoingMessage)
+
+    def registerCbFun(self, cbFun):
+        self._cbFun = cbFun
+
+    def unregisterCbFun(self):
+        self._cbFun = None
+
+    def registerFlowCtlCbFun(self, cbFun):
+        self._flowCtlCbFun = cbFun
+
+    def unregisterFlowCtlCbFun(self):
+        self._flowCtlCbFun = None
+
+    def registerCaptureFun(self, captureFun):
+        self._captureFun = captureFun
+
+    def unregisterCaptureFun(self):
+        self._captureFun = None
+
+    def isCongested(self): return 0
+
+    def closeTransport(self):
+        self.unregisterCbFun()
+        self.unregisterFlowCtlCbFun()
+        self.unregisterCaptureFun()
+        self.__reader.close()
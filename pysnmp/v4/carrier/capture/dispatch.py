@@ -0,0 +1,58 @@
+"""Implements replay of captured datagrams"""
+from time import time, sleep
+from pysnmp.carrier.base import AbstractTransportDispatcher
+
+class ReplayDispatcher(AbstractTransportDispatcher):
+    """Replays captured incoming datagrams of registered ReplayTransports
+       in timestamp order, either at full speed or (with pacing set)
+       at original intervals.
+    """
+    def __init__(self, pacing=0):
+        self.pacing = pacing
+        self.timeout = 1.0
+        self.__replayTransports = {}
+        AbstractTransportDispatcher.__init__(self)
+
+    def registerTransport(self, tDomain, t):
+        AbstractTransportDispatcher.registerTransport(self, tDomain, t)
+        self.__replayTransports[tDomain] = t
+
+    def unregisterTransport(self, tDomain):
+        AbstractTransportDispatcher.unregisterTransport(self, tDomain)
+        del self.__replayTransports[tDomain]
+
+    def __getNextTransport(self):
+        nextTransport = nextTimestamp = None
+        for transport in self.__replayTransports.values():
+            timestamp = transport.getNextTimestamp()
+            if timestamp is None:
+                continue
+            if nextTimestamp is None or timestamp < nextTimestamp:
+                nextTransport, nextTimestamp = transport, timestamp
+        return nextTransport, nextTimestamp
+
+    def __idle(self, timeout):
+        timeout = self.getTimerTimeout(time(), timeout)
+        if timeout > 0:
+            sleep(timeout)
+        self.handleTimerTick(time())
+
+    def runDispatcher(self, timeout=0.0):
+        startTime = firstTimestamp = None
+        while 1:
+            transport, timestamp = self.__getNextTransport()
+            if transport is None:
+                break
+            if self.pacing:
+                if firstTimestamp is None:
+                    startTime, firstTimestamp = time(), timestamp
+                while 1:
+                    delay = startTime + timestamp - firstTimestamp - time()
+                    if delay <= 0:
+                        break
+                    self.__idle(min(delay, self.timeout))
+            transport.replayNext()
+            self.handleTimerTick(time())
+        # Capture exhausted, let pending jobs complete
+        while self.jobsArePending() or self.messagesAreDeferred():
+            self.__idle(self.timeout)
@@ -0,0 +1,68 @@
+"""Datagram capture log file format. The file starts with a signature
+   followed by records of:
+
+   timestamp (double), direction (byte, 0 is incoming), address length
+   (short), message length (long), marshalled address, message
+"""
+import struct, marshal
+from time import time
+from pysnmp.carrier import error
+
+signature = 'PYSNMPCAP\x01'
+recordHeader = '!dBHL'
+recordHeaderSize = struct.calcsize(recordHeader)
+
+class CaptureWriter:
+    def __init__(self, fileName, bufferSize=65536):
+        try:
+            self.__file = open(fileName, 'wb', bufferSize)
+            self.__file.write(signature)
+        except IOError, why:
+            raise error.CarrierError('capture file %s: %s' % (fileName, why))
+        self.count = 0L
+
+    def writeRecord(self, direction, transportAddress, message):
+        """Append a record, can be registered as transport's captureFun"""
+        try:
+            address = marshal.dumps(transportAddress)
+        except ValueError:  # e.g. SnmpUDPAddress
+            address = marshal.dumps(tuple(transportAddress))
+        self.__file.write(
+            struct.pack(
+                recordHeader, time(), direction, len(address), len(message)
+                ) + address + message
+            )
+        self.count = self.count + 1
+
+    def close(self):
+        self.__file.close()
+
+class CaptureReader:
+    def __init__(self, fileName):
+        try:
+            self.__file = open(fileName, 'rb')
+            if self.__file.read(len(signature)) != signature:
+                raise error.CarrierError(
+                    'Not a capture file: %s' % (fileName,)
+                    )
+        except IOError, why:
+            raise error.CarrierError('capture file %s: %s' % (fileName, why))
+
+    def readRecord(self):
+        """Return (timestamp, direction, address, message), None at EOF"""
+        header = self.__file.read(recordHeaderSize)
+        if len(header) < recordHeaderSize:
+            return
+        timestamp, direction, addressLen, messageLen = struct.unpack(
+            recordHeader, header
+            )
+        data = self.__file.read(addressLen + messageLen)
+        if len(data) < addressLen + messageLen:
+            return  # truncated at capture time
+        return (
+            timestamp, direction,
+            marshal.loads(data[:addressLen]), data[addressLen:]
+            )
+
+    def close(self):
+        self.__file.close()
@@ -0,0 +1,132 @@
+"""Implements in-process loopback transport"""
+from pysnmp.carrier import error
+from pysnmp.compat import deque
+from pysnmp import debug
+
+# Loopback endpoints pose as UDP ones so that (host, port) addresses
+# work with existing SNMP-TARGET-MIB configuration
+domainName = snmpLoopbackDomain = (1, 3, 6, 1, 6, 1, 1)
+
+class LoopbackNetwork:
+    """Passes messages among loopback transports through in-process
+       queue. Dispatchers attached to the same network run together.
+    """
+    def __init__(self):
+        self.__endpoints = {}
+        self.__queue = deque()
+        self.__dispatchers = []
+        self.__autoPort = 49152
+        self.__stats = {
+            'outMessages': 0L,
+            'inMessages': 0L,
+            'unreachableDrops': 0L
+            }
+
+    def getStatistics(self):
+        stats = self.__stats.copy()
+        stats['queued'] = len(self.__queue)
+        return stats
+
+    def attachEndpoint(self, transport, address=None):
+        if address is None:
+            while 1:
+                self.__autoPort = self.__autoPort + 1
+                address = ( '127.0.0.1', self.__autoPort )
+                if not self.__endpoints.has_key(address):
+                    break
+        else:
+            address = tuple(address)
+        if self.__endpoints.has_key(address):
+            raise error.CarrierError(
+                'Loopback address %s already in use' % (address,)
+                )
+        self.__endpoints[address] = transport
+        return address
+
+    def detachEndpoint(self, address):
+        if self.__endpoints.has_key(address):
+            del self.__endpoints[address]
+
+    def attachDispatcher(self, transportDispatcher):
+        self.__dispatchers.append(transportDispatcher)
+
+    def detachDispatcher(self, transportDispatcher):
+        if transportDispatcher in self.__dispatchers:
+            self.__dispatchers.remove(transportDispatcher)
+
+    def getDispatchers(self): return tuple(self.__dispatchers)
+
+    def enqueueMessage(self, outgoingMessage, srcAddress, dstAddress):
+        self.__queue.append((outgoingMessage, srcAddress, dstAddress))
+        self.__stats['outMessages'] = self.__stats['outMessages'] + 1
+
+    def hasMessages(self): return len(self.__queue)
+
+    def deliverMessages(self):
+        """Deliver messages queued so far, return number of them"""
+        count = len(self.__queue)
+        for idx in range(count):
+            message, srcAddress, dstAddress = self.__queue.popleft()
+            transport = self.__endpoints.get(dstAddress)
+            if transport is None or transport._cbFun is None:
+                self.__stats['unreachableDrops'] = self.__stats['unreachableDrops'] + 1
+                debug.logger & debug.flagIO and debug.logger('deliverMessages: no endpoint at %s, message dropped' % (dstAddress,))
+                continue
+            self.__stats['inMessages'] = self.__stats['inMessages'] + 1
+            transport._cbFun(transport, srcAddress, message)
+        return count
+
+defaultNetwork = LoopbackNetwork()
+
+class LoopbackTransport:
+    """Transport delivering messages to peer transports in the same
+       process. Implements the same API as socket-based transports.
+    """
+    _cbFun = _flowCtlCbFun = None
+    def __init__(self, network=None):
+        if network is None:
+            network = defaultNetwork
+        self.network = network
+        self.__address = None
+
+    def getAddress(self): return self.__address
+
+    # Public API
+
+    def openClientMode(self, iface=None):
+        self.__address = self.network.attachEndpoint(self, iface)
+        return self
+
+    def openServerMode(self, iface):
+        self.__address = self.network.attachEndpoint(self, iface)
+        return self
+
+    def sendMessage(self, outgoingMessage, transportAddress):
+        if self.__address is None:
+            raise error.CarrierError('Loopback transport not open')
+        debug.logger & debug.flagIO and debug.logger('sendMessage: %s -> %s outgoingMessage %s' % (self.__address, transportAddress, repr(outgoingMessage)))
+        self.network.enqueueMessage(
+            outgoingMessage, self.__address, tuple(transportAddress)
+            )
+
+    def registerCbFun(self, cbFun):
+        self._cbFun = cbFun
+
+    def unregisterCbFun(self):
+        self._cbFun = None
+
+    def registerFlowCtlCbFun(self, cbFun):
+        self._flowCtlCbFun = cbFun
+
+    def unregisterFlowCtlCbFun(self):
+        self._flowCtlCbFun = None
+
+    def isCongested(self): return 0
+
+    def closeTransport(self):
+        self.unregisterCbFun()
+        self.unregisterFlowCtlCbFun()
+        if self.__address is not None:
+            self.network.detachEndpoint(self.__address)
+            self.__address = None
+
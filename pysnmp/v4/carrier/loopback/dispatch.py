@@ -0,0 +1,44 @@
+"""Implements I/O over in-process loopback network"""
+from time import time, sleep
+from pysnmp.carrier.base import AbstractTransportDispatcher
+from pysnmp.carrier.loopback.base import defaultNetwork
+
+class LoopbackDispatcher(AbstractTransportDispatcher):
+    """Runs message exchange over loopback network. Running any of the
+       dispatchers attached to the same network drives the others (e.g.
+       agents' ones) as well so that many SNMP engines can work in a
+       single thread.
+    """
+    def __init__(self, network=None):
+        if network is None:
+            network = defaultNetwork
+        self.network = network
+        self.timeout = 1.0
+        AbstractTransportDispatcher.__init__(self)
+        network.attachDispatcher(self)
+
+    def transportsAreWorking(self):
+        if self.network.hasMessages() or self.messagesAreDeferred():
+            return 1
+        else:
+            return 0
+
+    def runDispatcher(self, timeout=0.0):
+        while self.jobsArePending() or self.transportsAreWorking():
+            if not self.network.deliverMessages():
+                # Nothing to deliver, idle till the nearest timer
+                timeNow = time()
+                timeout = self.timeout
+                for transportDispatcher in self.network.getDispatchers():
+                    timeout = transportDispatcher.getTimerTimeout(
+                        timeNow, timeout
+                        )
+                if timeout > 0:
+                    sleep(timeout)
+            timeNow = time()
+            for transportDispatcher in self.network.getDispatchers():
+                transportDispatcher.handleTimerTick(timeNow)
+
+    def closeDispatcher(self):
+        AbstractTransportDispatcher.closeDispatcher(self)
+        self.network.detachDispatcher(self)
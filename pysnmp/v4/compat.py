@@ -0,0 +1,17 @@
+# Stand-ins for facilities missing from older Pythons
+try:
+    from collections import deque
+except ImportError:
+    class deque:   # a list-based stand-in for Python < 2.4
+        def __init__(self): self.__items = []
+        def __len__(self): return len(self.__items)
+        def append(self, x): self.__items.append(x)
+        def appendleft(self, x): self.__items.insert(0, x)
+        def popleft(self): return self.__items.pop(0)
+        def clear(self): self.__items = []
+        def __getitem__(self, idx): return self.__items[idx]
+
+class NullLock:
+    """Stands in for a lock where no locking is needed (or possible)"""
+    def acquire(self): pass
+    def release(self): pass
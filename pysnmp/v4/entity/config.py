@@ -3,15 +3,16 @@
 import string
 from pysnmp.carrier.asynsock import dispatch
 from pysnmp.carrier.asynsock.dgram import udp
+from pysnmp.carrier.asynsock.stream import tcp
 try:
     from pysnmp.carrier.asynsock.dgram import unix
     snmpLocalDomain = unix.snmpLocalDomain
 except ImportError: # UNIX-specific -- may not be always available
     pass
 from pysnmp.proto import rfc3412
-from pysnmp.proto.secmod.rfc3414 import localkey
 from pysnmp.entity import engine
 from pysnmp.proto.secmod.rfc3414.auth import hmacmd5, hmacsha, noauth
+from pysnmp.proto.secmod.rfc7860.auth import hmacsha2
 from pysnmp.proto.secmod.rfc3414.priv import des, nopriv
 from pysnmp.proto.secmod.rfc3826.priv import aes
 from pysnmp.smi.error import NotWritableError
@@ -21,10 +22,15 @@ from pysnmp import error
 
 # Transports
 snmpUDPDomain = udp.snmpUDPDomain
+snmpTCPDomain = tcp.snmpTCPDomain
 
 # Auth protocol
 usmHMACMD5AuthProtocol = hmacmd5.HmacMd5.serviceID
 usmHMACSHAAuthProtocol = hmacsha.HmacSha.serviceID
+usmHMAC128SHA224AuthProtocol = hmacsha2.HmacSha224.serviceID
+usmHMAC192SHA256AuthProtocol = hmacsha2.HmacSha256.serviceID
+usmHMAC256SHA384AuthProtocol = hmacsha2.HmacSha384.serviceID
+usmHMAC384SHA512AuthProtocol = hmacsha2.HmacSha512.serviceID
 usmNoAuthProtocol = noauth.NoAuth.serviceID
 
 # Privacy protocol
@@ -116,45 +122,33 @@ def addV3User(snmpEngine, securityName,
         )
 
     # Localize keys
-    if authProtocol == usmHMACMD5AuthProtocol:
-        hashedAuthPassphrase = localkey.hashPassphraseMD5(
-            authKey and authKey or ''
-            )
-        localAuthKey = localkey.localizeKeyMD5(
-            hashedAuthPassphrase, snmpEngineID
-            )
-    elif authProtocol == usmHMACSHAAuthProtocol:
-        hashedAuthPassphrase = localkey.hashPassphraseSHA(
+    authServices = engine.SnmpUSMSecurityModel.authServices
+    if authProtocol == usmNoAuthProtocol:
+        hashedAuthPassphrase = localAuthKey = None
+    elif authServices.has_key(authProtocol):
+        authService = authServices[authProtocol]
+        hashedAuthPassphrase = authService.hashPassphrase(
             authKey and authKey or ''
             )
-        localAuthKey = localkey.localizeKeySHA(
+        localAuthKey = authService.localizeKey(
             hashedAuthPassphrase, snmpEngineID
             )
-    elif authProtocol == usmNoAuthProtocol:
-        hashedAuthPassphrase = localAuthKey = None
     else:
         raise error.PySnmpError('Unknown auth protocol %s' % (authProtocol,))
 
     if privProtocol == usmDESPrivProtocol or \
        privProtocol == usmAesCfb128Protocol:
-        if authProtocol == usmHMACMD5AuthProtocol:
-            hashedPrivPassphrase = localkey.hashPassphraseMD5(
-                privKey and privKey or ''
-                )
-            localPrivKey = localkey.localizeKeyMD5(
-                hashedPrivPassphrase, snmpEngineID
-                )
-        elif authProtocol == usmHMACSHAAuthProtocol:
-            hashedPrivPassphrase = localkey.hashPassphraseSHA(
-                privKey and privKey or ''
-                )
-            localPrivKey = localkey.localizeKeySHA(
-                hashedPrivPassphrase, snmpEngineID
-                )
-        else:
+        # Privacy keys are localized with auth protocol hash
+        if authProtocol == usmNoAuthProtocol:
             raise error.PySnmpError(
                 'Unknown auth protocol %s' % (authProtocol,)
                 )
+        hashedPrivPassphrase = authService.hashPassphrase(
+            privKey and privKey or ''
+            )
+        localPrivKey = authService.localizeKey(
+            hashedPrivPassphrase, snmpEngineID
+            )
     elif privProtocol == usmNoPrivProtocol:
         hashedPrivPassphrase = localPrivKey = None
     else:
@@ -255,7 +249,8 @@ def addTargetAddr(
         snmpEngine, addrName
         )
     
-    if transportDomain == snmpUDPDomain:
+    # TCP/IPv4 address has the same (host, port) form
+    if transportDomain == snmpUDPDomain or transportDomain == snmpTCPDomain:
         SnmpUDPAddress, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('SNMPv2-TM', 'SnmpUDPAddress')
         transportAddress = SnmpUDPAddress(transportAddress)
 
@@ -7,11 +7,18 @@ from pysnmp.proto.secmod.rfc2576 import SnmpV1SecurityModel, \
      SnmpV2cSecurityModel
 from pysnmp.proto.secmod.rfc3414 import SnmpUSMSecurityModel
 from pysnmp.proto.acmod import rfc3415
+from pysnmp.proto.counters import SnmpCounters
+from pysnmp.proto import bercodec
+from pysnmp.compat import NullLock
 from pysnmp import error
+try:
+    import threading
+except ImportError:
+    threading = None
 
 class SnmpEngine:
     def __init__(self, snmpEngineID=None, maxMessageSize=65507,
-                 msgAndPduDsp=None):
+                 msgAndPduDsp=None, berCodec=None):
         if msgAndPduDsp is None:
             self.msgAndPduDsp = MsgAndPduDispatcher()
         else:
@@ -34,6 +41,17 @@ class SnmpEngine:
             }
         
         self.transportDispatcher = None
+
+        # BER codec used by message processing and security models,
+        # bercodec.pyasn1Codec would do it the generic way
+        if berCodec is None:
+            self.berCodec = bercodec.snmpCodec
+        else:
+            self.berCodec = berCodec
+
+        # Optional worker pool to run message processing off I/O loop
+        self.executor = None
+        self.lock = NullLock()
         
         if self.msgAndPduDsp.mibInstrumController is None:
             raise error.PySnmpError(
@@ -47,6 +65,15 @@ class SnmpEngine:
             origSnmpEngineID, = self.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
             origSnmpEngineID.syntax = origSnmpEngineID.syntax.clone(snmpEngineID)
 
+        # Statistics and snmpEngineID are used on every message, so
+        # keep them at hand rather than look up at MIB
+        self.counters = SnmpCounters()
+        self.counters.bindMibInstances(
+            self.msgAndPduDsp.mibInstrumController.mibBuilder
+            )
+        snmpEngineID, = self.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
+        self.snmpEngineID = snmpEngineID.syntax
+
     # Transport dispatcher bindings
     
     def __receiveMessageCbFun(
@@ -56,22 +83,58 @@ class SnmpEngine:
         transportAddress,
         wholeMsg
         ):
-        self.msgAndPduDsp.receiveMessage(
-            self, transportDomain, transportAddress, wholeMsg
-            )
-                                         
+        if self.executor is None:
+            self.msgAndPduDsp.receiveMessage(
+                self, transportDomain, transportAddress, wholeMsg
+                )
+        else:
+            # Message may sit in transport's receive buffer, keep it
+            # from being reused till the job is done
+            releaseFun = transportDispatcher.holdIncomingMessage()
+            if not self.executor.submit(
+                self.__processMessage,
+                transportDomain, transportAddress, wholeMsg, releaseFun
+                ) and releaseFun is not None:
+                releaseFun()
+
+    def __processMessage(self, transportDomain, transportAddress, wholeMsg,
+                         releaseFun=None):
+        self.lock.acquire()
+        try:
+            self.msgAndPduDsp.receiveMessage(
+                self, transportDomain, transportAddress, wholeMsg
+                )
+        finally:
+            self.lock.release()
+            if releaseFun is not None:
+                releaseFun()
+            
     def __receiveTimerTickCbFun(self, timeNow):
-        self.msgAndPduDsp.receiveTimerTick(self, timeNow)
-        for mpHandler in self.messageProcessingSubsystems.values():
-            mpHandler.receiveTimerTick(self, timeNow)
-        for smHandler in self.securityModels.values():
-            smHandler.receiveTimerTick(self, timeNow)
+        if self.executor is None:
+            self.__processTimerTick(timeNow)
+        else:
+            self.executor.submit(self.__processTimerTick, timeNow)
+
+    def __processTimerTick(self, timeNow):
+        self.lock.acquire()
+        try:
+            self.msgAndPduDsp.receiveTimerTick(self, timeNow)
+            for mpHandler in self.messageProcessingSubsystems.values():
+                mpHandler.receiveTimerTick(self, timeNow)
+            for smHandler in self.securityModels.values():
+                smHandler.receiveTimerTick(self, timeNow)
+        finally:
+            self.lock.release()
         
     def registerTransportDispatcher(self, transportDispatcher):
         if self.transportDispatcher is not None:
             raise error.ProtocolError(
                 'Transport dispatcher already registered'
                 )
+        if self.executor is not None and not transportDispatcher.threadSafe:
+            raise error.PySnmpError(
+                'Transport dispatcher can not be used with executor'
+                )
         transportDispatcher.registerRecvCbFun(
             self.__receiveMessageCbFun
             )
@@ -88,3 +151,30 @@ class SnmpEngine:
         self.transportDispatcher.unregisterRecvCbFun()
         self.transportDispatcher.unregisterTimerCbFun()
         self.transportDispatcher = None
+
+    # Executor bindings. Once executor is registered, incoming messages
+    # and timer events are processed by its workers under engine lock.
+    # Apps calling into engine from other threads should hold it too.
+
+    def registerExecutor(self, executor):
+        if self.executor is not None:
+            raise error.PySnmpError(
+                'Executor already registered'
+                )
+        if threading is None:
+            raise error.PySnmpError('Threads not supported')
+        if self.transportDispatcher is not None and \
+               not self.transportDispatcher.threadSafe:
+            raise error.PySnmpError(
+                'Transport dispatcher can not be used with executor'
+                )
+        if isinstance(self.lock, NullLock):
+            self.lock = threading.RLock()
+        self.executor = executor
+
+    def unregisterExecutor(self):
+        if self.executor is None:
+            raise error.PySnmpError(
+                'Executor not registered'
+                )
+        self.executor = None
@@ -0,0 +1,76 @@
+# Worker threads pool for offloading SNMP message processing off I/O loop
+import sys, traceback
+try:
+    import threading, Queue
+except ImportError:
+    threading = None
+from pysnmp.error import PySnmpError
+from pysnmp import debug
+
+class ThreadPoolExecutor:
+    """Runs submitted jobs in a pool of worker threads. Jobs submitted
+       over queueLimit are dropped rather than block the submitter
+       (normally the I/O loop).
+    """
+    def __init__(self, workers=4, queueLimit=8192):
+        if threading is None:
+            raise PySnmpError('Threads not supported')
+        self.__queue = Queue.Queue(queueLimit)
+        self.__stats = {
+            'submitted': 0L,
+            'dropped': 0L,
+            'processed': 0L,
+            'failed': 0L
+            }
+        self.__statsLock = threading.Lock()
+        self.__workers = []
+        for idx in range(workers):
+            worker = threading.Thread(target=self.__runWorker)
+            worker.setDaemon(1)
+            worker.start()
+            self.__workers.append(worker)
+
+    def __countStat(self, name):
+        self.__statsLock.acquire()
+        self.__stats[name] = self.__stats[name] + 1
+        self.__statsLock.release()
+
+    def submit(self, cbFun, *cbArgs):
+        """Queue cbFun(*cbArgs) for execution, return false if dropped"""
+        try:
+            self.__queue.put_nowait((cbFun, cbArgs))
+        except Queue.Full:
+            self.__countStat('dropped')
+            debug.logger & debug.flagDsp and debug.logger('submit: job queue full, %s dropped' % (cbFun,))
+            return 0
+        self.__countStat('submitted')
+        return 1
+
+    def getStatistics(self):
+        self.__statsLock.acquire()
+        stats = self.__stats.copy()
+        self.__statsLock.release()
+        stats['queued'] = self.__queue.qsize()
+        return stats
+
+    def __runWorker(self):
+        while 1:
+            job = self.__queue.get()
+            if job is None:
+                break
+            cbFun, cbArgs = job
+            try:
+                apply(cbFun, cbArgs)
+            except:
+                self.__countStat('failed')
+                traceback.print_exc(file=sys.stderr)
+            else:
+                self.__countStat('processed')
+
+    def shutdown(self):
+        """Stop workers once they are done with queued jobs"""
+        for worker in self.__workers:
+            self.__queue.put(None)
+        for worker in self.__workers:
+            worker.join()
+        self.__workers = []
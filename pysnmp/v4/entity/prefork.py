@@ -0,0 +1,167 @@
+# Multi-process SNMP server. Runs a number of worker processes, each with
+# its own SNMP engine serving the same UDP port(s) bound with SO_REUSEPORT
+# so that kernel spreads incoming datagrams among them.
+import os, errno, struct, marshal, signal, select, traceback
+from pysnmp.carrier.asynsock.dgram import udp
+from pysnmp.error import PySnmpError
+from pysnmp import debug
+
+class PreforkServer:
+    """Forks workers each running SNMP engine built by engineFactory().
+       The factory is called in worker process and should return
+       SnmpEngine with apps and transports configured, server transports
+       opened with reusePort option. Worker statistics are periodically
+       reported to the parent and can be read with getStatistics().
+    """
+    def __init__(self, engineFactory, workers=None, transportDomains=None):
+        self.__engineFactory = engineFactory
+        if workers is None:
+            try:
+                workers = os.sysconf('SC_NPROCESSORS_ONLN')
+            except (AttributeError, ValueError, OSError):
+                workers = 2
+        self.__workersCount = workers
+        if transportDomains is None:
+            transportDomains = ( udp.domainName, )
+        self.__transportDomains = transportDomains
+        self.__workers = {}  # pid -> [ readFd, buffer, stats ]
+        self.__retiredStats = {}
+
+    # Worker side
+
+    def __runWorker(self, statsFd):
+        snmpEngine = self.__engineFactory()
+        transportDispatcher = snmpEngine.transportDispatcher
+        if transportDispatcher is None:
+            raise PySnmpError('Transport dispatcher not configured')
+        transportDispatcher.registerTimerCbFun(
+            lambda timeNow, self=self, snmpEngine=snmpEngine, \
+            statsFd=statsFd: self.__reportStats(snmpEngine, statsFd)
+            )
+        transportDispatcher.jobStarted(1)  # serve forever
+        transportDispatcher.runDispatcher()
+
+    def __reportStats(self, snmpEngine, statsFd):
+        stats = snmpEngine.counters.getCounters()
+        transportDispatcher = snmpEngine.transportDispatcher
+        for transportDomain in self.__transportDomains:
+            transport = transportDispatcher.getTransport(transportDomain)
+            if transport is None or \
+                   not hasattr(transport, 'getStatistics'):
+                continue
+            for k, v in transport.getStatistics().items():
+                if type(v) in (type(0), type(0L)):
+                    stats[k] = stats.get(k, 0L) + v
+        data = marshal.dumps(stats)
+        try:
+            # small enough to be written atomically, dropped if
+            # parent does not keep up
+            os.write(statsFd, struct.pack('!L', len(data)) + data)
+        except OSError, why:
+            if why[0] != errno.EAGAIN:
+                raise
+
+    # Parent side
+
+    def startServer(self):
+        if not hasattr(os, 'fork'):
+            raise PySnmpError('Multi-process mode not supported')
+        while len(self.__workers) < self.__workersCount:
+            readFd, writeFd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(readFd)
+                for workerFd, buffer, stats in self.__workers.values():
+                    os.close(workerFd)
+                self.__workers.clear()
+                rc = 0
+                try:
+                    _setNonBlocking(writeFd)
+                    self.__runWorker(writeFd)
+                except:
+                    traceback.print_exc()
+                    rc = 1
+                os._exit(rc)
+            os.close(writeFd)
+            _setNonBlocking(readFd)
+            self.__workers[pid] = [ readFd, '', {} ]
+            debug.logger & debug.flagDsp and debug.logger('startServer: started worker %s' % pid)
+
+    def stopServer(self, sig=signal.SIGTERM):
+        for pid in self.__workers.keys():
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                pass
+        while self.__workers:
+            self.__readStats(1.0)
+
+    def runServer(self):
+        """Wait till all workers exit, collecting their statistics"""
+        while self.__workers:
+            self.__readStats(1.0)
+
+    def __readStats(self, timeout):
+        fdMap = {}
+        for pid, worker in self.__workers.items():
+            fdMap[worker[0]] = pid
+        try:
+            r, w, e = select.select(fdMap.keys(), [], [], timeout)
+        except select.error, why:
+            if why[0] == errno.EINTR:
+                return
+            raise
+        for fd in r:
+            pid = fdMap[fd]
+            worker = self.__workers[pid]
+            try:
+                data = os.read(fd, 65536)
+            except OSError, why:
+                if why[0] == errno.EAGAIN or why[0] == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                self.__retireWorker(pid)
+                continue
+            buffer = worker[1] + data
+            while len(buffer) >= 4:
+                size, = struct.unpack('!L', buffer[:4])
+                if len(buffer) < size + 4:
+                    break
+                worker[2] = marshal.loads(buffer[4:size+4])
+                buffer = buffer[size+4:]
+            worker[1] = buffer
+
+    def __retireWorker(self, pid):
+        readFd, buffer, stats = self.__workers[pid]
+        del self.__workers[pid]
+        os.close(readFd)
+        try:
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+        _addStats(self.__retiredStats, stats)
+        debug.logger & debug.flagDsp and debug.logger('__retireWorker: worker %s exited' % pid)
+
+    def getWorkerStatistics(self):
+        """Return last reported statistics by worker PID"""
+        self.__readStats(0.0)
+        workerStats = {}
+        for pid, worker in self.__workers.items():
+            workerStats[pid] = worker[2].copy()
+        return workerStats
+
+    def getStatistics(self):
+        """Return statistics summed over all workers including exited"""
+        stats = self.__retiredStats.copy()
+        for workerStats in self.getWorkerStatistics().values():
+            _addStats(stats, workerStats)
+        return stats
+
+def _setNonBlocking(fd):
+    import fcntl
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+def _addStats(total, stats):
+    for k, v in stats.items():
+        total[k] = total.get(k, 0L) + v
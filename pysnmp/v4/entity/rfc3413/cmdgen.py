@@ -2,10 +2,17 @@ import types, time
 from pysnmp.proto import rfc1157, rfc1905, api
 from pysnmp.entity.rfc3413 import config
 from pysnmp.proto.proxy import rfc2576
+from pysnmp.proto.mpmod.rfc2576 import freezeVarBinds, \
+     minTemplateRequestID, maxTemplateRequestID
 from pysnmp.proto import error
-from pysnmp import nextid
+from pysnmp import nextid, cache
+from pyasn1.type import univ
 
 getNextHandle = nextid.Integer(0x7fffffff)
+
+getNextTemplateRequestID = nextid.Integer(
+    maxTemplateRequestID - minTemplateRequestID
+    )
                              
 def getVersionSpecifics(snmpVersion):
     if snmpVersion == 0:
@@ -14,6 +21,41 @@ def getVersionSpecifics(snmpVersion):
         pduVersion = 1
     return pduVersion, api.protoModules[pduVersion]
 
+# Read requests to same OIDs are built off a prototype PDU sharing its
+# frozen var-binds so that v1/v2c MP re-uses serialized messages.
+# Generators may run in several threads so the cache is a locked one.
+_reqPduPrototypes = cache.LruCache(256)
+
+def getReqPdu(pMod, pduType, varBinds):
+    for oid, val in varBinds:
+        if val is not None and val.getTagSet() != univ.Null.tagSet:
+            break
+    else:
+        try:
+            key = pduType, tuple(map(lambda x: x[0], varBinds))
+            protoPDU = _reqPduPrototypes.get(key)
+        except TypeError:  # unhashable OID
+            key = protoPDU = None
+        if key is not None:
+            if protoPDU is None:
+                protoPDU = pduType()
+                pMod.apiPDU.setDefaults(protoPDU)
+                pMod.apiPDU.setVarBinds(protoPDU, varBinds)
+                freezeVarBinds(protoPDU)
+                # Only complete prototypes get shared
+                _reqPduPrototypes.put(key, protoPDU)
+            reqPDU = protoPDU.clone()
+            reqPDU.setComponentByPosition(
+                0, minTemplateRequestID + getNextTemplateRequestID()
+                )
+            for idx in range(1, len(protoPDU)):
+                reqPDU.setComponentByPosition(idx, protoPDU[idx])
+            return reqPDU
+    reqPDU = pduType()
+    pMod.apiPDU.setDefaults(reqPDU)
+    pMod.apiPDU.setVarBinds(reqPDU, varBinds)
+    return reqPDU
+
 class CommandGeneratorBase:
     def __init__(self):
         self.__pendingReqs = {}
@@ -55,7 +97,12 @@ class CommandGeneratorBase:
 
         # 3.1.3
         if statusInformation:
-            if origRetries == origRetryCount:
+            # Retry count is the total number of transmissions. With no
+            # retries given request is not re-sent on timeout, though it
+            # still may be once as SNMPv3 engine ID discovery takes it.
+            if origRetries == origRetryCount or not origRetryCount and \
+                   ( origRetries > 1 or
+                     statusInformation['errorIndication'] == 'requestTimedOut' ):
                 cbFun(origSendRequestHandle,
                       statusInformation['errorIndication'], 0, 0, (),
                       cbCtx)
@@ -207,10 +254,7 @@ class GetCommandGenerator(CommandGeneratorBase):
 
         pduVersion, pMod = getVersionSpecifics(messageProcessingModel)
         
-        reqPDU = pMod.GetRequestPDU()
-        pMod.apiPDU.setDefaults(reqPDU)
-        
-        pMod.apiPDU.setVarBinds(reqPDU, varBinds)
+        reqPDU = getReqPdu(pMod, pMod.GetRequestPDU, varBinds)
 
         requestHandle = getNextHandle()
         
@@ -366,10 +410,7 @@ class NextCommandGenerator(CommandGeneratorBase):
 
         pduVersion, pMod = getVersionSpecifics(messageProcessingModel)
         
-        reqPDU = pMod.GetNextRequestPDU()
-        pMod.apiPDU.setDefaults(reqPDU)
-        
-        pMod.apiPDU.setVarBinds(reqPDU, varBinds)
+        reqPDU = getReqPdu(pMod, pMod.GetNextRequestPDU, varBinds)
 
         requestHandle = getNextHandle()        
         
@@ -472,14 +513,11 @@ class BulkCommandGenerator(CommandGeneratorBase):
        
         if not hasattr(pMod, 'GetBulkRequestPDU'):
             raise error.ProtocolError('BULK PDU not implemented at %s' % pMod)
-        reqPDU = pMod.GetBulkRequestPDU()
-        pMod.apiBulkPDU.setDefaults(reqPDU)
+        reqPDU = getReqPdu(pMod, pMod.GetBulkRequestPDU, varBinds)
         
         pMod.apiBulkPDU.setNonRepeaters(reqPDU, nonRepeaters)
         pMod.apiBulkPDU.setMaxRepetitions(reqPDU, maxRepetitions)
 
-        pMod.apiBulkPDU.setVarBinds(reqPDU, varBinds)
-
         requestHandle = getNextHandle()        
         
         self._sendPdu(
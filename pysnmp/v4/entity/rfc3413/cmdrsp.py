@@ -1,4 +1,4 @@
-from pysnmp.proto import rfc1157, rfc1905, rfc3411, error
+from pysnmp.proto import rfc1157, rfc1905, rfc3411, bersize, error
 from pysnmp.proto.api import v2c  # backend is always SMIv2 compliant
 from pysnmp.proto.proxy import rfc2576
 import pysnmp.smi.error
@@ -8,6 +8,8 @@ vacmID = 3
 # 3.2
 class CommandResponderBase:
     pduTypes = ()
+    # Drop trailing var-binds not fitting response rather than report tooBig
+    truncateResponse = 0
 
     def __init__(self, snmpEngine, snmpContext):
         snmpEngine.msgAndPduDsp.registerContextEngineId(
@@ -42,6 +44,37 @@ class CommandResponderBase:
 
         v2c.apiPDU.setErrorStatus(PDU, errorStatus)
         v2c.apiPDU.setErrorIndex(PDU, errorIndex)
+
+        # Size up response while adding var-binds to it so that it
+        # does not have to be encoded to find out it does not fit
+        if maxSizeResponseScopedPDU is not None:
+            requestId = long(PDU.getComponentByPosition(0))
+            errorStatus = long(PDU.getComponentByPosition(1))
+            errorIndex = long(PDU.getComponentByPosition(2))
+            if messageProcessingModel == 3:
+                contextSize = bersize.getTlvSize(len(contextEngineId)) + \
+                              bersize.getTlvSize(len(contextName))
+            varBindsSize = 0
+            for idx in range(len(varBinds)):
+                varBindsSize = varBindsSize + bersize.getVarBindSize(
+                    varBinds[idx]
+                    )
+                scopedPduSize = bersize.getPduSize(
+                    requestId, errorStatus, errorIndex, varBindsSize
+                    )
+                if messageProcessingModel == 3:
+                    scopedPduSize = bersize.getTlvSize(
+                        contextSize + scopedPduSize
+                        )
+                if scopedPduSize > maxSizeResponseScopedPDU:
+                    if self.truncateResponse:
+                        varBinds = varBinds[:idx]
+                    else:
+                        v2c.apiPDU.setErrorStatus(PDU, 'tooBig')
+                        v2c.apiPDU.setErrorIndex(PDU, 0)
+                        varBinds = ()
+                    break
+
         v2c.apiPDU.setVarBinds(PDU, varBinds)
 
         # Agent-side API complies with SMIv2
@@ -65,8 +98,7 @@ class CommandResponderBase:
                 statusInformation
                 )
         except error.StatusInformation:
-            snmpSilentDrops, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpSilentDrops')
-            snmpSilentDrops.syntax = snmpSilentDrops.syntax + 1
+            snmpEngine.counters.snmpSilentDrops = snmpEngine.counters.snmpSilentDrops + 1
 
     _getRequestType = rfc1905.GetRequestPDU.tagSet
     _getNextRequestType = rfc1905.GetNextRequestPDU.tagSet
@@ -192,13 +224,11 @@ class CommandResponderBase:
             elif errorIndication == 'otherError':
                 raise pysnmp.smi.error.GenError(name=name, idx=idx)
             elif errorIndication == 'noSuchContext':
-                snmpUnknownContexts, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-TARGET-MIB', 'snmpUnknownContexts')
-                snmpUnknownContexts.syntax = snmpUnknownContexts.syntax + 1
+                snmpEngine.counters.snmpUnknownContexts = snmpEngine.counters.snmpUnknownContexts + 1
+                oid, val = snmpEngine.counters.getVarBind('snmpUnknownContexts')
                 # Request REPORT generation
                 raise pysnmp.smi.error.GenError(
-                    name=name, idx=idx,
-                    oid=snmpUnknownContexts.name,
-                    val=snmpUnknownContexts.syntax
+                    name=name, idx=idx, oid=oid, val=val
                     )
             elif errorIndication == 'notInView':
                 return 1
@@ -232,6 +262,7 @@ class NextCommandResponder(CommandResponderBase):
 
 class BulkCommandResponder(CommandResponderBase):
     pduTypes = ( rfc1905.GetBulkRequestPDU.tagSet, )
+    truncateResponse = 1
     maxVarBinds = 64
     
     # rfc1905: 4.2.3
@@ -31,7 +31,8 @@ def getTargetAddr(snmpEngine, snmpTargetAddrName):
     if noSuchInstance.isSameTypeWith(snmpTargetAddrParams):
         raise SmiError('Target %s not configured at SMI' % snmpTargetAddrName)
 
-    if snmpTargetAddrTDomain == config.snmpUDPDomain:
+    if snmpTargetAddrTDomain == config.snmpUDPDomain or \
+           snmpTargetAddrTDomain == config.snmpTCPDomain:
         SnmpUDPAddress, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('SNMPv2-TM', 'SnmpUDPAddress')
         snmpTargetAddrTAddress = tuple(
             SnmpUDPAddress(snmpTargetAddrTAddress)
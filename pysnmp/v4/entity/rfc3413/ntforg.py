@@ -54,7 +54,12 @@ class NotificationOriginator:
         snmpEngine.transportDispatcher.jobFinished(id(self))
 
         if statusInformation:
-            if origRetries == origRetryCount:
+            # Retry count is the total number of transmissions. With no
+            # retries given request is not re-sent on timeout, though it
+            # still may be once as SNMPv3 engine ID discovery takes it.
+            if origRetries == origRetryCount or not origRetryCount and \
+                   ( origRetries > 1 or
+                     statusInformation['errorIndication'] == 'requestTimedOut' ):
                 cbFun(origSendRequestHandle,
                       statusInformation['errorIndication'],
                       cbCtx)
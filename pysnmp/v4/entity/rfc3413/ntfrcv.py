@@ -79,8 +79,7 @@ class NotificationReceiver:
                     statusInformation
                     )
             except error.StatusInformation:
-                snmpSilentDrops, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpSilentDrops')
-                snmpSilentDrops.syntax = snmpSilentDrops.syntax + 1
+                snmpEngine.counters.snmpSilentDrops = snmpEngine.counters.snmpSilentDrops + 1
 
         elif rfc3411.unconfirmedClassPDUs.has_key(PDU.tagSet):
             pass
@@ -2,6 +2,12 @@ import socket, string, types
 from pysnmp.entity import engine, config
 from pysnmp.entity.rfc3413 import cmdgen, mibvar
 from pysnmp.carrier.asynsock.dgram import udp
+from pysnmp.carrier.asynsock.stream import tcp
+try:
+    from pysnmp.carrier.asyncio import dispatch as aiodispatch
+    from pysnmp.carrier.asyncio.dgram import udp as aioudp
+except ImportError:
+    aiodispatch = aioudp = None
 from pysnmp.smi import view
 from pysnmp import nextid, error
 from pyasn1.type import univ
@@ -9,6 +15,10 @@ from pyasn1.type import univ
 # Auth protocol
 usmHMACMD5AuthProtocol = config.usmHMACMD5AuthProtocol
 usmHMACSHAAuthProtocol = config.usmHMACSHAAuthProtocol
+usmHMAC128SHA224AuthProtocol = config.usmHMAC128SHA224AuthProtocol
+usmHMAC192SHA256AuthProtocol = config.usmHMAC192SHA256AuthProtocol
+usmHMAC256SHA384AuthProtocol = config.usmHMAC256SHA384AuthProtocol
+usmHMAC384SHA512AuthProtocol = config.usmHMAC384SHA512AuthProtocol
 usmNoAuthProtocol = config.usmNoAuthProtocol
 
 # Privacy protocol
@@ -18,6 +28,25 @@ usmNoPrivProtocol = config.usmNoPrivProtocol
 
 nextID = nextid.Integer(0xffffffff)
 
+def _walkTableRows(varBindHead, varBindTotalTable, varBindTable, isBulk):
+    """Collect GETNEXT/GETBULK response rows into varBindTotalTable,
+       return true while any of the columns being walked is not over
+    """
+    if isBulk:
+        varBindTotalTable.extend(varBindTable) # XXX out of table 
+                                               # rows possible
+    varBindTableRow = varBindTable[-1]
+    for idx in range(len(varBindTableRow)):
+        name, val = varBindTableRow[idx]
+        # XXX extra rows
+        if val is not None and varBindHead[idx].isPrefixOf(name):
+            break
+    else:
+        return
+    if not isBulk:
+        varBindTotalTable.extend(varBindTable)
+    return 1
+
 class CommunityData:
     mpModel=1 # Default is SMIv2
     securityModel=mpModel+1
@@ -106,6 +135,24 @@ class UdpTransportTarget:
         self.transport = udp.UdpSocketTransport().openClientMode()
         return self.transport
         
+class TcpTransportTarget(UdpTransportTarget):
+    """SNMP over TCP target, connections are kept open between requests"""
+    transportDomain = tcp.domainName
+    def __init__(self, transportAddr, timeout=1, retries=0):
+        UdpTransportTarget.__init__(self, transportAddr, timeout, retries)
+
+    def openClientMode(self):
+        self.transport = tcp.TcpSocketTransport().openClientMode()
+        return self.transport
+
+class AsyncioUdpTransportTarget(UdpTransportTarget):
+    """UDP target to be used with AsyncioCommandGenerator"""
+    def openClientMode(self):
+        if aioudp is None:
+            raise error.PySnmpError('asyncio support not available')
+        self.transport = aioudp.UdpAsyncioTransport().openClientMode()
+        return self.transport
+        
 class AsynCommandGenerator:
     _null = univ.Null('')
     def __init__(self, snmpEngine=None):
@@ -294,6 +341,9 @@ class AsynCommandGenerator:
             varBinds, cbFun, cbCtx
             )
 
+    def _getVarBindHead(self, varNames):
+        return map(lambda (x,y): univ.ObjectIdentifier(x+y), map(lambda x,self=self: mibvar.mibNameToOid(self.mibViewController, x), varNames))
+
 class CommandGenerator(AsynCommandGenerator):
     def getCmd(self, authData, transportTarget, *varNames):
         def __cbFun(
@@ -340,39 +390,11 @@ class CommandGenerator(AsynCommandGenerator):
             )
 
     def nextCmd(self, authData, transportTarget, *varNames):
-        def __cbFun(
-            sendRequestHandle, errorIndication, errorStatus, errorIndex,
-            varBindTable, (varBindHead, varBindTotalTable, appReturn)
-            ):
-            if errorIndication or errorStatus:
-                appReturn['errorIndication'] = errorIndication
-                appReturn['errorStatus'] = errorStatus
-                appReturn['errorIndex'] = errorIndex
-                appReturn['varBindTable'] = varBindTable
-                return
-            else:
-                varBindTableRow = varBindTable[-1]
-                for idx in range(len(varBindTableRow)):
-                    name, val = varBindTableRow[idx]
-                    # XXX extra rows
-                    if val is not None and varBindHead[idx].isPrefixOf(name):
-                        break
-                else:
-                    appReturn['errorIndication'] = errorIndication
-                    appReturn['errorStatus'] = errorStatus
-                    appReturn['errorIndex'] = errorIndex
-                    appReturn['varBindTable'] = varBindTotalTable
-                    return
-                varBindTotalTable.extend(varBindTable)
-
-            return 1 # continue table retrieval
-        
-        varBindHead = map(lambda (x,y): univ.ObjectIdentifier(x+y), map(lambda x,self=self: mibvar.mibNameToOid(self.mibViewController, x), varNames))
-
         appReturn = {}
         self.asyncNextCmd(
             authData, transportTarget, varNames,
-            (__cbFun, (varBindHead,[],appReturn))
+            (self.__walkCbFun,
+             (self._getVarBindHead(varNames), [], 0, appReturn))
             )
 
         self.snmpEngine.transportDispatcher.runDispatcher()
@@ -386,40 +408,11 @@ class CommandGenerator(AsynCommandGenerator):
 
     def bulkCmd(self, authData, transportTarget,
                 nonRepeaters, maxRepetitions, *varNames):
-        def __cbFun(
-            sendRequestHandle, errorIndication, errorStatus, errorIndex,
-            varBindTable, (varBindHead, varBindTotalTable, appReturn)
-            ):
-            if errorIndication or errorStatus:
-                appReturn['errorIndication'] = errorIndication
-                appReturn['errorStatus'] = errorStatus
-                appReturn['errorIndex'] = errorIndex
-                appReturn['varBindTable'] = varBindTable
-                return
-            else:
-                varBindTotalTable.extend(varBindTable) # XXX out of table 
-                                                       # rows possible
-                varBindTableRow = varBindTable[-1]
-                for idx in range(len(varBindTableRow)):
-                    name, val = varBindTableRow[idx]
-                    if val is not None and varBindHead[idx].isPrefixOf(name):
-                        break
-                else:
-                    appReturn['errorIndication'] = errorIndication
-                    appReturn['errorStatus'] = errorStatus
-                    appReturn['errorIndex'] = errorIndex
-                    appReturn['varBindTable'] = varBindTotalTable
-                    return
-                
-            return 1 # continue table retrieval
-        
-        varBindHead = map(lambda (x,y): univ.ObjectIdentifier(x+y), map(lambda x,self=self: mibvar.mibNameToOid(self.mibViewController, x), varNames))
-
         appReturn = {}
-        
         self.asyncBulkCmd(
             authData, transportTarget, nonRepeaters, maxRepetitions,
-            varNames, (__cbFun, (varBindHead, [], appReturn))
+            varNames, (self.__walkCbFun,
+                       (self._getVarBindHead(varNames), [], 1, appReturn))
             )
 
         self.snmpEngine.transportDispatcher.runDispatcher()
@@ -430,3 +423,109 @@ class CommandGenerator(AsynCommandGenerator):
             appReturn['errorIndex'],
             appReturn['varBindTable']
             )
+
+    def __walkCbFun(
+        self, sendRequestHandle, errorIndication, errorStatus, errorIndex,
+        varBindTable, (varBindHead, varBindTotalTable, isBulk, appReturn)
+        ):
+        if not errorIndication and not errorStatus:
+            if _walkTableRows(
+                varBindHead, varBindTotalTable, varBindTable, isBulk
+                ):
+                return 1 # continue table retrieval
+            varBindTable = varBindTotalTable
+        appReturn['errorIndication'] = errorIndication
+        appReturn['errorStatus'] = errorStatus
+        appReturn['errorIndex'] = errorIndex
+        appReturn['varBindTable'] = varBindTable
+
+class AsyncioCommandGenerator(AsynCommandGenerator):
+    """Command generator running over asyncio event loop. Its methods
+       return Futures (to be awaited or yielded from) resolving into the
+       same tuples CommandGenerator methods return. Use it with
+       AsyncioUdpTransportTarget.
+    """
+    def __init__(self, snmpEngine=None, loop=None):
+        if aiodispatch is None:
+            raise error.PySnmpError('asyncio support not available')
+        AsynCommandGenerator.__init__(self, snmpEngine)
+        self.__loop = loop
+        if self.snmpEngine.transportDispatcher is None:
+            self.snmpEngine.registerTransportDispatcher(
+                aiodispatch.AsyncioDispatcher(loop)
+                )
+
+    def __createFuture(self):
+        # Transport deconfiguration may drop dispatcher off the engine
+        if self.snmpEngine.transportDispatcher is None:
+            self.snmpEngine.registerTransportDispatcher(
+                aiodispatch.AsyncioDispatcher(self.__loop)
+                )
+        return self.snmpEngine.transportDispatcher.createFuture()
+
+    def getCmd(self, authData, transportTarget, *varNames):
+        def __cbFun(
+            sendRequestHandle, errorIndication, errorStatus, errorIndex,
+            varBinds, future
+            ):
+            if not future.done():
+                future.set_result(
+                    (errorIndication, errorStatus, errorIndex, varBinds)
+                    )
+
+        future = self.__createFuture()
+        self.asyncGetCmd(
+            authData, transportTarget, varNames, (__cbFun, future)
+            )
+        return future
+
+    def setCmd(self, authData, transportTarget, *varBinds):
+        def __cbFun(
+            sendRequestHandle, errorIndication, errorStatus, errorIndex,
+            varBinds, future
+            ):
+            if not future.done():
+                future.set_result(
+                    (errorIndication, errorStatus, errorIndex, varBinds)
+                    )
+
+        future = self.__createFuture()
+        self.asyncSetCmd(
+            authData, transportTarget, varBinds, (__cbFun, future)
+            )
+        return future
+
+    def nextCmd(self, authData, transportTarget, *varNames):
+        future = self.__createFuture()
+        self.asyncNextCmd(
+            authData, transportTarget, varNames,
+            (self.__walkCbFun,
+             (self._getVarBindHead(varNames), [], 0, future))
+            )
+        return future
+
+    def bulkCmd(self, authData, transportTarget,
+                nonRepeaters, maxRepetitions, *varNames):
+        future = self.__createFuture()
+        self.asyncBulkCmd(
+            authData, transportTarget, nonRepeaters, maxRepetitions,
+            varNames, (self.__walkCbFun,
+                       (self._getVarBindHead(varNames), [], 1, future))
+            )
+        return future
+
+    def __walkCbFun(
+        self, sendRequestHandle, errorIndication, errorStatus, errorIndex,
+        varBindTable, (varBindHead, varBindTotalTable, isBulk, future)
+        ):
+        if future.done():  # cancelled by app
+            return
+        if not errorIndication and not errorStatus:
+            if _walkTableRows(
+                varBindHead, varBindTotalTable, varBindTable, isBulk
+                ):
+                return 1 # continue table retrieval
+            varBindTable = varBindTotalTable
+        future.set_result(
+            (errorIndication, errorStatus, errorIndex, varBindTable)
+            )
@@ -6,6 +6,10 @@ from pysnmp.entity.rfc3413.oneliner import cmdgen
 # Auth protocol
 usmHMACMD5AuthProtocol = cmdgen.usmHMACMD5AuthProtocol
 usmHMACSHAAuthProtocol = cmdgen.usmHMACSHAAuthProtocol
+usmHMAC128SHA224AuthProtocol = cmdgen.usmHMAC128SHA224AuthProtocol
+usmHMAC192SHA256AuthProtocol = cmdgen.usmHMAC192SHA256AuthProtocol
+usmHMAC256SHA384AuthProtocol = cmdgen.usmHMAC256SHA384AuthProtocol
+usmHMAC384SHA512AuthProtocol = cmdgen.usmHMAC384SHA512AuthProtocol
 usmNoAuthProtocol = cmdgen.usmNoAuthProtocol
 
 # Privacy protocol
@@ -19,6 +23,7 @@ UsmUserData = cmdgen.UsmUserData
 
 # Transport
 UdpTransportTarget = cmdgen.UdpTransportTarget
+TcpTransportTarget = cmdgen.TcpTransportTarget
 
 class AsynNotificationOriginator(cmdgen.AsynCommandGenerator):
     def __init__(self, snmpEngine=None, snmpContext=None):
@@ -78,8 +78,11 @@ class PDUAPI:
         return map(lambda x: apiVarBind.getOIDVal(x),
                    pdu.getComponentByPosition(3))
     def setVarBinds(self, pdu, varBinds):
+        # Current var-bind list may be shared by other PDUs (see
+        # mpmod.rfc2576.freezeVarBinds()) so build a new one
         varBindList = pdu.setComponentByPosition(3).getComponentByPosition(3)
-        varBindList.clear()
+        varBindList = varBindList.clone()
+        pdu.setComponentByPosition(3, varBindList)
         idx = 0
         for varBind in varBinds:
             if type(varBind) is types.InstanceType:
@@ -1,6 +1,79 @@
-from pyasn1.codec.ber import decoder
+from pyasn1.type import univ
+from pysnmp.proto import error
+
+# Fast SNMP message header scanner. It walks BER TLV headers of raw
+# message to figure out SNMP version (and, for v1/v2c, community and
+# PDU type) so that malformed messages get rejected before any pyasn1
+# objects are built. Message may be a string or a buffer object, it's
+# only indexed and sliced.
+
+# PDU tags allowed by SNMP version
+pduTags = {
+    0: ( '\xa0', '\xa1', '\xa2', '\xa3', '\xa4' ),
+    1: ( '\xa0', '\xa1', '\xa2', '\xa3', '\xa5', '\xa6', '\xa7', '\xa8' )
+    }
+
+def _scanTlvHeader(wholeMsg, offset, msgEnd):
+    """Return (tag, value offset, value end offset) of BER TLV at offset"""
+    if offset + 2 > msgEnd:
+        raise error.ProtocolError('Short BER header at %s' % offset)
+    tag = wholeMsg[offset]
+    if ord(tag) & 0x1f == 0x1f:
+        raise error.ProtocolError('Unexpected long BER tag at %s' % offset)
+    length = ord(wholeMsg[offset+1])
+    offset = offset + 2
+    if length & 0x80:
+        lengthSize = length & 0x7f
+        if not lengthSize:
+            if not ord(tag) & 0x20:
+                raise error.ProtocolError(
+                    'Indefinite length primitive value at %s' % offset
+                    )
+            return tag, offset, msgEnd  # indefinite length
+        if lengthSize > 4 or offset + lengthSize > msgEnd:
+            raise error.ProtocolError('Bad BER length at %s' % offset)
+        length = 0L
+        for octet in wholeMsg[offset:offset+lengthSize]:
+            length = length << 8 | ord(octet)
+        offset = offset + lengthSize
+    if offset + length > msgEnd:
+        raise error.ProtocolError('BER value overrun at %s' % offset)
+    return tag, offset, int(offset + length)
+
+def scanMessageHeader(wholeMsg):
+    """Return (msgVersion, community, pduTag, pduOffset, msgEnd) of
+       serialized SNMP message. For v1/v2c messages pduOffset points to
+       PDU, otherwise to the component following msgVersion while
+       community and pduTag are None.
+    """
+    tag, offset, msgEnd = _scanTlvHeader(wholeMsg, 0, len(wholeMsg))
+    if tag != '\x30':
+        raise error.ProtocolError('Message is not a SEQUENCE')
+    tag, offset, valueEnd = _scanTlvHeader(wholeMsg, offset, msgEnd)
+    if tag != '\x02' or offset == valueEnd or valueEnd - offset > 4:
+        raise error.ProtocolError('Bad msgVersion')
+    msgVersion = ord(wholeMsg[offset])
+    if msgVersion & 0x80:
+        msgVersion = msgVersion - 0x100
+    for octet in wholeMsg[offset+1:valueEnd]:
+        msgVersion = msgVersion << 8 | ord(octet)
+    if not pduTags.has_key(msgVersion):
+        if msgVersion == 3:
+            tag, offset, msgGlobalDataEnd = _scanTlvHeader(
+                wholeMsg, valueEnd, msgEnd
+                )
+            if tag != '\x30':
+                raise error.ProtocolError('Bad msgGlobalData')
+        return msgVersion, None, None, valueEnd, msgEnd
+    tag, offset, valueEnd = _scanTlvHeader(wholeMsg, valueEnd, msgEnd)
+    if tag != '\x04':
+        raise error.ProtocolError('Bad community')
+    community = wholeMsg[offset:valueEnd]
+    pduOffset = valueEnd
+    tag, offset, valueEnd = _scanTlvHeader(wholeMsg, pduOffset, msgEnd)
+    if tag not in pduTags[msgVersion]:
+        raise error.ProtocolError('Bad PDU type %s' % repr(tag))
+    return msgVersion, community, ord(tag), pduOffset, msgEnd
 
 def decodeMessageVersion(wholeMsg):
-    seq, wholeMsg = decoder.decode(wholeMsg, recursiveFlag=0)
-    ver, wholeMsg = decoder.decode(wholeMsg, recursiveFlag=0)
-    return ver
+    return univ.Integer(scanMessageHeader(wholeMsg)[0])
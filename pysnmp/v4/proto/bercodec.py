@@ -0,0 +1,571 @@
+# BER codecs for SNMP messages.
+#
+# Pyasn1Codec is a thin wrapper around generic pyasn1 BER codec.
+#
+# SnmpCodec is specialized for the fixed SNMP message structures (v1/v2c
+# Message, SNMPv3 header, ScopedPDU, PDUs, VarBindLists) built from the
+# handful of SMI types. Decoder plans are compiled once per ASN.1 spec
+# into tables keyed by tag octet and then walked by offset over the
+# substrate; the encoder picks value encoders by base tag from a table
+# cached per type. Whatever these tables do not cover (long tags,
+# indefinite length, OPTIONAL/DEFAULT components, explicit tagging,
+# malformed substrate, ...) is handed over to pyasn1, so the outcome is
+# always the same as with pyasn1, byte-for-byte.
+#
+# Unless told otherwise, SnmpCodec decodes SEQUENCE OF values (that is,
+# VarBindLists) lazily: their components are only checked for being
+# well-formed when the message is decoded, and turned into pyasn1
+# objects one by one as they are accessed. Messages dropped on their
+# header (unknown community, stray response...) are thus never fully
+# decoded.
+#
+# Substrate may be either a string or a buffer object (e.g. one over
+# transport's receive buffer), SnmpCodec only indexes and slices it so
+# values get copied out of substrate but nothing else does. As buffer
+# contents may change once message is processed, lazily decoded values
+# keep a copy of their part of non-string substrate.
+import string, types
+from pyasn1.type import base, univ, tag
+from pyasn1.codec.ber import encoder, decoder
+from pysnmp.proto import error
+
+class Pyasn1Codec:
+    """Generic pyasn1 BER codec"""
+    def encode(self, value):
+        return encoder.encode(value)
+
+    def decode(self, substrate, asn1Spec=None):
+        return decoder.decode(substrate, asn1Spec=asn1Spec)
+
+    def decodeComponents(self, value):
+        """Finish decoding of value returned by decode()"""
+
+    def locateValue(self, substrate, path):
+        """Return (value offset, value end offset) of a component of
+           encoded value, see _locateValue()
+        """
+        return _locateValue(substrate, path)
+
+# Value kinds
+
+( integerKind, octetStringKind, nullKind, objectIdentifierKind,
+  sequenceKind, sequenceOfKind, choiceKind, lazySequenceOfKind ) = range(8)
+
+# Base tag -> simple value kind (as pyasn1 codec picks it)
+_simpleKinds = {
+    univ.Integer.tagSet.getBaseTag(): integerKind,
+    univ.Enumerated.tagSet.getBaseTag(): integerKind,
+    univ.OctetString.tagSet.getBaseTag(): octetStringKind,
+    univ.Null.tagSet.getBaseTag(): nullKind,
+    univ.ObjectIdentifier.tagSet.getBaseTag(): objectIdentifierKind
+    }
+
+_sequenceBaseTag = univ.Sequence.tagSet.getBaseTag()
+
+def _getTagOctet(tagSet):
+    if len(tagSet) != 1:
+        raise error.ProtocolError('Explicit tagging not supported')
+    tagClass, tagFormat, tagId = tagSet[0]
+    if tagId >= 31:
+        raise error.ProtocolError('Long tags not supported')
+    return tagClass | tagFormat | tagId
+
+def _getValueKind(value):
+    if isinstance(value, univ.Choice):
+        if value.getTagSet():
+            raise error.ProtocolError('Tagged Choice not supported')
+        return choiceKind
+    baseTag = value.getTagSet().getBaseTag()
+    if baseTag == _sequenceBaseTag:
+        if isinstance(value, univ.SequenceOf):
+            return sequenceOfKind
+        if isinstance(value, univ.Sequence):
+            for namedType in value.getComponentType():
+                if namedType.isOptional or namedType.isDefaulted:
+                    raise error.ProtocolError(
+                        'Optional components not supported'
+                        )
+            return sequenceKind
+    elif _simpleKinds.has_key(baseTag):
+        return _simpleKinds[baseTag]
+    raise error.ProtocolError('Unsupported type %s' % value.__class__)
+
+# Encoder
+
+def _encodeLength(length):
+    if length < 0x80:
+        return chr(length)
+    substrate = ''
+    while length:
+        substrate = chr(length & 0xff) + substrate
+        length = length >> 8
+    return chr(0x80 | len(substrate)) + substrate
+
+def _encodeInteger(value):
+    if 0 <= value < 0x80:
+        return chr(value)
+    octets = []
+    while 1:
+        octets.insert(0, chr(value & 0xff))
+        if -0x80 <= value < 0x80:
+            return string.join(octets, '')
+        value = value >> 8
+
+def _encodeObjectIdentifier(oid):
+    if len(oid) < 2:
+        raise error.ProtocolError('Short OID %s' % (oid,))
+    # same (non-BER for arcs over 127) initial octet as pyasn1 produces
+    octets = [ chr(oid[0] * 40 + oid[1]) ]
+    for subId in oid[2:]:
+        if 0 <= subId < 0x80:
+            octets.append(chr(subId))
+        elif subId < 0 or subId > 0xffffffffL:
+            raise error.ProtocolError('SubId overflow %s' % subId)
+        else:
+            res = [ chr(subId & 0x7f) ]
+            subId = subId >> 7
+            while subId:
+                res.insert(0, chr(0x80 | subId & 0x7f))
+                subId = subId >> 7
+            octets.append(string.join(res, ''))
+    return string.join(octets, '')
+
+# Decoder
+
+def _decodeObjectIdentifier(substrate):
+    # mirrors pyasn1 decoder, including single-octet initial sub-IDs
+    subId = ord(substrate[0])
+    oid = [ subId / 40, subId % 40 ]
+    index = 1
+    substrateLen = len(substrate)
+    while index < substrateLen:
+        subId = ord(substrate[index])
+        index = index + 1
+        if subId >= 0x80:
+            value = 0
+            while subId >= 0x80:
+                value = value << 7 | subId & 0x7f
+                subId = ord(substrate[index])
+                index = index + 1
+            subId = value << 7 | subId
+        oid.append(subId)
+    return tuple(oid)
+
+def _compileDecoderPlan(asn1Spec, lazySequenceOf=0):
+    """Return decoder plan tuple for ASN.1 spec: (choiceKind, spec,
+       {tagOctet: (position, plan)}) for untagged Choice,
+       (kind, tagOctet, spec, componentPlan(s)) otherwise. With
+       lazySequenceOf set, SEQUENCE OF components get decoded on access.
+    """
+    kind = _getValueKind(asn1Spec)
+    if kind == choiceKind:
+        choices = {}
+        componentType = asn1Spec.getComponentType()
+        for idx in range(len(componentType)):
+            plan = _compileDecoderPlan(
+                componentType.getTypeByPosition(idx), lazySequenceOf
+                )
+            if plan[0] == choiceKind:
+                tagOctets = plan[2].keys()
+            else:
+                tagOctets = [ plan[1] ]
+            for tagOctet in tagOctets:
+                if choices.has_key(tagOctet):
+                    raise error.ProtocolError(
+                        'Ambiguous tag %s at %s' % (tagOctet, asn1Spec)
+                        )
+                choices[tagOctet] = idx, plan
+        return choiceKind, asn1Spec, choices
+    tagOctet = _getTagOctet(asn1Spec.getTagSet())
+    if kind == sequenceKind:
+        return kind, tagOctet, asn1Spec, tuple(
+            map(lambda x, l=lazySequenceOf: _compileDecoderPlan(x.getType(), l),
+                asn1Spec.getComponentType())
+            )
+    if kind == sequenceOfKind:
+        componentPlan = _compileDecoderPlan(asn1Spec.getComponentType())
+        if lazySequenceOf:
+            return lazySequenceOfKind, tagOctet, _getLazySequenceOf(
+                asn1Spec
+                ), componentPlan
+        return kind, tagOctet, asn1Spec, componentPlan
+    return kind, tagOctet, asn1Spec, None
+
+def _decodeHeader(tagOctet, substrate, offset, end):
+    """Return (value offset, value end offset) of TLV at offset, its tag
+       octet is not checked if tagOctet is None
+    """
+    if offset + 2 > end or \
+       tagOctet is not None and ord(substrate[offset]) != tagOctet:
+        raise error.ProtocolError('Tag mismatch at %s' % offset)
+    length = ord(substrate[offset+1])
+    offset = offset + 2
+    if length & 0x80:
+        lengthSize = length & 0x7f
+        if not lengthSize:
+            raise error.ProtocolError('Indefinite length not supported')
+        length = 0
+        for octet in substrate[offset:offset+lengthSize]:
+            length = length << 8 | ord(octet)
+        offset = offset + lengthSize
+    valueEnd = offset + length
+    if valueEnd > end:
+        raise error.ProtocolError('Value overrun at %s' % offset)
+    return offset, valueEnd
+
+def _locateValue(substrate, path):
+    """Return (value offset, value end offset) of TLV reached from the
+       outermost one by component positions in path. Values of primitive
+       TLVs (e.g. OCTET STRING carrying BER) are walked into as if they
+       were constructed.
+    """
+    offset, end = _decodeHeader(None, substrate, 0, len(substrate))
+    for idx in path:
+        while 1:
+            # Short form length is inlined
+            if offset + 2 > end or ord(substrate[offset+1]) & 0x80:
+                valueOffset, valueEnd = _decodeHeader(
+                    None, substrate, offset, end
+                    )
+            else:
+                valueOffset = offset + 2
+                valueEnd = valueOffset + ord(substrate[offset+1])
+                if valueEnd > end:
+                    raise error.ProtocolError(
+                        'Value overrun at %s' % valueOffset
+                        )
+            if not idx:
+                break
+            offset = valueEnd
+            idx = idx - 1
+        offset, end = valueOffset, valueEnd
+    return offset, end
+
+def _scanValue(plan, substrate, offset, end):
+    """Check TLV at offset against plan without building any values,
+       return next offset
+    """
+    kind = plan[0]
+    if kind == choiceKind:
+        idx, componentPlan = plan[2][ord(substrate[offset])]
+        return _scanValue(componentPlan, substrate, offset, end)
+    offset, valueEnd = _decodeHeader(plan[1], substrate, offset, end)
+    if kind == integerKind:
+        if offset == valueEnd:
+            raise error.ProtocolError('Empty integer at %s' % offset)
+    elif kind == objectIdentifierKind:
+        if offset == valueEnd or ord(substrate[valueEnd-1]) & 0x80:
+            raise error.ProtocolError('Bad OID at %s' % offset)
+    elif kind == nullKind:
+        if offset != valueEnd:
+            raise error.ProtocolError('Non-empty NULL at %s' % offset)
+    elif kind == sequenceKind:
+        for componentPlan in plan[3]:
+            offset = _scanValue(componentPlan, substrate, offset, valueEnd)
+        if offset != valueEnd:
+            raise error.ProtocolError('Trailing components at %s' % offset)
+    elif kind == sequenceOfKind or kind == lazySequenceOfKind:
+        while offset < valueEnd:
+            offset = _scanValue(plan[3], substrate, offset, valueEnd)
+    return valueEnd
+
+def _decodeValue(plan, substrate, offset, end):
+    """Return (value, next offset) of TLV at offset"""
+    kind = plan[0]
+    if kind == choiceKind:
+        idx, componentPlan = plan[2][ord(substrate[offset])]
+        component, offset = _decodeValue(
+            componentPlan, substrate, offset, end
+            )
+        value = plan[1].clone()
+        value.setComponentByPosition(idx, component)
+        return value, offset
+
+    offset, valueEnd = _decodeHeader(plan[1], substrate, offset, end)
+    length = valueEnd - offset
+
+    if kind == integerKind:
+        if length == 0:
+            raise error.ProtocolError('Empty integer at %s' % offset)
+        value = ord(substrate[offset])
+        if value & 0x80:
+            value = value - 0x100
+        for octet in substrate[offset+1:valueEnd]:
+            value = value << 8 | ord(octet)
+        return plan[2].clone(value), valueEnd
+    if kind == octetStringKind:
+        return plan[2].clone(substrate[offset:valueEnd]), valueEnd
+    if kind == objectIdentifierKind:
+        if length == 0:
+            raise error.ProtocolError('Empty OID at %s' % offset)
+        return plan[2].clone(
+            _decodeObjectIdentifier(substrate[offset:valueEnd])
+            ), valueEnd
+    if kind == nullKind:
+        if length:
+            raise error.ProtocolError('Non-empty NULL at %s' % offset)
+        return plan[2], valueEnd  # as pyasn1 does
+
+    value = plan[2].clone()
+    if kind == lazySequenceOfKind:
+        componentPlan = plan[3]
+        offsets = []
+        while offset < valueEnd:
+            offsets.append(offset)
+            offset = _scanValue(componentPlan, substrate, offset, valueEnd)
+        value._setSubstrate(componentPlan, substrate, offsets, valueEnd)
+    elif kind == sequenceKind:
+        idx = 0
+        for componentPlan in plan[3]:
+            component, offset = _decodeValue(
+                componentPlan, substrate, offset, valueEnd
+                )
+            value.setComponentByPosition(idx, component)
+            idx = idx + 1
+    else:
+        componentPlan = plan[3]
+        idx = 0
+        while offset < valueEnd:
+            component, offset = _decodeValue(
+                componentPlan, substrate, offset, valueEnd
+                )
+            value.setComponentByPosition(idx, component)
+            idx = idx + 1
+    if offset != valueEnd:
+        raise error.ProtocolError('Trailing components at %s' % offset)
+    value.verifySizeSpec()
+    return value, valueEnd
+
+# SEQUENCE OF value class -> its lazily decoded subclass
+_lazySequenceOfClasses = {}
+
+def _getLazySequenceOf(asn1Spec):
+    """Return a copy of SEQUENCE OF spec whose clones, once given the
+       substrate of their components, decode each component on first
+       access
+    """
+    baseClass = asn1Spec.__class__
+    if not _lazySequenceOfClasses.has_key(baseClass):
+        class LazySequenceOf(baseClass):
+            # Components offsets in substrate, None when decoded
+            _offsets = None
+
+            def _setSubstrate(self, componentPlan, substrate, offsets, end):
+                if type(substrate) is not types.StringType:
+                    if offsets:
+                        start = offsets[0]
+                        offsets = map(
+                            lambda x, start=start: x - start, offsets
+                            )
+                    else:
+                        start = end
+                    substrate = substrate[start:end]
+                self._componentPlan = componentPlan
+                self._substrate = substrate
+                self._offsets = offsets
+                self._pendingCount = len(offsets)
+                self._componentValues = [ None ] * len(offsets)
+
+            def _dropComponent(self, idx):
+                self._offsets[idx] = None
+                self._pendingCount = self._pendingCount - 1
+                if not self._pendingCount:
+                    self._offsets = self._substrate = None
+
+            def _decodeComponent(self, idx):
+                offsets = self._offsets
+                if offsets is None:
+                    return
+                if idx < 0:
+                    idx = idx + len(offsets)
+                if idx < 0 or idx >= len(offsets) or offsets[idx] is None:
+                    return
+                substrate = self._substrate
+                try:
+                    value, offset = _decodeValue(
+                        self._componentPlan, substrate,
+                        offsets[idx], len(substrate)
+                        )
+                except StandardError:
+                    # let pyasn1 decode or complain about it
+                    value, rest = decoder.decode(
+                        substrate[offsets[idx]:],
+                        asn1Spec=self.getComponentType()
+                        )
+                self._dropComponent(idx)
+                baseClass.setComponentByPosition(self, idx, value)
+
+            def _decodeComponents(self):
+                if self._offsets is not None:
+                    for idx in range(len(self._offsets)):
+                        self._decodeComponent(idx)
+
+            def getComponentByPosition(self, idx):
+                self._decodeComponent(idx)
+                return baseClass.getComponentByPosition(self, idx)
+
+            def setComponentByPosition(self, idx, value=None):
+                offsets = self._offsets
+                if offsets is not None:
+                    if value is None or idx < 0 or idx >= len(offsets):
+                        self._decodeComponents()
+                    elif offsets[idx] is not None:
+                        self._dropComponent(idx)
+                return baseClass.setComponentByPosition(self, idx, value)
+
+            def __getitem__(self, idx):
+                if isinstance(idx, types.SliceType):
+                    self._decodeComponents()
+                else:
+                    self._decodeComponent(idx)
+                return baseClass.__getitem__(self, idx)
+
+            def clear(self):
+                self._offsets = self._substrate = None
+                baseClass.clear(self)
+
+            def __repr__(self):
+                self._decodeComponents()
+                return baseClass.__repr__(self)
+
+            def __cmp__(self, other):
+                self._decodeComponents()
+                return baseClass.__cmp__(self, other)
+
+            def prettyPrint(self, scope=0):
+                self._decodeComponents()
+                return baseClass.prettyPrint(self, scope)
+
+            def _cloneComponentValues(self, myClone, cloneValueFlag):
+                self._decodeComponents()
+                baseClass._cloneComponentValues(
+                    self, myClone, cloneValueFlag
+                    )
+
+        LazySequenceOf.__name__ = baseClass.__name__
+        _lazySequenceOfClasses[baseClass] = LazySequenceOf
+    lazySpec = asn1Spec.clone()
+    lazySpec.__class__ = _lazySequenceOfClasses[baseClass]
+    return lazySpec
+
+class SnmpCodec(Pyasn1Codec):
+    """BER codec specialized for SNMP message structures"""
+    def __init__(self, lazySequenceOf=1):
+        self.__encoderEntries = {}
+        self.__decoderPlans = {}
+        # Decoded SEQUENCE OF values (e.g. VarBindList) decode their
+        # components on first access
+        self.__lazySequenceOf = lazySequenceOf
+
+    # Encoder
+
+    def __getEncoderEntry(self, value):
+        tagSet = value.getTagSet()
+        key = value.__class__, id(tagSet)
+        entry = self.__encoderEntries.get(key)
+        if entry is None:
+            if len(self.__encoderEntries) > 256:
+                self.__encoderEntries.clear()
+            kind = _getValueKind(value)
+            componentType = None
+            if kind == choiceKind:
+                tagOctets = ''
+            elif kind == sequenceKind or kind == sequenceOfKind:
+                tagOctets = chr(_getTagOctet(tagSet) | tag.tagFormatConstructed)
+                componentType = value.getComponentType()
+            else:
+                tagOctets = chr(_getTagOctet(tagSet))
+            # tagSet reference keeps its id unique
+            entry = self.__encoderEntries[key] = (
+                kind, tagOctets, tagSet, componentType
+                )
+        return entry
+
+    def __encodeValue(self, value):
+        kind, tagOctets, tagSet, componentType = self.__getEncoderEntry(
+            value
+            )
+        if kind == integerKind:
+            substrate = _encodeInteger(long(value))
+        elif kind == octetStringKind:
+            substrate = str(value)
+        elif kind == objectIdentifierKind:
+            substrate = _encodeObjectIdentifier(tuple(value))
+        elif kind == nullKind:
+            substrate = ''
+        elif kind == choiceKind:
+            return self.__encodeValue(value.getComponent())
+        else:
+            if value.getComponentType() is not componentType:
+                raise error.ProtocolError('Component type mismatch')
+            value.verifySizeSpec()
+            chunks = []
+            if kind == sequenceKind:
+                if len(value) != len(componentType):
+                    raise error.ProtocolError('Missing components')
+                for component in value:
+                    if component is None:
+                        raise error.ProtocolError('Missing component')
+                    chunks.append(self.__encodeValue(component))
+            else:
+                for component in value:
+                    if component is not None:
+                        chunks.append(self.__encodeValue(component))
+            substrate = string.join(chunks, '')
+        return tagOctets + _encodeLength(len(substrate)) + substrate
+
+    def encode(self, value):
+        try:
+            return self.__encodeValue(value)
+        except StandardError:
+            return encoder.encode(value)
+
+    # Decoder
+
+    def __getDecoderPlan(self, asn1Spec):
+        if not isinstance(asn1Spec, univ.Choice) and \
+           not isinstance(asn1Spec, univ.SequenceAndSetBase) and \
+           not isinstance(asn1Spec, univ.SetOf):
+            return  # generic decoder is good enough for simple values
+        key = asn1Spec.__class__
+        entry = self.__decoderPlans.get(key)
+        if entry is None or entry[0] is not asn1Spec.getTagSet() or \
+           entry[1] is not asn1Spec.getComponentType():
+            try:
+                plan = _compileDecoderPlan(
+                    asn1Spec, self.__lazySequenceOf
+                    )
+            except error.ProtocolError:
+                plan = None
+            entry = asn1Spec.getTagSet(), asn1Spec.getComponentType(), plan
+            if not self.__decoderPlans.has_key(key):
+                self.__decoderPlans[key] = entry
+        return entry[2]
+
+    def decode(self, substrate, asn1Spec=None):
+        if asn1Spec is None:
+            return decoder.decode(substrate)
+        plan = self.__getDecoderPlan(asn1Spec)
+        if plan is not None:
+            try:
+                value, offset = _decodeValue(
+                    plan, substrate, 0, len(substrate)
+                    )
+            except StandardError:
+                pass
+            else:
+                return value, substrate[offset:]
+        return decoder.decode(substrate, asn1Spec=asn1Spec)
+
+    def decodeComponents(self, value):
+        """Decode lazily decoded components of value, if any"""
+        if isinstance(value, base.AbstractConstructedAsn1Item):
+            if hasattr(value, '_decodeComponents'):
+                value._decodeComponents()
+            else:
+                for component in value:
+                    if component is not None:
+                        self.decodeComponents(component)
+
+pyasn1Codec = Pyasn1Codec()
+snmpCodec = SnmpCodec()
@@ -0,0 +1,73 @@
+# Compute size of BER-encoded SNMP values without actually encoding them.
+# Figures are the same as produced by pyasn1 BER encoder for SNMP types
+# (all of them having single-octet tags).
+from pyasn1.type import univ
+from pyasn1.codec.ber import encoder
+
+def getLengthSize(length):
+    """Return size of BER length octets for value of given length"""
+    if length < 0x80:
+        return 1
+    size = 1
+    while length:
+        length = length >> 8
+        size = size + 1
+    return size
+
+def getTlvSize(length):
+    """Return size of BER TLV given its value length"""
+    return 1 + getLengthSize(length) + length
+
+def getMaxValueLength(size):
+    """Return length of the longest value fitting BER TLV of given size"""
+    length = size - 1 - getLengthSize(size)
+    # Shorter length octets may leave room for a longer value
+    while getTlvSize(length + 1) <= size:
+        length = length + 1
+    return length
+
+def getIntegerLength(value):
+    """Return length of BER INTEGER value (two's complement, minimal)"""
+    length = 1
+    if value < 0:
+        value = ~value
+    while value > 0x7f:
+        value = value >> 8
+        length = length + 1
+    return length
+
+def getObjectIdentifierLength(value):
+    """Return length of BER OBJECT IDENTIFIER value"""
+    length = 1  # two leading sub-IDs
+    for subId in value[2:]:
+        length = length + 1
+        while subId > 0x7f:
+            subId = subId >> 7
+            length = length + 1
+    return length
+
+def getValueSize(value):
+    """Return size of BER-encoded pyasn1 simple value"""
+    if isinstance(value, univ.Integer):
+        return getTlvSize(getIntegerLength(long(value)))
+    if isinstance(value, univ.OctetString):  # including Null
+        return getTlvSize(len(value))
+    if isinstance(value, univ.ObjectIdentifier):
+        return getTlvSize(getObjectIdentifierLength(tuple(value)))
+    return len(encoder.encode(value))
+
+def getVarBindSize((name, value)):
+    """Return size of BER-encoded VarBind"""
+    return getTlvSize(
+        getTlvSize(getObjectIdentifierLength(tuple(name))) + \
+        getValueSize(value)
+        )
+
+def getPduSize(requestId, errorStatus, errorIndex, varBindsSize):
+    """Return size of BER-encoded non-bulk PDU given varbinds size"""
+    return getTlvSize(
+        getTlvSize(getIntegerLength(requestId)) + \
+        getTlvSize(getIntegerLength(errorStatus)) + \
+        getTlvSize(getIntegerLength(errorIndex)) + \
+        getTlvSize(varBindsSize)
+        )
@@ -0,0 +1,63 @@
+# SNMP engine statistics. Protocol code increments plain integer
+# attributes of SnmpCounters, MIB scalar instances read them on GET.
+
+# MIB module, counters
+counterNames = (
+    ( 'SNMPv2-MIB',
+      ( 'snmpInPkts', 'snmpOutPkts', 'snmpInBadVersions',
+        'snmpInBadCommunityNames', 'snmpInBadCommunityUses',
+        'snmpInASNParseErrs', 'snmpSilentDrops', 'snmpProxyDrops' ) ),
+    ( 'SNMP-MPD-MIB',
+      ( 'snmpUnknownSecurityModels', 'snmpInvalidMsgs',
+        'snmpUnknownPDUHandlers' ) ),
+    ( 'SNMP-USER-BASED-SM-MIB',
+      ( 'usmStatsUnsupportedSecLevels', 'usmStatsNotInTimeWindows',
+        'usmStatsUnknownUserNames', 'usmStatsUnknownEngineIDs',
+        'usmStatsWrongDigests', 'usmStatsDecryptionErrors' ) ),
+    ( 'SNMP-TARGET-MIB',
+      ( 'snmpUnknownContexts', ) )
+    )
+
+def _counterSyntax(syntax, counters, counterName):
+    # Just like sysUpTime, the value is taken at clone() time (which
+    # is what MibScalarInstance.readGet() does)
+    baseClass = syntax.__class__
+    class CounterSyntax(baseClass):
+        def clone(self, value=None, **kwargs):
+            if value is None and not kwargs:
+                # Counter32 wraps
+                value = getattr(counters, counterName) % 4294967296L
+            return apply(baseClass.clone, (self, value), kwargs)
+    return CounterSyntax(0)
+
+class SnmpCounters:
+    def __init__(self):
+        self.__mibInstances = {}
+        for modName, symNames in counterNames:
+            for symName in symNames:
+                setattr(self, symName, 0L)
+
+    def bindMibInstances(self, mibBuilder):
+        """Make counters MIB instances report these counters"""
+        for modName, symNames in counterNames:
+            mibInstances = apply(
+                mibBuilder.importSymbols, ('__' + modName,) + symNames
+                )
+            for idx in range(len(symNames)):
+                mibInstances[idx].syntax = _counterSyntax(
+                    mibInstances[idx].syntax, self, symNames[idx]
+                    )
+                self.__mibInstances[symNames[idx]] = mibInstances[idx]
+
+    def getVarBind(self, counterName):
+        """Return counter MIB instance (name, value) e.g. for REPORT PDU"""
+        mibInstance = self.__mibInstances[counterName]
+        return mibInstance.name, mibInstance.syntax.clone()
+
+    def getCounters(self):
+        """Return a snapshot of counters as a dictionary"""
+        counters = {}
+        for modName, symNames in counterNames:
+            for symName in symNames:
+                counters[symName] = getattr(self, symName)
+        return counters
@@ -52,7 +52,8 @@ class AbstractMessageProcessingModel:
         snmpEngine,
         transportDomain,
         transportAddress,
-        wholeMsg
+        wholeMsg,
+        msgHeader=None
         ):
         raise error.ProtocolError('method not implemented')
 
@@ -1,13 +1,29 @@
 # SNMP v1 & v2c message processing models implementation
-from pyasn1.codec.ber import decoder
+import struct, weakref
 from pysnmp.proto.mpmod.base import AbstractMessageProcessingModel
 from pysnmp.proto.secmod import rfc2576
-from pysnmp.proto import rfc3411, error
-from pysnmp.proto.api import v1, v2c
+from pysnmp.proto import rfc1157, rfc1905, rfc3411, error
+from pysnmp.proto.api import v1, v2c, verdec
 from pyasn1.type import univ
 from pyasn1.error import PyAsn1Error
 from pysnmp import debug
 
+# Var-bind lists promised not to change (by freezeVarBinds()), by id
+_frozenVarBindLists = weakref.WeakValueDictionary()
+
+# Request-IDs whose minimal BER encoding is exactly four octets
+minTemplateRequestID = 0x800000
+maxTemplateRequestID = 0x7fffffff
+
+def freezeVarBinds(pdu):
+    """Promise not to ever change var-binds of this request PDU (and of
+       the PDUs sharing its VarBindList object) so that v1/v2c messages
+       carrying them are serialized once and then only get request-id
+       patched in (if it falls into min/maxTemplateRequestID range)
+    """
+    varBindList = pdu.getComponentByPosition(3)
+    _frozenVarBindLists[id(varBindList)] = varBindList
+
 # Since I have not found a detailed reference to v1MP/v2cMP
 # inner workings, the following has been patterned from v3MP. Most
 # references here goes to RFC3412.
@@ -15,6 +31,42 @@ from pysnmp import debug
 class SnmpV1MessageProcessingModel(AbstractMessageProcessingModel):
     messageProcessingModelID = 0 # SNMPv1
     _snmpMsgSpec = v1.Message()
+    _snmpPdusSpec = rfc1157.PDUs()
+    def __init__(self):
+        AbstractMessageProcessingModel.__init__(self)
+        self.__msgTemplates = {}
+
+    def __getMsgTemplateKey(self, securityModel, securityName,
+                            contextEngineId, contextName, pdu):
+        if not rfc3411.confirmedClassPDUs.has_key(pdu.tagSet):
+            return
+        if not minTemplateRequestID <= pdu.getComponentByPosition(0) <= \
+           maxTemplateRequestID:
+            return
+        varBindList = pdu.getComponentByPosition(3)
+        if _frozenVarBindLists.get(id(varBindList)) is not varBindList:
+            return
+        return ( securityModel, securityName, contextEngineId, contextName,
+                 pdu.tagSet, long(pdu.getComponentByPosition(1)),
+                 long(pdu.getComponentByPosition(2)), id(varBindList) )
+
+    def __addMsgTemplate(self, msgTemplateKey, communityGeneration,
+                         securityParameters, wholeMsg, varBindList):
+        # Locate request-id value of the four octets wide
+        pduOffset = verdec.scanMessageHeader(wholeMsg)[3]
+        offset = pduOffset + 2
+        if ord(wholeMsg[pduOffset+1]) & 0x80:
+            offset = offset + (ord(wholeMsg[pduOffset+1]) & 0x7f)
+        if wholeMsg[offset:offset+2] != '\x02\x04':
+            return
+        if len(self.__msgTemplates) >= 256:
+            self.__msgTemplates.clear()
+        # var-bind list reference pins its id down
+        self.__msgTemplates[msgTemplateKey] = (
+            communityGeneration, securityParameters, wholeMsg[:offset+2],
+            wholeMsg[offset+6:], varBindList
+            )
+
     # rfc3412: 7.1
     def prepareOutgoingMessage(
         self,
@@ -32,8 +84,7 @@ class SnmpV1MessageProcessingModel(AbstractMessageProcessingModel):
         expectResponse,
         sendPduHandle
         ):
-        snmpEngineID, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
-        snmpEngineID = snmpEngineID.syntax
+        snmpEngineID = snmpEngine.snmpEngineID
         
         # rfc3412: 7.1.1b
         if rfc3411.confirmedClassPDUs.has_key(pdu.tagSet):
@@ -71,21 +122,47 @@ class SnmpV1MessageProcessingModel(AbstractMessageProcessingModel):
 
         # rfc3412: 7.1.9.a & rfc2576: 5.2.1 --> no-op
 
-        snmpEngineMaxMessageSize, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineMaxMessageSize')
-            
-        # rfc3412: 7.1.9.b
-        ( securityParameters,
-          wholeMsg ) = smHandler.generateRequestMsg(
-            snmpEngine,
-            self.messageProcessingModelID,
-            globalData,
-            snmpEngineMaxMessageSize.syntax,
-            securityModel,
-            snmpEngineID,
-            securityName,
-            securityLevel,
-            scopedPDU
+        msgTemplateKey = self.__getMsgTemplateKey(
+            securityModel, securityName, contextEngineId, contextName, pdu
             )
+        msgTemplate = self.__msgTemplates.get(msgTemplateKey)
+        if msgTemplate is not None:
+            # Community got into template might be no longer valid
+            communityGeneration = smHandler.getCommunityGeneration(
+                snmpEngine
+                )
+            if msgTemplate[0] != communityGeneration:
+                msgTemplate = None
+        if msgTemplate is not None:
+            # rfc3412: 7.1.9.b (serialized before, patch request-id in)
+            ( communityGeneration, securityParameters,
+              msgHead, msgTail, varBindList ) = msgTemplate
+            wholeMsg = msgHead + struct.pack('>L', long(msgID)) + msgTail
+            debug.logger & debug.flagMP and debug.logger('prepareOutgoingMessage: message templated by %s' % (msgTemplateKey,))
+        else:
+            snmpEngineMaxMessageSize, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineMaxMessageSize')
+            
+            # rfc3412: 7.1.9.b
+            ( securityParameters,
+              wholeMsg ) = smHandler.generateRequestMsg(
+                snmpEngine,
+                self.messageProcessingModelID,
+                globalData,
+                snmpEngineMaxMessageSize.syntax,
+                securityModel,
+                snmpEngineID,
+                securityName,
+                securityLevel,
+                scopedPDU
+                )
+
+            if msgTemplateKey is not None:
+                self.__addMsgTemplate(
+                    msgTemplateKey,
+                    smHandler.getCommunityGeneration(snmpEngine),
+                    securityParameters, wholeMsg,
+                    pdu.getComponentByPosition(3)
+                    )
 
         # rfc3412: 7.1.9.c
         if rfc3411.confirmedClassPDUs.has_key(pdu.tagSet):
@@ -122,8 +199,7 @@ class SnmpV1MessageProcessingModel(AbstractMessageProcessingModel):
         stateReference,
         statusInformation
         ):
-        snmpEngineID, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
-        snmpEngineID = snmpEngineID.syntax
+        snmpEngineID = snmpEngine.snmpEngineID
 
         # rfc3412: 7.1.2.b
         cachedParams = self._cachePopByStateRef(stateReference)
@@ -206,16 +282,32 @@ class SnmpV1MessageProcessingModel(AbstractMessageProcessingModel):
         snmpEngine,
         transportDomain,
         transportAddress,
-        wholeMsg
+        wholeMsg,
+        msgHeader=None
         ):
         # rfc3412: 7.2.2 
         try:
-            msg, restOfwholeMsg = decoder.decode(
-                wholeMsg, asn1Spec=self._snmpMsgSpec
-                )
+            if msgHeader is None:
+                msg, restOfwholeMsg = snmpEngine.berCodec.decode(
+                    wholeMsg, asn1Spec=self._snmpMsgSpec
+                    )
+            else:
+                # Version & community are already known from the
+                # header scan, decode just the PDU (in place)
+                msgVersion, community, pduTag, pduOffset, msgEnd = msgHeader
+                pdus, restOfwholeMsg = snmpEngine.berCodec.decode(
+                    buffer(wholeMsg, pduOffset, msgEnd - pduOffset),
+                    asn1Spec=self._snmpPdusSpec
+                    )
+                # Message SEQUENCE must end with PDU
+                if restOfwholeMsg:
+                    raise PyAsn1Error('Trailing components in Message')
+                msg = self._snmpMsgSpec.clone()
+                msg.setComponentByPosition(0, msgVersion)
+                msg.setComponentByPosition(1, community)
+                msg.setComponentByPosition(2, pdus)
         except PyAsn1Error:
-            snmpInASNParseErrs, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpInASNParseErrs')
-            snmpInASNParseErrs.syntax = snmpInASNParseErrs.syntax + 1
+            snmpEngine.counters.snmpInASNParseErrs = snmpEngine.counters.snmpInASNParseErrs + 1
             raise error.StatusInformation(
                 errorIndication = 'parseError'
                 )
@@ -335,8 +427,7 @@ class SnmpV1MessageProcessingModel(AbstractMessageProcessingModel):
         # rfc3412: 7.2.13
         if rfc3411.confirmedClassPDUs.has_key(pduType):
             # rfc3412: 7.2.13a
-            snmpEngineID, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
-            if securityEngineID != snmpEngineID.syntax:
+            if securityEngineID != snmpEngine.snmpEngineID:
                 smHandler.releaseStateInformation(securityStateReference)
                 raise error.StatusInformation(
                     errorIndication = 'engineIDMispatch'
@@ -403,3 +494,4 @@ class SnmpV1MessageProcessingModel(AbstractMessageProcessingModel):
 class SnmpV2cMessageProcessingModel(SnmpV1MessageProcessingModel):
     messageProcessingModelID = 1 # SNMPv2c
     _snmpMsgSpec = v2c.Message()
+    _snmpPdusSpec = rfc1905.PDUs()
@@ -3,7 +3,6 @@ from pysnmp.proto.mpmod.base import AbstractMessageProcessingModel
 from pysnmp.proto.secmod import rfc3414
 from pysnmp.proto import rfc1905, rfc3411, error, api
 from pyasn1.type import univ, namedtype, constraint
-from pyasn1.codec.ber import decoder
 from pyasn1.error import PyAsn1Error
 from pysnmp import debug
 
@@ -77,8 +76,7 @@ class SnmpV3MessageProcessingModel(AbstractMessageProcessingModel):
         expectResponse,
         sendPduHandle
         ):
-        snmpEngineID, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
-        snmpEngineID = snmpEngineID.syntax
+        snmpEngineID = snmpEngine.snmpEngineID
 
         # 7.1.1b
         msgID = self._newMsgID()
@@ -247,8 +245,7 @@ class SnmpV3MessageProcessingModel(AbstractMessageProcessingModel):
         stateReference,
         statusInformation
         ):
-        snmpEngineID, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
-        snmpEngineID = snmpEngineID.syntax
+        snmpEngineID = snmpEngine.snmpEngineID
 
         # 7.1.2.b
         cachedParams = self._cachePopByStateRef(stateReference)
@@ -417,16 +414,16 @@ class SnmpV3MessageProcessingModel(AbstractMessageProcessingModel):
         snmpEngine,
         transportDomain,
         transportAddress,
-        wholeMsg
+        wholeMsg,
+        msgHeader=None
         ):
         # 7.2.2
         try:
-            msg, restOfwholeMsg = decoder.decode(
+            msg, restOfwholeMsg = snmpEngine.berCodec.decode(
                 wholeMsg, asn1Spec=self._snmpMsgSpec
                 )
         except PyAsn1Error:
-            snmpInASNParseErrs, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpInASNParseErrs')
-            snmpInASNParseErrs.syntax = snmpInASNParseErrs.syntax + 1
+            snmpEngine.counters.snmpInASNParseErrs = snmpEngine.counters.snmpInASNParseErrs + 1
             raise error.StatusInformation(
                 errorIndication = 'parseError'
                 )
@@ -446,8 +443,7 @@ class SnmpV3MessageProcessingModel(AbstractMessageProcessingModel):
         
         # 7.2.4
         if not snmpEngine.securityModels.has_key(securityModel):
-            snmpUnknownSecurityModels, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpUnknownSecurityModels')
-            snmpUnknownSecurityModels.syntax = snmpUnknownSecurityModels.syntax + 1
+            snmpEngine.counters.snmpUnknownSecurityModels = snmpEngine.counters.snmpUnknownSecurityModels + 1
             raise error.StatusInformation(
                 errorIndication = 'unsupportedSecurityModel'
                 )
@@ -460,8 +456,7 @@ class SnmpV3MessageProcessingModel(AbstractMessageProcessingModel):
         elif (msgFlags & 0x03) == 0x03:
             securityLevel = 3
         else:
-            snmpInvalidMsgs = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpInvalidMsgs')
-            snmpInvalidMsgs.syntax = snmpInvalidMsgs.syntax + 1
+            snmpEngine.counters.snmpInvalidMsgs = snmpEngine.counters.snmpInvalidMsgs + 1
             raise error.StatusInformation(
                 errorIndication = 'invalidMsg'
                 )
@@ -570,8 +565,7 @@ class SnmpV3MessageProcessingModel(AbstractMessageProcessingModel):
                     
                 debug.logger & debug.flagMP and debug.logger('prepareDataElements: cache securityEngineID %s for %s %s' % (securityEngineID, transportDomain, transportAddress))
 
-        snmpEngineID, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
-        snmpEngineID = snmpEngineID.syntax
+        snmpEngineID = snmpEngine.snmpEngineID
 
         # 7.2.7 XXX PDU would be parsed here?
         contextEngineId, contextName, pdu = scopedPDU
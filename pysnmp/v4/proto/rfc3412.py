@@ -1,10 +1,11 @@
 """SNMP v3 Message Processing and Dispatching (RFC3412)"""
-import time
+import time, heapq
 from pysnmp.smi import builder, instrum
 from pysnmp.proto import error
 from pysnmp.proto.api import verdec # XXX
 from pysnmp.error import PySnmpError
 from pysnmp import debug
+from pyasn1.error import PyAsn1Error
 
 class MsgAndPduDispatcher:
     """SNMP engine PDU & message dispatcher. Exchanges SNMP PDU's with
@@ -30,6 +31,18 @@ class MsgAndPduDispatcher:
         self.__sendPduHandle = 0L
         self.__cacheRepository = {}
 
+        # Pending requests indices: heap of [ timeoutAt, sendPduHandle ]
+        # and heap of sendPduHandle's (i.e. in order of sending). Popped
+        # requests are left there till they reach heap top or the heap
+        # gets rebuilt.
+        self.__cacheDeadlines = []
+        self.__cacheDeadlinesStale = 0
+        self.__cacheSendOrder = []
+
+        # Dispatcher timer firing at the earliest request deadline
+        self.__expirationTimer = None
+        self.__expirationTime = None
+
         # To pass transport info to app
         self.__transportInfo = {}
 
@@ -40,7 +53,12 @@ class MsgAndPduDispatcher:
         return sendPduHandle
     
     def __cacheAdd(self, index, **kwargs):
+        kwargs['sentAt'] = time.time()
         self.__cacheRepository[index] = kwargs
+        heapq.heappush(
+            self.__cacheDeadlines, [ kwargs['expectResponse'][1], index ]
+            )
+        heapq.heappush(self.__cacheSendOrder, index)
         return index
 
     def __cachePop(self, index):
@@ -48,8 +66,35 @@ class MsgAndPduDispatcher:
         if cachedParams is None:
             return
         del self.__cacheRepository[index]
+        self.__cacheDeadlinesStale = self.__cacheDeadlinesStale + 1
+        # Rebuild deadlines heap once it is dominated by popped requests
+        if self.__cacheDeadlinesStale > 64 and \
+               self.__cacheDeadlinesStale * 2 > len(self.__cacheDeadlines):
+            self.__cacheDeadlines = filter(
+                lambda x, r=self.__cacheRepository: r.has_key(x[1]),
+                self.__cacheDeadlines
+                )
+            heapq.heapify(self.__cacheDeadlines)
+            self.__cacheDeadlinesStale = 0
+        self.__cacheTrimSendOrder()
         return cachedParams
 
+    def __cacheTrimSendOrder(self):
+        cacheSendOrder = self.__cacheSendOrder
+        while cacheSendOrder and \
+                  not self.__cacheRepository.has_key(cacheSendOrder[0]):
+            heapq.heappop(cacheSendOrder)
+        # Each cached request is there once, the rest are popped ones
+        cacheSendOrderStale = len(cacheSendOrder) - \
+                              len(self.__cacheRepository)
+        # Rebuild send order heap once it is dominated by popped requests
+        if cacheSendOrderStale > 64 and \
+               cacheSendOrderStale * 2 > len(cacheSendOrder):
+            self.__cacheSendOrder = filter(
+                self.__cacheRepository.has_key, cacheSendOrder
+                )
+            heapq.heapify(self.__cacheSendOrder)
+
     def __cacheUpdate(self, index, **kwargs):
         if not self.__cacheRepository.has_key(index):
             raise error.ProtocolError(
@@ -58,10 +103,100 @@ class MsgAndPduDispatcher:
         self.__cacheRepository[index].update(kwargs)
 
     def __cacheExpire(self, snmpEngine, cbFun):
-        for index, cachedParams in self.__cacheRepository.items():
-            if cbFun:
-                if cbFun(snmpEngine, cachedParams):
-                    del self.__cacheRepository[index]                    
+        # Only requests that are due get touched
+        timeNow = time.time()
+        while self.__cacheDeadlines and \
+                  self.__cacheDeadlines[0][0] <= timeNow:
+            timeoutAt, index = heapq.heappop(self.__cacheDeadlines)
+            cachedParams = self.__cacheRepository.get(index)
+            if cachedParams is None:
+                self.__cacheDeadlinesStale = self.__cacheDeadlinesStale - 1
+                continue
+            # Requests held back by outgoing rate limit time out counting
+            # from their actual transmission
+            transmittedAt = cachedParams.get('transmittedAt')
+            if transmittedAt is not None:
+                processResponsePdu, timeoutAt, cbCtx = cachedParams[
+                    'expectResponse'
+                    ]
+                timeoutAt = (transmittedAt[0] or timeNow) + timeoutAt - \
+                            cachedParams['sentAt']
+                if transmittedAt[0] is not None:
+                    del cachedParams['transmittedAt']
+                    cachedParams['sentAt'] = transmittedAt[0]
+                    cachedParams['expectResponse'] = (
+                        processResponsePdu, timeoutAt, cbCtx
+                        )
+                if timeoutAt > timeNow:
+                    heapq.heappush(
+                        self.__cacheDeadlines, [ timeoutAt, index ]
+                        )
+                    continue
+            # Callback may send (and pop) requests
+            del self.__cacheRepository[index]
+            if not cbFun(snmpEngine, cachedParams):
+                self.__cacheRepository[index] = cachedParams
+                heapq.heappush(self.__cacheDeadlines, [ timeoutAt, index ])
+                break
+        self.__cacheTrimSendOrder()
+
+    def getStatistics(self):
+        """Return outstanding requests count and the age of the oldest one"""
+        self.__cacheTrimSendOrder()
+        if self.__cacheSendOrder:
+            oldestRequestAge = time.time() - self.__cacheRepository[
+                self.__cacheSendOrder[0]
+                ]['sentAt']
+        else:
+            oldestRequestAge = 0.0
+        return {
+            'outstandingRequests': len(self.__cacheRepository),
+            'oldestRequestAge': oldestRequestAge
+            }
+
+    # Rather than scanning the cache once a second, expire requests
+    # by a one-shot dispatcher timer armed for the nearest deadline
+    
+    def __scheduleExpiration(self, snmpEngine, timeoutAt):
+        transportDispatcher = snmpEngine.transportDispatcher
+        if transportDispatcher is None:
+            return
+        if self.__expirationTimer is not None:
+            if self.__expirationTime <= timeoutAt:
+                return
+            transportDispatcher.cancelCall(self.__expirationTimer)
+        self.__expirationTime = timeoutAt
+        self.__expirationTimer = transportDispatcher.callLater(
+            timeoutAt - time.time(), self.__expirationTimerCbFun, snmpEngine
+            )
+
+    def __expirationTimerCbFun(self, snmpEngine):
+        # Keep I/O loop free if message processing is offloaded
+        if snmpEngine.executor is None or \
+               not snmpEngine.executor.submit(
+                   self.__expireRequests, snmpEngine
+                   ):
+            self.__expireRequests(snmpEngine)
+
+    def __expireRequests(self, snmpEngine):
+        snmpEngine.lock.acquire()
+        try:
+            # Timer state is shared with workers, so it is only reset
+            # under engine lock
+            self.__expirationTimer = self.__expirationTime = None
+            self.__cacheExpire(snmpEngine, self.__expireRequest)
+            self.__rescheduleExpiration(snmpEngine)
+        finally:
+            snmpEngine.lock.release()
+
+    def __rescheduleExpiration(self, snmpEngine):
+        cacheDeadlines = self.__cacheDeadlines
+        while cacheDeadlines and \
+                  not self.__cacheRepository.has_key(cacheDeadlines[0][1]):
+            heapq.heappop(cacheDeadlines)
+            self.__cacheDeadlinesStale = self.__cacheDeadlinesStale - 1
+        if cacheDeadlines:
+            self.__scheduleExpiration(snmpEngine, cacheDeadlines[0][0])
 
     def getTransportInfo(self, stateReference):
         if self.__transportInfo.has_key(stateReference):
@@ -153,6 +288,7 @@ class MsgAndPduDispatcher:
                 sendPduHandle=sendPduHandle,
                 expectResponse=expectResponse
                 )
+            self.__scheduleExpiration(snmpEngine, expectResponse[1])
 
         debug.logger & debug.flagDsp and debug.logger('sendPdu: new sendPduHandle %s' % sendPduHandle)
 
@@ -184,12 +320,15 @@ class MsgAndPduDispatcher:
         # 4.1.1.6
         if snmpEngine.transportDispatcher is None:
             raise error.PySnmpError('Transport dispatcher not set')
-        snmpEngine.transportDispatcher.sendMessage(
+        transmittedAt = snmpEngine.transportDispatcher.sendMessage(
             outgoingMessage, destTransportDomain, destTransportAddress
             )
         
         # Update cache with orignal req params (used for retrying)
         if expectResponse:
+            if transmittedAt is not None:
+                # Held back by rate limit, see __cacheExpire()
+                self.__cacheUpdate(sendPduHandle, transmittedAt=transmittedAt)
             self.__cacheUpdate(
                 sendPduHandle,
                 transportDomain=transportDomain,
@@ -260,9 +399,7 @@ class MsgAndPduDispatcher:
         snmpEngineMaxMessageSize, = self.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineMaxMessageSize')
         if snmpEngineMaxMessageSize.syntax and \
                len(outgoingMessage) > snmpEngineMaxMessageSize.syntax:
-            snmpSilentDrops, = self.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpSilentDrops')
-            snmpSilentDrops.syntax = snmpSilentDrops.syntax + 1
-            raise error.MessageTooBigError()
+            raise error.StatusInformation(errorIndication='tooBig')
         
         # 4.1.2.4
         snmpEngine.transportDispatcher.sendMessage(
@@ -281,30 +418,25 @@ class MsgAndPduDispatcher:
         ):
         """Message dispatcher -- de-serialize message into PDU"""
         # 4.2.1.1
-        snmpInPkts, = self.mibInstrumController.mibBuilder.importSymbols(
-            '__SNMPv2-MIB', 'snmpInPkts'
-            )
-        snmpInPkts.syntax = snmpInPkts.syntax + 1
+        snmpEngine.counters.snmpInPkts = snmpEngine.counters.snmpInPkts + 1
 
         # 4.2.1.2
         try:
             restOfWholeMsg = '' # XXX fix decoder non-recursive return
-            msgVersion = verdec.decodeMessageVersion(wholeMsg)
+            msgHeader = verdec.scanMessageHeader(wholeMsg)
         except PySnmpError:
-            snmpInAsn1ParseErrs, = self.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpInAsn1ParseErrs')
-            snmpInAsn1ParseErrs.syntax = snmpInAsn1ParseErrs.syntax + 1
+            snmpEngine.counters.snmpInASNParseErrs = snmpEngine.counters.snmpInASNParseErrs + 1
             return ''  # n.b the whole buffer gets dropped
 
-        debug.logger & debug.flagDsp and debug.logger('receiveMessage: msgVersion %s, msg decoded' % msgVersion)
-
-        messageProcessingModel = msgVersion
+        msgVersion = messageProcessingModel = msgHeader[0]
         
+        debug.logger & debug.flagDsp and debug.logger('receiveMessage: msgVersion %s, msg header scanned' % msgVersion)
+
         mpHandler = snmpEngine.messageProcessingSubsystems.get(
-            int(messageProcessingModel)
+            messageProcessingModel
             )
         if mpHandler is None:
-            snmpInBadVersions, = self.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpInBadVersions')
-            snmpInBadVersions.syntax = snmpInBadVersions.syntax + 1
+            snmpEngine.counters.snmpInBadVersions = snmpEngine.counters.snmpInBadVersions + 1
             return restOfWholeMsg
 
         # 4.2.1.3 -- no-op
@@ -327,7 +459,8 @@ class MsgAndPduDispatcher:
                 snmpEngine,
                 transportDomain,
                 transportAddress,
-                wholeMsg
+                wholeMsg,
+                msgHeader
                 )
             debug.logger & debug.flagDsp and debug.logger('receiveMessage: MP succeded')
         except error.StatusInformation, statusInformation:
@@ -342,6 +475,15 @@ class MsgAndPduDispatcher:
                     )
             return restOfWholeMsg
 
+        # Var-binds may have been left undecoded so far to save on
+        # messages dropped by MP/SM, parse them before they reach Apps
+        try:
+            snmpEngine.berCodec.decodeComponents(PDU)
+        except PyAsn1Error:
+            snmpEngine.counters.snmpInASNParseErrs = snmpEngine.counters.snmpInASNParseErrs + 1
+            debug.logger & debug.flagDsp and debug.logger('receiveMessage: var-binds decoding failed')
+            return restOfWholeMsg
+
         debug.logger & debug.flagDsp and debug.logger('receiveMessage: PDU %s' % PDU.prettyPrint())
 
         # 4.2.2
@@ -355,14 +497,16 @@ class MsgAndPduDispatcher:
             # 4.2.2.1.2
             if processPdu is None:
                 # 4.2.2.1.2.a
-                snmpUnknownPDUHandlers, = self.mibInstrumController.mibBuilder.importSymbols('__SNMP-MPD-MIB', 'snmpUnknownPDUHandlers')
-                snmpUnknownPDUHandlers.syntax = snmpUnknownPDUHandlers.syntax+1
+                snmpEngine.counters.snmpUnknownPDUHandlers = snmpEngine.counters.snmpUnknownPDUHandlers + 1
 
                 # 4.2.2.1.2.b
+                oid, val = snmpEngine.counters.getVarBind(
+                    'snmpUnknownPDUHandlers'
+                    )
                 statusInformation = {
                     'errorIndication': 'unknownPDUHandler',
-                    'oid': snmpUnknownPDUHandlers.name,
-                    'val': snmpUnknownPDUHandlers.syntax
+                    'oid': oid,
+                    'val': val
                     }                    
 
                 debug.logger & debug.flagDsp and debug.logger('receiveMessage: unhandled PDU type')
@@ -436,8 +580,7 @@ class MsgAndPduDispatcher:
 
             # 4.2.2.2.2
             if cachedParams is None:
-                snmpUnknownPDUHandlers, = self.mibInstrumController.mibBuilder.importSymbols('__SNMP-MPD-MIB', 'snmpUnknownPDUHandlers')
-                snmpUnknownPDUHandlers.syntax = snmpUnknownPDUHandlers.syntax+1
+                snmpEngine.counters.snmpUnknownPDUHandlers = snmpEngine.counters.snmpUnknownPDUHandlers + 1
                 return restOfWholeMsg
 
             debug.logger & debug.flagDsp and debug.logger('receiveMessage: cache read by sendPduHandle %s' % sendPduHandle)
@@ -510,4 +653,7 @@ class MsgAndPduDispatcher:
         return 1
         
     def receiveTimerTick(self, snmpEngine, timeNow):
-        self.__cacheExpire(snmpEngine, self.__expireRequest)
+        # Requests are normally expired by the expiration timer, this
+        # only picks up ones cached while no dispatcher was around
+        if self.__cacheRepository and self.__expirationTimer is None:
+            self.__rescheduleExpiration(snmpEngine)
@@ -1,8 +1,7 @@
 # SNMP v1 & v2c security models implementation
-from pyasn1.codec.ber import encoder
 from pysnmp.proto.secmod import base
 from pysnmp.smi.error import NoSuchInstanceError
-from pysnmp.proto import error
+from pysnmp.proto import error, bersize
 from pysnmp import debug
 
 class SnmpV1SecurityModel(base.AbstractSecurityModel):
@@ -13,6 +12,80 @@ class SnmpV1SecurityModel(base.AbstractSecurityModel):
     # the reason for this de-coupling, I've moved this code from MP-scope
     # in here.
 
+    def __init__(self):
+        base.AbstractSecurityModel.__init__(self)
+        self.__communityEntry = self.__communityGeneration = None
+        self.__indexGeneration = 0
+        # communityName -> (communityName, securityName, contextEngineId,
+        #                   contextName, transportTag)
+        self.__communityIndex = {}
+        # (securityName, contextEngineId, contextName) -> communityName
+        self.__securityIndex = {}
+
+    def __getCommunityIndices(self, snmpEngine):
+        snmpCommunityEntry, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('SNMP-COMMUNITY-MIB', 'snmpCommunityEntry')
+        if snmpCommunityEntry is not self.__communityEntry or \
+           snmpCommunityEntry.getGeneration() != self.__communityGeneration:
+            self.__buildCommunityIndices(snmpEngine)
+            self.__communityEntry = snmpCommunityEntry
+            self.__communityGeneration = snmpCommunityEntry.getGeneration()
+        return self.__communityIndex, self.__securityIndex
+
+    def __buildCommunityIndices(self, snmpEngine):
+        ( snmpCommunityName,
+          snmpCommunitySecurityName,
+          snmpCommunityContextEngineId,
+          snmpCommunityContextName,
+          snmpCommunityTransportTag
+          ) = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols(
+            'SNMP-COMMUNITY-MIB',
+            'snmpCommunityName',
+            'snmpCommunitySecurityName',
+            'snmpCommunityContextEngineID',
+            'snmpCommunityContextName',
+            'snmpCommunityTransportTag'
+            )
+        communityIndex = {}
+        securityIndex = {}
+        mibNodeIdx = snmpCommunityName
+        while 1:
+            try:
+                mibNodeIdx = snmpCommunityName.getNextNode(
+                    mibNodeIdx.name
+                    )
+            except NoSuchInstanceError:
+                break
+            instId = mibNodeIdx.name[len(snmpCommunityName.name):]
+            communityInfo = ( mibNodeIdx.syntax, ) + tuple(
+                map(lambda x, instId=instId: x.getNode(x.name + instId).syntax,
+                    ( snmpCommunitySecurityName,
+                      snmpCommunityContextEngineId,
+                      snmpCommunityContextName,
+                      snmpCommunityTransportTag ))
+                )
+            # Rows are walked in index order, first one wins
+            communityName, securityName, contextEngineId, contextName = \
+                           map(str, communityInfo[:4])
+            if not communityIndex.has_key(communityName):
+                communityIndex[communityName] = communityInfo
+            k = securityName, contextEngineId, contextName
+            if not securityIndex.has_key(k):
+                securityIndex[k] = communityInfo[0]
+
+        debug.logger & debug.flagSM and debug.logger('__buildCommunityIndices: indexed %d community entries' % len(communityIndex))
+
+        self.__communityIndex = communityIndex
+        self.__securityIndex = securityIndex
+        self.__indexGeneration = self.__indexGeneration + 1
+
+    def getCommunityGeneration(self, snmpEngine):
+        """Return a value changing whenever community to security/context
+           mapping might have changed so that anything derived from it
+           (such as pre-serialized messages) could be dropped
+        """
+        self.__getCommunityIndices(snmpEngine)
+        return self.__indexGeneration
+
     def generateRequestMsg(
         self,
         snmpEngine,
@@ -29,54 +102,25 @@ class SnmpV1SecurityModel(base.AbstractSecurityModel):
         contextEngineId, contextName, pdu = scopedPDU
         
         # rfc2576: 5.2.3
-        ( snmpCommunityName,
-          snmpCommunitySecurityName, 
-          snmpCommunityContextEngineId, 
-          snmpCommunityContextName ) = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols(
-            'SNMP-COMMUNITY-MIB',
-            'snmpCommunityName',
-            'snmpCommunitySecurityName',
-            'snmpCommunityContextEngineID',
-            'snmpCommunityContextName'
+        communityIndex, securityIndex = self.__getCommunityIndices(
+            snmpEngine
             )
-        mibNodeIdx = snmpCommunitySecurityName
-        while 1:
-            try:
-                mibNodeIdx = snmpCommunitySecurityName.getNextNode(
-                    mibNodeIdx.name
-                    )
-            except NoSuchInstanceError:
-                break
-            if mibNodeIdx.syntax != securityName:
-                continue
-            instId = mibNodeIdx.name[len(snmpCommunitySecurityName.name):]
-            mibNode = snmpCommunityContextEngineId.getNode(
-                snmpCommunityContextEngineId.name + instId
-                )
-            if mibNode.syntax != contextEngineId:
-                continue
-            mibNode = snmpCommunityContextName.getNode(
-                snmpCommunityContextName.name + instId
-                )
-            if mibNode.syntax != contextName:
-                continue
-            # XXX TODO: snmpCommunityTransportTag
-            mibNode = snmpCommunityName.getNode(
-                snmpCommunityName.name + instId
-                )
-            securityParameters = mibNode.syntax
-            
-            debug.logger & debug.flagSM and debug.logger('generateRequestMsg: found community %s for securityName %s contextEngineId %s contextName %s' % (securityParameters, securityName, contextEngineId, contextName))
-            
-            msg.setComponentByPosition(1, securityParameters)
-            msg.setComponentByPosition(2)
-            msg.getComponentByPosition(2).setComponentByType(pdu.tagSet, pdu)
-            wholeMsg = encoder.encode(msg)
-            return ( securityParameters, wholeMsg )
-
-        raise error.StatusInformation(
-            errorIndication = 'unknownCommunityName'
+        # XXX TODO: snmpCommunityTransportTag
+        securityParameters = securityIndex.get(
+            (str(securityName), str(contextEngineId), str(contextName))
             )
+        if securityParameters is None:
+            raise error.StatusInformation(
+                errorIndication = 'unknownCommunityName'
+                )
+
+        debug.logger & debug.flagSM and debug.logger('generateRequestMsg: found community %s for securityName %s contextEngineId %s contextName %s' % (securityParameters, securityName, contextEngineId, contextName))
+
+        msg.setComponentByPosition(1, securityParameters)
+        msg.setComponentByPosition(2)
+        msg.getComponentByPosition(2).setComponentByType(pdu.tagSet, pdu)
+        wholeMsg = snmpEngine.berCodec.encode(msg)
+        return ( securityParameters, wholeMsg )
 
     def generateResponseMsg(
         self,
@@ -103,7 +147,7 @@ class SnmpV1SecurityModel(base.AbstractSecurityModel):
         msg.setComponentByPosition(2)
         msg.getComponentByPosition(2).setComponentByType(pdu.tagSet, pdu)
         
-        wholeMsg = encoder.encode(msg)
+        wholeMsg = snmpEngine.berCodec.encode(msg)
         return ( communityName, wholeMsg )
 
     def processIncomingMsg(
@@ -119,61 +163,42 @@ class SnmpV1SecurityModel(base.AbstractSecurityModel):
         ):
         # rfc2576: 5.2.1
         ( communityName, srcTransport, destTransport ) = securityParameters
-        ( snmpCommunityName,
-          snmpCommunitySecurityName,
-          snmpCommunityContextEngineId,
-          snmpCommunityContextName
-          ) = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols(
-            'SNMP-COMMUNITY-MIB',
-            'snmpCommunityName',
-            'snmpCommunitySecurityName',
-            'snmpCommunityContextEngineID',
-            'snmpCommunityContextName'
+        communityIndex, securityIndex = self.__getCommunityIndices(
+            snmpEngine
             )
-        mibNodeIdx = snmpCommunityName
-        while 1:
-            try:
-                mibNodeIdx = snmpCommunityName.getNextNode(
-                    mibNodeIdx.name
-                    )
-            except NoSuchInstanceError:
-                snmpInBadCommunityNames, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpInBadCommunityNames')
-                snmpInBadCommunityNames.syntax = snmpInBadCommunityNames.syntax+1
-                raise error.StatusInformation(
-                    errorIndication = 'unknownCommunityName'
-                    )
-            if mibNodeIdx.syntax == communityName:
-                break
-        
+        communityInfo = communityIndex.get(str(communityName))
+        if communityInfo is None:
+            snmpEngine.counters.snmpInBadCommunityNames = snmpEngine.counters.snmpInBadCommunityNames + 1
+            raise error.StatusInformation(
+                errorIndication = 'unknownCommunityName'
+                )
+
         # XXX TODO: snmpCommunityTransportTag 
-        instId = mibNodeIdx.name[len(snmpCommunityName.name):]
-        communityName = snmpCommunityName.getNode(
-            snmpCommunityName.name + instId
-            )
-        securityName = snmpCommunitySecurityName.getNode(
-            snmpCommunitySecurityName.name + instId
-            )
-        contextEngineId = snmpCommunityContextEngineId.getNode(
-            snmpCommunityContextEngineId.name + instId
-            )
-        contextName = snmpCommunityContextName.getNode(
-            snmpCommunityContextName.name + instId
-            )
-        snmpEngineID, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')
+        ( communityName,
+          securityName,
+          contextEngineId,
+          contextName,
+          transportTag ) = communityInfo
 
         debug.logger & debug.flagSM and debug.logger('processIncomingMsg: looked up securityName %s contextEngineId %s contextName %s by communityName %s' % (securityName, contextEngineId, contextName, communityName))
 
         stateReference = self._cachePush(
-            communityName=communityName.syntax
+            communityName=communityName
             )
         
-        securityEngineID = snmpEngineID.syntax
-        securityName = securityName.syntax
+        securityEngineID = snmpEngine.snmpEngineID
         scopedPDU = (
-            contextEngineId.syntax, contextName.syntax,
+            contextEngineId, contextName,
             msg.getComponentByPosition(2).getComponent()
             )
-        maxSizeResponseScopedPDU = maxMessageSize - 128
+        # Response PDU is wrapped into version and community
+        maxSizeResponseScopedPDU = bersize.getMaxValueLength(
+            int(maxMessageSize)
+            ) - bersize.getTlvSize(
+            bersize.getIntegerLength(long(messageProcessingModel))
+            ) - bersize.getTlvSize(len(communityName))
+        if maxSizeResponseScopedPDU < 0:
+            maxSizeResponseScopedPDU = 0
         securityStateReference = stateReference
 
         debug.logger & debug.flagSM and debug.logger('processIncomingMsg: generated maxSizeResponseScopedPDU %s securityStateReference %s' % (maxSizeResponseScopedPDU, securityStateReference))
@@ -1,11 +1,101 @@
+import string
 from pysnmp.proto import error
 
 class AbstractAuthenticationService:
     serviceID = None
+    # Size of message digest (msgAuthenticationParameters)
+    digestLength = 0
     # 7.2.4.1
-    def authenticateOutgoingMsg(self, authKey, wholeMsg):
+    def authenticateOutgoingMsg(self, authKey, wholeMsg, authParametersOffset):
         raise error.ProtocolError('no authentication')
 
     # 7.2.4.2
-    def authenticateIncomingMsg(self, authKey, authParameters, wholeMsg):
+    def authenticateIncomingMsg(
+        self, authKey, authParameters, wholeMsg, authParametersOffset
+        ):
         raise error.ProtocolError('no authentication')
+
+    # rfc3414: A.2 -- passphrase to key and key localization
+    def hashPassphrase(self, passphrase):
+        raise error.ProtocolError('no authentication')
+
+    def localizeKey(self, passKey, snmpEngineID):
+        raise error.ProtocolError('no authentication')
+
+# XOR translation tables for HMAC key padding (rfc2104)
+_ipadTable = string.join(map(lambda x: chr(x ^ 0x36), range(256)), '')
+_opadTable = string.join(map(lambda x: chr(x ^ 0x5C), range(256)), '')
+
+class AbstractHmacAuthenticationService(AbstractAuthenticationService):
+    """HMAC (rfc2104) based authentication. Hash objects pre-fed with
+       key-derived ipad/opad blocks are kept per authentication key and
+       copied for each message to be authenticated.
+    """
+    # Hash object constructor, its block size and digest truncation
+    hashFun = None
+    blockSize = 64
+    digestLength = 12
+    # Number of keys whose hash states are kept
+    maxKeyStates = 1024
+
+    def __init__(self):
+        self.__keyStates = {}
+
+    def __getKeyStates(self, authKey):
+        authKey = str(authKey)
+        keyStates = self.__keyStates.get(authKey)
+        if keyStates is None:
+            if self.hashFun is None:
+                raise error.StatusInformation(
+                    errorIndication='authenticationError'
+                    )
+            # rfc3414 6.3.1.2 & 7.3.1.2, rfc7860 4.2.1
+            extendedAuthKey = authKey + '\x00' * (self.blockSize-len(authKey))
+            k1 = self.hashFun()
+            k1.update(string.translate(extendedAuthKey, _ipadTable))
+            k2 = self.hashFun()
+            k2.update(string.translate(extendedAuthKey, _opadTable))
+            if len(self.__keyStates) >= self.maxKeyStates:
+                self.__keyStates.clear()
+            keyStates = self.__keyStates[authKey] = k1, k2
+        return keyStates
+
+    def __getDigest(self, authKey, *chunks):
+        k1, k2 = self.__getKeyStates(authKey)
+        d1 = k1.copy()
+        for chunk in chunks:
+            d1.update(chunk)
+        d2 = k2.copy()
+        d2.update(d1.digest())
+        return d2.digest()[:self.digestLength]
+
+    def authenticateOutgoingMsg(self, authKey, wholeMsg, authParametersOffset):
+        # Calling secmod indicates where the digest should be in the
+        # substrate. Also, it pre-sets digest placeholder there so we
+        # hash wholeMsg out of the box.
+        # Yes, that's ugly but that's rfc...
+        end = authParametersOffset + self.digestLength
+        if wholeMsg[authParametersOffset:end] != '\x00' * self.digestLength:
+            raise error.ProtocolError('Cant locate digest placeholder')
+        return wholeMsg[:authParametersOffset] + \
+               self.__getDigest(authKey, wholeMsg) + wholeMsg[end:]
+
+    def authenticateIncomingMsg(
+        self, authKey, authParameters, wholeMsg, authParametersOffset
+        ):
+        if len(authParameters) != self.digestLength:
+            raise error.StatusInformation(
+                errorIndication='authenticationError'
+                )
+        authParameters = str(authParameters)
+        end = authParametersOffset + self.digestLength
+        if wholeMsg[authParametersOffset:end] != authParameters:
+            raise error.ProtocolError('Cant locate digest in wholeMsg')
+        # Hash wholeMsg with digest zeroed out without copying it over
+        if self.__getDigest(
+            authKey, buffer(wholeMsg, 0, authParametersOffset),
+            '\x00' * self.digestLength, buffer(wholeMsg, end)
+            ) != authParameters:
+            raise error.StatusInformation(
+                errorIndication='authenticationFailure'
+                )
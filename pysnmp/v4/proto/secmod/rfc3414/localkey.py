@@ -1,9 +1,33 @@
 # Convert plaintext passphrase into a localized key
-import md5, sha
+import os, md5, sha, random, string
+from pysnmp import cache
 
-# RFC3414: A.2.1
-def hashPassphraseMD5(passphrase):
-    md = md5.new()
+# Process-wide caches of passphrase hashes (Ku) keyed by salted passphrase
+# fingerprint and of localized keys (Kul) keyed by Ku and snmpEngineID.
+# Their sizes may be changed through setMaxSize() method.
+passKeyCache = cache.LruCache(8192)
+localKeyCache = cache.LruCache(16384)
+
+try:
+    _fingerprintSalt = os.urandom(16)
+except (AttributeError, NotImplementedError):
+    # No os.urandom() before Python 2.4 or no randomness source
+    _fingerprintSalt = string.join(
+        map(lambda x: chr(random.randrange(256)), range(16)), ''
+        )
+
+# RFC3414: A.2.1 & A.2.2, RFC7860: 9.3 -- hash function agnostic
+def hashPassphrase(passphrase, hashFun):
+    passphrase = str(passphrase)
+    key = hashFun, sha.new(_fingerprintSalt + passphrase).digest()
+    passKey = passKeyCache.get(key)
+    if passKey is None:
+        passKey = _hashPassphrase(passphrase, hashFun)
+        passKeyCache.put(key, passKey)
+    return passKey
+
+def _hashPassphrase(passphrase, hashFun):
+    md = hashFun()
     ringBuffer = passphrase * (64/len(passphrase)+1)
     ringBufferLen = len(ringBuffer)
     count = 0
@@ -21,34 +45,34 @@ def hashPassphraseMD5(passphrase):
         count = count + 1
     return md.digest()
 
+def localizeKey(passKey, snmpEngineId, hashFun):
+    passKey = str(passKey)
+    snmpEngineId = str(snmpEngineId)
+    key = hashFun, passKey, snmpEngineId
+    localKey = localKeyCache.get(key)
+    if localKey is None:
+        localKey = hashFun(
+            '%s%s%s' % (passKey, snmpEngineId, passKey)
+            ).digest()
+        localKeyCache.put(key, localKey)
+    return localKey
+
+# RFC3414: A.2.1
+def hashPassphraseMD5(passphrase):
+    return hashPassphrase(passphrase, md5.new)
+
 def localizeKeyMD5(passKey, snmpEngineId):
-    return md5.new('%s%s%s' % (passKey, str(snmpEngineId), passKey)).digest()
+    return localizeKey(passKey, snmpEngineId, md5.new)
 
 def passwordToKeyMD5(passphrase, snmpEngineId):
     return localizeKeyMD5(hashPassphraseMD5(passphrase), snmpEngineId)
 
 # RFC3414: A.2.2
 def hashPassphraseSHA(passphrase):
-    md = sha.new()
-    ringBuffer = passphrase * (64/len(passphrase)+1)
-    ringBufferLen = len(ringBuffer)
-    count = 0
-    mark = 0
-    while count < 16384:
-        e = mark + 64
-        if e < ringBufferLen:
-            md.update(ringBuffer[mark:e])
-            mark = e
-        else:
-            md.update(
-                ringBuffer[mark:ringBufferLen] + ringBuffer[0:e-ringBufferLen]
-                )
-            mark = e-ringBufferLen
-        count = count + 1
-    return md.digest()
+    return hashPassphrase(passphrase, sha.new)
 
 def localizeKeySHA(passKey, snmpEngineId):
-    return sha.new('%s%s%s' % (passKey, str(snmpEngineId), passKey)).digest()
+    return localizeKey(passKey, snmpEngineId, sha.new)
 
 def passwordToKeySHA(passphrase, snmpEngineId):
     return localizeKeySHA(hashPassphraseSHA(passphrase), snmpEngineId)
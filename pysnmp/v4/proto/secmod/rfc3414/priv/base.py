@@ -2,6 +2,8 @@ from pysnmp.proto import error
 
 class AbstractEncryptionService:
     serviceID = None
+    # Ciphertext may get longer than plaintext by up to this many octets
+    paddingLength = 0
     def encryptData(self, mibInstrumController, encryptKey,
                     dataToEncrypt):
         raise error.ProtocolError('no encryption')
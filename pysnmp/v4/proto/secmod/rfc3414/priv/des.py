@@ -14,6 +14,7 @@ random.seed()
 
 class Des(base.AbstractEncryptionService):
     serviceID = (1, 3, 6, 1, 6, 3, 10, 1, 2, 2) # usmDESPrivProtocol
+    paddingLength = 8
     _localInt = long(random.random()*0xffffffffL)
     # 8.1.1.1
     def __getEncryptionKey(self, privKey, snmpEngineBoots):
@@ -3,11 +3,10 @@ from pysnmp.proto.secmod.base import AbstractSecurityModel
 from pysnmp.proto.secmod.rfc3414.auth import hmacmd5, hmacsha, noauth
 from pysnmp.proto.secmod.rfc3414.priv import des, nopriv
 from pysnmp.proto.secmod.rfc3826.priv import aes
-from pysnmp.proto.secmod.rfc3414 import localkey
+from pysnmp.proto.secmod.rfc7860.auth import hmacsha2
 from pysnmp.smi.error import NoSuchInstanceError
-from pysnmp.proto import rfc1155, error
+from pysnmp.proto import rfc1155, error, bersize
 from pyasn1.type import univ, namedtype, constraint
-from pyasn1.codec.ber import encoder, decoder
 from pyasn1.error import PyAsn1Error
 from pysnmp import debug
 import time
@@ -29,8 +28,11 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
     authServices = {
         hmacmd5.HmacMd5.serviceID: hmacmd5.HmacMd5(),
         hmacsha.HmacSha.serviceID: hmacsha.HmacSha(),
+        hmacsha2.HmacSha224.serviceID: hmacsha2.HmacSha224(),
+        hmacsha2.HmacSha256.serviceID: hmacsha2.HmacSha256(),
+        hmacsha2.HmacSha384.serviceID: hmacsha2.HmacSha384(),
+        hmacsha2.HmacSha512.serviceID: hmacsha2.HmacSha512(),
         noauth.NoAuth.serviceID: noauth.NoAuth()
-        
         }
     privServices = {
         des.Des.serviceID: des.Des(),
@@ -38,11 +40,18 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         nopriv.NoPriv.serviceID: nopriv.NoPriv()
         }
     _securityParametersSpec = UsmSecurityParameters()
+    # Message.msgSecurityParameters -> UsmSecurityParameters ->
+    # msgAuthenticationParameters components positions
+    _authParametersPath = (2, 0, 4)
     def __init__(self):
         AbstractSecurityModel.__init__(self)
         self.__timeline = {}
         self.__timelineExpQueue = {}
         self.__expirationTimer = 0L
+        # (securityEngineID, userName) -> user info, see __getUserInfo()
+        self.__userInfoCache = {}
+        self.__usmUserEntry = self.__pysnmpUsmKeyEntry = None
+        self.__usmGeneration = None
 
     def __getUserInfo(
         self, mibInstrumController, securityEngineID, securityName
@@ -50,6 +59,26 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         usmUserEntry, = mibInstrumController.mibBuilder.importSymbols(
             'SNMP-USER-BASED-SM-MIB', 'usmUserEntry'
             )
+        pysnmpUsmKeyEntry, = mibInstrumController.mibBuilder.importSymbols(
+            'PYSNMP-USM-MIB', 'pysnmpUsmKeyEntry'
+            )
+        # Drop cached user info on USM tables modification
+        generation = usmUserEntry.getGeneration(), \
+                     pysnmpUsmKeyEntry.getGeneration()
+        if usmUserEntry is not self.__usmUserEntry or \
+           pysnmpUsmKeyEntry is not self.__pysnmpUsmKeyEntry or \
+           generation != self.__usmGeneration:
+            self.__userInfoCache.clear()
+            self.__usmUserEntry = usmUserEntry
+            self.__pysnmpUsmKeyEntry = pysnmpUsmKeyEntry
+            self.__usmGeneration = generation
+            debug.logger & debug.flagSM and debug.logger('__getUserInfo: user info cache flushed')
+
+        k = str(securityEngineID), str(securityName)
+        userInfo = self.__userInfoCache.get(k)
+        if userInfo is not None:
+            return userInfo
+
         tblIdx = usmUserEntry.getInstIdFromIndices(
             securityEngineID, securityName
             )
@@ -64,22 +93,22 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
             usmUserEntry.name + (8,) + tblIdx
             ).syntax
         # Get keys
-        pysnmpUsmKeyEntry, = mibInstrumController.mibBuilder.importSymbols(
-            'PYSNMP-USM-MIB', 'pysnmpUsmKeyEntry'
-            )
         pysnmpUsmKeyAuthLocalized = pysnmpUsmKeyEntry.getNode(
             pysnmpUsmKeyEntry.name + (1,) + tblIdx
             ).syntax
         pysnmpUsmKeyPrivLocalized = pysnmpUsmKeyEntry.getNode(
             pysnmpUsmKeyEntry.name + (2,) + tblIdx
             ).syntax
-        return (
+        userInfo = self.__userInfoCache[k] = (
             usmUserSecurityName,  # XXX function needed?
             usmUserAuthProtocol,
             pysnmpUsmKeyAuthLocalized,
             usmUserPrivProtocol,
-            pysnmpUsmKeyPrivLocalized
+            pysnmpUsmKeyPrivLocalized,
+            self.authServices.get(usmUserAuthProtocol),
+            self.privServices.get(usmUserPrivProtocol)
             )
+        return userInfo
 
     def __cloneUserInfo(
         self, mibInstrumController, securityEngineID, securityName
@@ -142,19 +171,16 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         pysnmpUsmKeyAuthLocalized = pysnmpUsmKeyEntry.getNode(
             pysnmpUsmKeyEntry.name + (1,) + tblIdx
             )
-        if usmUserAuthProtocol.syntax == hmacsha.HmacSha.serviceID:
-            localAuthKey = localkey.localizeKeySHA(
-                pysnmpUsmKeyAuth.syntax, securityEngineID
-                )
-        elif usmUserAuthProtocol.syntax == hmacmd5.HmacMd5.serviceID:
-            localAuthKey = localkey.localizeKeyMD5(
-                pysnmpUsmKeyAuth.syntax, securityEngineID
+        authHandler = self.authServices.get(usmUserAuthProtocol.syntax)
+        if authHandler is None:
+            raise error.StatusInformation(
+                errorIndication = 'unsupportedAuthProtocol'
                 )
-        elif usmUserAuthProtocol.syntax == noauth.NoAuth.serviceID:
+        if usmUserAuthProtocol.syntax == noauth.NoAuth.serviceID:
             localAuthKey = None
         else:
-            raise error.StatusInformation(
-                errorIndication = 'unsupportedAuthProtocol'
+            localAuthKey = authHandler.localizeKey(
+                pysnmpUsmKeyAuth.syntax, securityEngineID
                 )
         if localAuthKey is not None:
             pysnmpUsmKeyAuthLocalized.syntax = pysnmpUsmKeyAuthLocalized.syntax.clone(localAuthKey)
@@ -163,14 +189,14 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
             )
         if usmUserPrivProtocol.syntax == des.Des.serviceID or \
            usmUserPrivProtocol.syntax == aes.Aes.serviceID:
-            if usmUserAuthProtocol.syntax == hmacsha.HmacSha.serviceID:
-                localPrivKey = localkey.localizeKeySHA(
-                    pysnmpUsmKeyPriv.syntax, securityEngineID
-                    )
-            else:
-                localPrivKey = localkey.localizeKeyMD5(
-                    pysnmpUsmKeyPriv.syntax, securityEngineID
+            # Privacy keys are localized with auth protocol hash
+            if usmUserAuthProtocol.syntax == noauth.NoAuth.serviceID:
+                raise error.StatusInformation(
+                    errorIndication = 'unsupportedPrivProtocol'
                     )
+            localPrivKey = authHandler.localizeKey(
+                pysnmpUsmKeyPriv.syntax, securityEngineID
+                )
         elif usmUserPrivProtocol.syntax == nopriv.NoPriv.serviceID:
             localPrivKey = None
         else:
@@ -179,12 +205,8 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                 )
         if localPrivKey is not None:
             pysnmpUsmKeyPrivLocalized.syntax = pysnmpUsmKeyPrivLocalized.syntax.clone(localPrivKey)
-        return (
-            usmUserSecurityName.syntax,  # XXX function needed?
-            usmUserAuthProtocol.syntax,
-            pysnmpUsmKeyAuthLocalized.syntax,
-            usmUserPrivProtocol.syntax,
-            pysnmpUsmKeyPrivLocalized.syntax
+        return self.__getUserInfo(
+            mibInstrumController, securityEngineID, securityName
             )
               
     def __generateRequestOrResponseMsg(
@@ -200,7 +222,7 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         scopedPDU,
         securityStateReference
         ):
-        snmpEngineID = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')[0].syntax
+        snmpEngineID = snmpEngine.snmpEngineID
         # 3.1.1
         if securityStateReference is not None:
             # 3.1.1a
@@ -214,6 +236,8 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
             usmUserPrivKeyLocalized = cachedSecurityData.get(
                 'usmUserPrivKeyLocalized'
                 )
+            authHandler = self.authServices.get(usmUserAuthProtocol)
+            privHandler = self.privServices.get(usmUserPrivProtocol)
             securityEngineID = snmpEngineID
             debug.logger & debug.flagSM and debug.logger('__generateRequestOrResponseMsg: user info read from cache')
         elif securityName:
@@ -223,7 +247,9 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                   usmUserAuthProtocol,
                   usmUserAuthKeyLocalized,
                   usmUserPrivProtocol,
-                  usmUserPrivKeyLocalized ) = self.__getUserInfo(
+                  usmUserPrivKeyLocalized,
+                  authHandler,
+                  privHandler ) = self.__getUserInfo(
                     snmpEngine.msgAndPduDsp.mibInstrumController,
                     securityEngineID, securityName
                     )
@@ -237,7 +263,9 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                           usmUserAuthProtocol,
                           usmUserAuthKeyLocalized,
                           usmUserPrivProtocol,
-                          usmUserPrivKeyLocalized ) = self.__cloneUserInfo(
+                          usmUserPrivKeyLocalized,
+                          authHandler,
+                          privHandler ) = self.__cloneUserInfo(
                             snmpEngine.msgAndPduDsp.mibInstrumController,
                             securityEngineID,
                             securityName
@@ -255,6 +283,7 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
             usmUserName = usmUserSecurityName = ''
             usmUserAuthProtocol = usmUserAuthKeyLocalized = None
             usmUserPrivProtocol = usmUserPrivKeyLocalized = None
+            authHandler = privHandler = None
             debug.logger & debug.flagSM and debug.logger('__generateRequestOrResponseMsg: use empty USM data')
             
         debug.logger & debug.flagSM and debug.logger('__generateRequestOrResponseMsg: local user usmUserName %s usmUserAuthProtocol %s usmUserPrivProtocol %s by securityEngineID %s securityName %s' % (usmUserName, usmUserAuthProtocol, usmUserPrivProtocol, securityEngineID, securityName))
@@ -312,12 +341,11 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
 
         # 3.1.4a
         if securityLevel == 3:
-            privHandler = self.privServices.get(usmUserPrivProtocol)
             if privHandler is None:
                 raise error.StatusInformation(
                     errorIndication = 'encryptionError'
                     )
-            dataToEncrypt = encoder.encode(scopedPDU)
+            dataToEncrypt = snmpEngine.berCodec.encode(scopedPDU)
             
             debug.logger & debug.flagSM and debug.logger('__generateRequestOrResponseMsg: scopedPDU encoded')
 
@@ -352,7 +380,6 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
 
         # 3.1.8a
         if securityLevel == 3 or securityLevel == 2:
-            authHandler = self.authServices.get(usmUserAuthProtocol)
             if authHandler is None:
                 raise error.StatusInformation(
                     errorIndication = 'authenticationFailure'
@@ -360,18 +387,24 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
 
             # extra-wild hack to facilitate BER substrate in-place re-write
             securityParameters.setComponentByPosition(
-                4, '\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                4, '\x00' * authHandler.digestLength
                 )
 
             debug.logger & debug.flagSM and debug.logger('__generateRequestOrResponseMsg: %s' % (securityParameters.prettyPrint(),))
             
-            msg.setComponentByPosition(2, encoder.encode(securityParameters))
+            msg.setComponentByPosition(
+                2, snmpEngine.berCodec.encode(securityParameters)
+                )
 
-            wholeMsg = encoder.encode(msg)
+            wholeMsg = snmpEngine.berCodec.encode(msg)
+
+            authParametersOffset, end = snmpEngine.berCodec.locateValue(
+                wholeMsg, self._authParametersPath
+                )
 
             try:
                 authenticatedWholeMsg = authHandler.authenticateOutgoingMsg(
-                    usmUserAuthKeyLocalized, wholeMsg
+                    usmUserAuthKeyLocalized, wholeMsg, authParametersOffset
                     )
             except error.StatusInformation, statusInformation:
                 raise
@@ -381,8 +414,10 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         else:
             securityParameters.setComponentByPosition(4, '')
             debug.logger & debug.flagSM and debug.logger('__generateRequestOrResponseMsg: %s' % (securityParameters.prettyPrint(),))
-            msg.setComponentByPosition(2, encoder.encode(securityParameters))
-            authenticatedWholeMsg = encoder.encode(msg)
+            msg.setComponentByPosition(
+                2, snmpEngine.berCodec.encode(securityParameters)
+                )
+            authenticatedWholeMsg = snmpEngine.berCodec.encode(msg)
             debug.logger & debug.flagSM and debug.logger('__generateRequestOrResponseMsg: plain outgoing msg')
 
         # 3.1.9
@@ -443,6 +478,60 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
             )
             
     # 3.2
+    def __getMaxSizeResponseScopedPDU(
+        self, snmpEngine, maxMessageSize, securityParameters,
+        securityLevel, msg
+        ):
+        # Response message is limited by both engines
+        snmpEngineMaxMessageSize, snmpEngineBoots = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineMaxMessageSize', 'snmpEngineBoots')
+        snmpEngineMaxMessageSize = long(snmpEngineMaxMessageSize.syntax)
+        maxMessageSize = min(long(maxMessageSize), snmpEngineMaxMessageSize)
+        # Response header carries request msgID and our msgMaxSize
+        headerDataSize = bersize.getTlvSize(
+            bersize.getTlvSize(bersize.getIntegerLength(
+                long(msg.getComponentByPosition(1).getComponentByPosition(0))
+                )) + \
+            bersize.getTlvSize(
+                bersize.getIntegerLength(snmpEngineMaxMessageSize)
+                ) + \
+            bersize.getTlvSize(1) + \
+            bersize.getTlvSize(bersize.getIntegerLength(self.securityModelID))
+            )
+        # USM parameters are ours except for user name, digest and salt
+        # that are of the same size as in request. Engine time is taken
+        # at its widest.
+        usmParametersSize = bersize.getTlvSize(len(snmpEngine.snmpEngineID))+\
+            bersize.getTlvSize(
+                bersize.getIntegerLength(long(snmpEngineBoots.syntax))
+                ) + \
+            bersize.getTlvSize(bersize.getIntegerLength(0x7fffffffL)) + \
+            bersize.getTlvSize(len(securityParameters.getComponentByPosition(3)))
+        if securityLevel == 3 or securityLevel == 2:
+            usmParametersSize = usmParametersSize + bersize.getTlvSize(
+                len(securityParameters.getComponentByPosition(4))
+                )
+        else:
+            usmParametersSize = usmParametersSize + bersize.getTlvSize(0)
+        if securityLevel == 3:
+            usmParametersSize = usmParametersSize + bersize.getTlvSize(
+                len(securityParameters.getComponentByPosition(5))
+                )
+        else:
+            usmParametersSize = usmParametersSize + bersize.getTlvSize(0)
+        maxSizeResponseScopedPDU = bersize.getMaxValueLength(
+            maxMessageSize
+            ) - bersize.getTlvSize(bersize.getIntegerLength(3)) - \
+            headerDataSize - \
+            bersize.getTlvSize(bersize.getTlvSize(usmParametersSize))
+        # Ciphertext is wrapped into OCTET STRING
+        if securityLevel == 3:
+            maxSizeResponseScopedPDU = bersize.getMaxValueLength(
+                maxSizeResponseScopedPDU
+                )
+        if maxSizeResponseScopedPDU < 0:
+            maxSizeResponseScopedPDU = 0
+        return maxSizeResponseScopedPDU
+        
     def processIncomingMsg(
         self,
         snmpEngine,
@@ -456,13 +545,12 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         ):
         # 3.2.1 
         try:
-            securityParameters, rest = decoder.decode(
+            securityParameters, rest = snmpEngine.berCodec.decode(
                 securityParameters,
                 asn1Spec=self._securityParametersSpec
                 )
         except PyAsn1Error:
-           snmpInASNParseErrs, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMPv2-MIB', 'snmpInASNParseErrs')
-           snmpInASNParseErrs.syntax = snmpInASNParseErrs.syntax + 1
+           snmpEngine.counters.snmpInASNParseErrs = snmpEngine.counters.snmpInASNParseErrs + 1
            raise error.StatusInformation(
                errorIndication='parseError'
                )
@@ -471,9 +559,10 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
 
         # 3.2.9 -- moved up here to be able to report
         # maxSizeResponseScopedPDU on error
-        maxSizeResponseScopedPDU = maxMessageSize - 512   # XXX
-        if maxSizeResponseScopedPDU < 0:
-            maxSizeResponseScopedPDU = 0
+        maxSizeResponseScopedPDU = self.__getMaxSizeResponseScopedPDU(
+            snmpEngine, maxMessageSize, securityParameters, securityLevel,
+            msg
+            )
         
         # 3.2.2
         securityEngineID = securityParameters.getComponentByPosition(0)
@@ -484,7 +573,7 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         debug.logger & debug.flagSM and debug.logger('processIncomingMsg: cache read securityStateReference %s by msgUserName %s' % (securityStateReference, securityParameters.getComponentByPosition(3)))
         
         # Used for error reporting
-        contextEngineId = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')[0].syntax
+        contextEngineId = snmpEngine.snmpEngineID
         contextName = ''
 
         # 3.2.3
@@ -507,16 +596,16 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                 debug.logger & debug.flagSM and debug.logger('processIncomingMsg: store timeline for securityEngineID %s' % (securityEngineID,))
             else:
                 # 3.2.3b
-                usmStatsUnknownEngineIDs, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-USER-BASED-SM-MIB', 'usmStatsUnknownEngineIDs')
-                usmStatsUnknownEngineIDs.syntax = usmStatsUnknownEngineIDs.syntax+1
+                snmpEngine.counters.usmStatsUnknownEngineIDs = snmpEngine.counters.usmStatsUnknownEngineIDs + 1
+                oid, val = snmpEngine.counters.getVarBind('usmStatsUnknownEngineIDs')
                 debug.logger & debug.flagSM and debug.logger('processIncomingMsg: null securityEngineID')
                 pysnmpUsmDiscoverable, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__PYSNMP-USM-MIB', 'pysnmpUsmDiscoverable')
                 if pysnmpUsmDiscoverable.syntax:
                     debug.logger & debug.flagSM and debug.logger('processIncomingMsg: request EngineID discovery')
                     raise error.StatusInformation(
                         errorIndication = 'unknownEngineID',
-                        oid=usmStatsUnknownEngineIDs.name,
-                        val=usmStatsUnknownEngineIDs.syntax,
+                        oid=oid,
+                        val=val,
                         securityStateReference=securityStateReference,
                         contextEngineId=contextEngineId,
                         contextName=contextName,
@@ -529,7 +618,7 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                         errorIndication = 'unknownEngineID'
                         )
 
-        snmpEngineID = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-FRAMEWORK-MIB', 'snmpEngineID')[0].syntax
+        snmpEngineID = snmpEngine.snmpEngineID
  
         msgAuthoritativeEngineID = securityParameters.getComponentByPosition(0)
         msgUserName = securityParameters.getComponentByPosition(3)
@@ -543,7 +632,9 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                   usmUserAuthProtocol,
                   usmUserAuthKeyLocalized,
                   usmUserPrivProtocol,
-                  usmUserPrivKeyLocalized ) = self.__getUserInfo(
+                  usmUserPrivKeyLocalized,
+                  authHandler,
+                  privHandler ) = self.__getUserInfo(
                     snmpEngine.msgAndPduDsp.mibInstrumController, msgAuthoritativeEngineID, msgUserName
                     )
                 debug.logger & debug.flagSM and debug.logger('processIncomingMsg: read user info from LCD')
@@ -556,7 +647,9 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                           usmUserAuthProtocol,
                           usmUserAuthKeyLocalized,
                           usmUserPrivProtocol,
-                          usmUserPrivKeyLocalized ) = self.__cloneUserInfo(
+                          usmUserPrivKeyLocalized,
+                          authHandler,
+                          privHandler ) = self.__cloneUserInfo(
                             snmpEngine.msgAndPduDsp.mibInstrumController,
                             securityEngineID,
                             msgUserName
@@ -566,12 +659,12 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                         __reportUnknownName = 1
                 debug.logger & debug.flagSM and debug.logger('processIncomingMsg: unknown securityEngineID %s msgUserName %s' % (securityEngineID, msgUserName))
                 if __reportUnknownName:
-                        usmStatsUnknownUserNames, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-USER-BASED-SM-MIB', 'usmStatsUnknownUserNames')
-                        usmStatsUnknownUserNames.syntax = usmStatsUnknownUserNames.syntax+1
+                        snmpEngine.counters.usmStatsUnknownUserNames = snmpEngine.counters.usmStatsUnknownUserNames + 1
+                        oid, val = snmpEngine.counters.getVarBind('usmStatsUnknownUserNames')
                         raise error.StatusInformation(
                             errorIndication = 'unknownSecurityName',
-                            oid = usmStatsUnknownUserNames.name,
-                            val = usmStatsUnknownUserNames.syntax,
+                            oid=oid,
+                            val=val,
                             securityStateReference=securityStateReference,
                             contextEngineId=contextEngineId,
                             contextName=contextName,
@@ -582,6 +675,7 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
             usmUserName = usmUserSecurityName = ''
             usmUserAuthProtocol = usmUserAuthKeyLocalized = None
             usmUserPrivProtocol = usmUserPrivKeyLocalized = None
+            authHandler = privHandler = None
 
         debug.logger & debug.flagSM and debug.logger('processIncomingMsg: now have usmUserSecurityName %s usmUserAuthProtocol %s usmUserPrivProtocol %s for msgUserName %s' % (usmUserSecurityName, usmUserAuthProtocol, usmUserPrivProtocol, msgUserName))
 
@@ -594,12 +688,12 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                 if not usmUserAuthProtocol:
                     __reportError = 1
         if __reportError:
-            usmStatsUnsupportedSecLevels, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-USER-BASED-SM-MIB', 'usmStatsUnsupportedSecLevels')
-            usmStatsUnsupportedSecLevels.syntax = usmStatsUnsupportedSecLevels.syntax + 1
+            snmpEngine.counters.usmStatsUnsupportedSecLevels = snmpEngine.counters.usmStatsUnsupportedSecLevels + 1
+            oid, val = snmpEngine.counters.getVarBind('usmStatsUnsupportedSecLevels')
             raise error.StatusInformation(
                 errorIndication='unsupportedSecurityLevel',
-                oid=usmStatsUnknownEngineIDs.name,
-                val=usmStatsUnknownEngineIDs.syntax,
+                oid=oid,
+                val=val,
                 securityStateReference=securityStateReference,
                 contextEngineId=contextEngineId,
                 contextName=contextName,
@@ -608,24 +702,27 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
 
         # 3.2.6
         if securityLevel == 3 or securityLevel == 2:
-            authHandler = self.authServices.get(usmUserAuthProtocol)
             if authHandler is None:
                 raise error.StatusInformation(
                     errorIndication = 'authenticationFailure'
                     )
+            authParametersOffset, end = snmpEngine.berCodec.locateValue(
+                wholeMsg, self._authParametersPath
+                )
             try:
-                authenticatedWholeMsg = authHandler.authenticateIncomingMsg(
+                authHandler.authenticateIncomingMsg(
                     usmUserAuthKeyLocalized,
                     securityParameters.getComponentByPosition(4),
-                    wholeMsg
+                    wholeMsg,
+                    authParametersOffset
                     )
             except error.StatusInformation:
-                usmStatsWrongDigests, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-USER-BASED-SM-MIB', 'usmStatsWrongDigests')
-                usmStatsWrongDigests.syntax = usmStatsWrongDigests.syntax+1
+                snmpEngine.counters.usmStatsWrongDigests = snmpEngine.counters.usmStatsWrongDigests + 1
+                oid, val = snmpEngine.counters.getVarBind('usmStatsWrongDigests')
                 raise error.StatusInformation(
                     errorIndication = 'authenticationFailure',
-                    oid=usmStatsWrongDigests.name,
-                    val=usmStatsWrongDigests.syntax,
+                    oid=oid,
+                    val=val,
                     securityStateReference=securityStateReference,
                     contextEngineId=contextEngineId,
                     contextName=contextName,
@@ -667,12 +764,12 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                    snmpEngineBoots != msgAuthoritativeEngineBoots or \
                    abs(idleTime + int(snmpEngineTime) - \
                        int(msgAuthoritativeEngineTime)) > 150:
-                    usmStatsNotInTimeWindows, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-USER-BASED-SM-MIB', 'usmStatsNotInTimeWindows')
-                    usmStatsNotInTimeWindows.syntax = usmStatsNotInTimeWindows.syntax+1
+                    snmpEngine.counters.usmStatsNotInTimeWindows = snmpEngine.counters.usmStatsNotInTimeWindows + 1
+                    oid, val = snmpEngine.counters.getVarBind('usmStatsNotInTimeWindows')
                     raise error.StatusInformation(
                         errorIndication = 'notInTimeWindow',
-                        oid=usmStatsNotInTimeWindows.name,
-                        val=usmStatsNotInTimeWindows.syntax,
+                        oid=oid,
+                        val=val,
                         securityStateReference=securityStateReference,
                         securityLevel=2,
                         contextEngineId=contextEngineId,
@@ -707,7 +804,6 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
 
         # 3.2.8a
         if securityLevel == 3:
-            privHandler = self.privServices.get(usmUserPrivProtocol)
             if privHandler is None:
                 raise error.StatusInformation(
                     errorIndication = 'decryptionError'
@@ -727,13 +823,17 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                     encryptedPDU
                     )
                debug.logger & debug.flagSM and debug.logger('processIncomingMsg: PDU deciphered')
+               # Response ciphertext may come out padded
+               maxSizeResponseScopedPDU = max(
+                   maxSizeResponseScopedPDU - privHandler.paddingLength, 0
+                   )
             except error.StatusInformation:
-                usmStatsDecryptionErrors, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-USER-BASED-SM-MIB', 'usmStatsDecryptionErrors')
-                usmStatsDecryptionErrors.syntax = usmStatsDecryptionErrors.syntax+1
+                snmpEngine.counters.usmStatsDecryptionErrors = snmpEngine.counters.usmStatsDecryptionErrors + 1
+                oid, val = snmpEngine.counters.getVarBind('usmStatsDecryptionErrors')
                 raise error.StatusInformation(
                     errorIndication = 'decryptionError',
-                    oid=usmStatsDecryptionErrors.name,
-                    val=usmStatsDecryptionErrors.syntax,
+                    oid=oid,
+                    val=val,
                     securityStateReference=securityStateReference,
                     contextEngineId=contextEngineId,
                     contextName=contextName,
@@ -741,7 +841,7 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
                     )
             scopedPduSpec = scopedPduData.setComponentByPosition(0).getComponentByPosition(0)
             try:
-                scopedPDU, rest = decoder.decode(
+                scopedPDU, rest = snmpEngine.berCodec.decode(
                     decryptedData, asn1Spec=scopedPduSpec
                     )
             except PyAsn1Error, why:
@@ -774,12 +874,12 @@ class SnmpUSMSecurityModel(AbstractSecurityModel):
         
         # Delayed to include details
         if not msgUserName and not securityEngineID:
-            usmStatsUnknownUserNames, = snmpEngine.msgAndPduDsp.mibInstrumController.mibBuilder.importSymbols('__SNMP-USER-BASED-SM-MIB', 'usmStatsUnknownUserNames')
-            usmStatsUnknownUserNames.syntax = usmStatsUnknownUserNames.syntax+1
+            snmpEngine.counters.usmStatsUnknownUserNames = snmpEngine.counters.usmStatsUnknownUserNames + 1
+            oid, val = snmpEngine.counters.getVarBind('usmStatsUnknownUserNames')
             raise error.StatusInformation(
                 errorIndication='unknownSecurityName',
-                oid=usmStatsUnknownUserNames.name,
-                val=usmStatsUnknownUserNames.syntax,
+                oid=oid,
+                val=val,
                 securityStateReference=securityStateReference,
                 securityEngineID=securityEngineID,
                 contextEngineId=contextEngineId,
@@ -0,0 +1,54 @@
+from pysnmp.proto.secmod.rfc3414.auth import base
+from pysnmp.proto.secmod.rfc3414 import localkey
+from pysnmp.proto import error
+
+try:
+    import hashlib
+except ImportError:
+    hashlib = None
+
+# RFC7860
+
+class AbstractHmacSha2(base.AbstractHmacAuthenticationService):
+    hashName = None
+    def __init__(self):
+        base.AbstractHmacAuthenticationService.__init__(self)
+        if hashlib is not None:
+            self.hashFun = getattr(hashlib, self.hashName)
+
+    # 9.3
+    def hashPassphrase(self, passphrase):
+        if self.hashFun is None:
+            raise error.ProtocolError('hashlib module not available')
+        return localkey.hashPassphrase(passphrase, self.hashFun)
+
+    def localizeKey(self, passKey, snmpEngineID):
+        if self.hashFun is None:
+            raise error.ProtocolError('hashlib module not available')
+        return localkey.localizeKey(passKey, snmpEngineID, self.hashFun)
+
+# 4.2.1 -- MACs are truncated to a half (SHA-224: 128 bits) of hash size
+
+class HmacSha224(AbstractHmacSha2):
+    serviceID = (1, 3, 6, 1, 6, 3, 10, 1, 1, 4)  # usmHMAC128SHA224AuthProtocol
+    hashName = 'sha224'
+    blockSize = 64
+    digestLength = 16
+
+class HmacSha256(AbstractHmacSha2):
+    serviceID = (1, 3, 6, 1, 6, 3, 10, 1, 1, 5)  # usmHMAC192SHA256AuthProtocol
+    hashName = 'sha256'
+    blockSize = 64
+    digestLength = 24
+
+class HmacSha384(AbstractHmacSha2):
+    serviceID = (1, 3, 6, 1, 6, 3, 10, 1, 1, 6)  # usmHMAC256SHA384AuthProtocol
+    hashName = 'sha384'
+    blockSize = 128
+    digestLength = 32
+
+class HmacSha512(AbstractHmacSha2):
+    serviceID = (1, 3, 6, 1, 6, 3, 10, 1, 1, 7)  # usmHMAC384SHA512AuthProtocol
+    hashName = 'sha512'
+    blockSize = 128
+    digestLength = 48
@@ -705,6 +705,7 @@ class MibTableRow(MibTree):
         MibTree.__init__(self, name)
         self.indexNames = ()
         self.augmentingRows = {}
+        self.__generation = 0L
 
     # Table indices resolution. Handle almost all possible rfc1902 types
     # explicitly rather than by means of isSuperTypeOf() method because
@@ -898,10 +899,21 @@ class MibTableRow(MibTree):
         self.__delegate('Test', name, val, idx, (acFun, acCtx))
     def writeCommit(self, name, val, idx, (acFun, acCtx)):
         self.__delegate('Commit', name, val, idx, (acFun, acCtx))
+        self.__generation = self.__generation + 1
     def writeCleanup(self, name, val, idx, (acFun, acCtx)):
         self.__delegate('Cleanup', name, val, idx, (acFun, acCtx))
     def writeUndo(self, name, val,  idx, (acFun, acCtx)):
         self.__delegate('Undo', name, val, idx, (acFun, acCtx))
+        self.__generation = self.__generation + 1
+
+    # Table modifications tracking
+
+    def getGeneration(self):
+        """Return a counter changing on any modification of table rows
+           so that lookup indices built off this table could tell they
+           are stale
+        """
+        return self.__generation
 
     # Table row management
     
@@ -15,6 +15,11 @@ setup(name="pysnmp",
                    'pysnmp.v4.carrier',
                    'pysnmp.v4.carrier.asynsock',
                    'pysnmp.v4.carrier.asynsock.dgram',
+                   'pysnmp.v4.carrier.asynsock.stream',
+                   'pysnmp.v4.carrier.asyncio',
+                   'pysnmp.v4.carrier.asyncio.dgram',
+                   'pysnmp.v4.carrier.loopback',
+                   'pysnmp.v4.carrier.capture',
                    'pysnmp.v4.entity',
                    'pysnmp.v4.entity.rfc3413',
                    'pysnmp.v4.entity.rfc3413.oneliner',
@@ -26,10 +31,13 @@ setup(name="pysnmp",
                    'pysnmp.v4.proto.secmod.rfc3414.priv',
                    'pysnmp.v4.proto.secmod.rfc3826',
                    'pysnmp.v4.proto.secmod.rfc3826.priv',
+                   'pysnmp.v4.proto.secmod.rfc7860',
+                   'pysnmp.v4.proto.secmod.rfc7860.auth',
                    'pysnmp.v4.proto.acmod',
                    'pysnmp.v4.proto.proxy',
                    'pysnmp.v4.proto.api' ],
       scripts = [ 'tools/libsmi2pysnmp',
-                  'tools/build-pysnmp-mib' ],
+                  'tools/build-pysnmp-mib',
+                  'tools/snmpreplay' ],
       license="BSD"
       )